@@ -3,6 +3,7 @@ import objective
 import utilisation
 import optimisation
 import argparse
+import csv
 import pathlib
 
 if __name__ == "__main__":
@@ -77,6 +78,16 @@ if __name__ == "__main__":
     parser.add_argument(
         "--progress_bar", help="Use a progress bar or not.", action="store_true"
     )
+    parser.add_argument(
+        "--adaptive_operators",
+        help="Choose mutation operators adaptively and save their statistics.",
+        action="store_true",
+    )
+    parser.add_argument(
+        "--solver_diagnostics",
+        help="Save per generation diagnostics of the utilisation solver.",
+        action="store_true",
+    )
     args = parser.parse_args()
 
     ## Read in all data (time units in minutes)
@@ -104,6 +115,24 @@ if __name__ == "__main__":
     demand_rates = (
         np.genfromtxt(f"./data/demand_{args.demand_scenario}.csv", delimiter=",") / 1440
     )
+    (
+        demand_rates,
+        primary_survivals,
+        secondary_survivals,
+        beta,
+        R,
+    ) = objective.get_compact_problem(
+        demand_rates, primary_survivals, secondary_survivals, beta, R
+    )
+    problem = objective.get_problem(
+        demand_rates,
+        primary_survivals,
+        secondary_survivals,
+        weights_single_vehicle,
+        weights_multiple_vehicles,
+        beta,
+        R,
+    )
     results_dir = pathlib.Path("./results")
     results_dir.mkdir(exist_ok=True)
 
@@ -136,6 +165,8 @@ if __name__ == "__main__":
         "max_secondary",
     ]
 
+    run_statistics: dict = {}
+
     # Carry out the optimisation
     (
         best_primary,
@@ -153,19 +184,16 @@ if __name__ == "__main__":
         mutation_function=optimisation.mutate_retain_vehicle_numbers,
         initial_number_of_mutatation_repetitions=args.initial_number_of_mutatation_repetitions,
         cooling_rate=args.cooling_rate,
-        demand_rates=demand_rates,
-        primary_survivals=primary_survivals,
-        secondary_survivals=secondary_survivals,
-        weights_single_vehicle=weights_single_vehicle,
-        weights_multiple_vehicles=weights_multiple_vehicles,
-        beta=beta,
-        R=R,
         vehicle_station_utilisation_function=utilisation.solve_utilisations,
         seed=0,
         num_workers=args.num_workers,
         progress_bar=args.progress_bar,
+        adaptive_operator_selection=args.adaptive_operators,
+        run_statistics=run_statistics,
+        solver_diagnostics=args.solver_diagnostics,
         service_rate_primary=service_rate_primary,
         service_rate_secondary=service_rate_secondary,
+        **problem._asdict(),
     )
 
     best_primary_with_hyperparams = np.append(hyperparams_row, best_primary)
@@ -214,3 +242,48 @@ if __name__ == "__main__":
         header=",".join(population_titles),
         comments="",
     )
+
+    if args.adaptive_operators:
+        with open(
+            f"./results/operator_statistics_{args.scenario_id}.csv", "w", newline=""
+        ) as operator_file:
+            writer = csv.writer(operator_file)
+            writer.writerow(
+                [
+                    "iteration",
+                    "operator",
+                    "applications",
+                    "improvement",
+                    "evaluation_time",
+                    "weight",
+                ]
+            )
+            for iteration, generation_statistics in enumerate(
+                run_statistics["operator_statistics"]
+            ):
+                for operator, statistics in generation_statistics.items():
+                    writer.writerow(
+                        [
+                            iteration,
+                            operator,
+                            statistics["applications"],
+                            statistics["improvement"],
+                            statistics["evaluation_time"],
+                            statistics["weight"],
+                        ]
+                    )
+
+    if args.solver_diagnostics:
+        diagnostics_rows = [
+            [iteration, *summary.values()]
+            for iteration, summary in enumerate(run_statistics["solver_diagnostics"])
+        ]
+        np.savetxt(
+            f"./results/solver_diagnostics_{args.scenario_id}.csv",
+            diagnostics_rows,
+            delimiter=",",
+            header=",".join(
+                ["iteration", *run_statistics["solver_diagnostics"][0].keys()]
+            ),
+            comments="",
+        )
@@ -3,7 +3,12 @@ This modules contains code to calculate the objective function (expected
 survival) for a given set of input parameters and a given allocation of
 emergency vehicles.
 """
+from typing import NamedTuple, Tuple
+import contextlib
+import concurrent.futures
+import threading
 import numpy as np
+import numpy.typing as npt
 
 
 def get_beta(travel_times):
@@ -111,212 +116,1915 @@ def get_survival_time_vectors(
     return primary_survivals, secondary_survivals
 
 
-def get_is_not_busy_vector(
-    vehicle_station_utilisation,
-    allocation,
+def get_time_varying_parameters(
+    survival_functions, primary_vehicle_travel_times, secondary_vehicle_travel_times
 ):
     """
-    Returns the probability vector of given stations not being busy.
+    Obtain beta, R and the survival time vectors for each of a number of time
+    periods (for example the hours of the day) with their own travel times.
 
     Parameters
     ----------
-    vehicle_station_utilisation : np.array
-        The utilisation of vehicles at every station
-    allocation : np.array
-        The number of vehicles at every station
+    survival_functions : iterable
+        An iterable of the survival functions for each patient class
+    primary_vehicle_travel_times : np.array
+        The travel time matrices for primary vehicles for each time period.
+        Within each, rows correspond to ambulance locations and the columns
+        correspond to pickup locations.
+    secondary_vehicle_travel_times : np.array
+        The travel time matrices for secondary vehicles for each time period.
+        Within each, rows correspond to ambulance locations and the columns
+        correspond to pickup locations.
+
+    Returns
+    -------
+    tuple
+        Returns beta, R, the primary survivals and the secondary survivals,
+        each with a leading dimension for the time periods.
+    """
+    parameters = [
+        (
+            get_beta(travel_times=primary_travel_times),
+            get_R(primary_travel_times, secondary_travel_times),
+            *get_survival_time_vectors(
+                survival_functions, primary_travel_times, secondary_travel_times
+            ),
+        )
+        for primary_travel_times, secondary_travel_times in zip(
+            primary_vehicle_travel_times, secondary_vehicle_travel_times
+        )
+    ]
+    return tuple(np.array(parameter) for parameter in zip(*parameters))
+
+
+def get_scenario_parameter(parameter, scenario, number_of_dimensions):
+    """
+    Returns the value of a parameter in a given scenario, if the parameter
+    has a leading dimension for the scenarios, and the parameter otherwise.
+
+    Parameters
+    ----------
+    parameter : np.array
+        The parameter, for example beta.
+    scenario : int
+        The index of the scenario.
+    number_of_dimensions : int
+        The number of dimensions of the parameter when it is shared by all
+        scenarios.
 
     Returns
     -------
     np.array
-        Returns a vector:
-          + `is_not_busy[a]` indicating the probability of a vehicle
-             at location a not being busy.
     """
-    is_not_busy = 1 - np.power(vehicle_station_utilisation, allocation)
-    return is_not_busy
+    if parameter.ndim > number_of_dimensions:
+        return parameter[scenario]
+    return parameter
 
 
-def get_all_same_closer_busy_vector(vehicle_station_utilisation, allocation, beta):
+def get_poisson_demand_samples(
+    demand_rates, number_of_samples, observation_period=1440, seed=None
+):
     """
-    Returns the probability of all vehicles of the same type that are preferred
-    being busy.
+    Samples demand rates as the number of calls observed over a period,
+    assuming they arrive as Poisson processes with the given rates, divided by
+    the length of the period. Samples are drawn from their own random number
+    generator so that the same samples (common random numbers) can be used to
+    evaluate every candidate allocation.
 
     Parameters
     ----------
-    vehicle_station_utilisation : np.array
-        The utilisation of vehicles at every station
-    allocation : np.array
-        The number of vehicles at every station
+    demand_rates : np.array
+        The demand rates of given patient classes from given pickup locations.
+    number_of_samples : int
+        The number of samples.
+    observation_period : float
+        The length of the period over which calls are counted, in the time
+        units of the demand rates (by default a day in minutes).
+    seed : int
+        The seed of the random number generator.
+
+    Returns
+    -------
+    np.array
+        A three dimensional array of sampled demand rates, one per sample.
+    """
+    random_number_generator = np.random.default_rng(seed)
+    counts = random_number_generator.poisson(
+        demand_rates * observation_period,
+        size=(number_of_samples,) + demand_rates.shape,
+    )
+    return counts / observation_period
+
+
+def get_bootstrap_demand_samples(historical_demand_rates, number_of_samples, seed=None):
+    """
+    Samples demand rates by resampling (with replacement) historical demand
+    rates, for example those of individual days.
+
+    Parameters
+    ----------
+    historical_demand_rates : np.array
+        A three dimensional array of the observed demand rates of given
+        patient classes from given pickup locations, one per day.
+    number_of_samples : int
+        The number of samples.
+    seed : int
+        The seed of the random number generator.
+
+    Returns
+    -------
+    np.array
+        A three dimensional array of sampled demand rates, one per sample.
+    """
+    random_number_generator = np.random.default_rng(seed)
+    days = random_number_generator.integers(
+        len(historical_demand_rates), size=number_of_samples
+    )
+    return historical_demand_rates[days]
+
+
+def get_conditional_value_at_risk(values, alpha=0.1):
+    """
+    Returns the conditional value at risk: the mean of the worst (lowest)
+    fraction alpha of the values. This can be given as the aggregation of
+    `get_aggregated_scenario_objective`.
+
+    Parameters
+    ----------
+    values : np.array
+        The values of the objective function for each sample.
+    alpha : float
+        The fraction of the values to average over.
+
+    Returns
+    -------
+    float
+    """
+    number_of_worst_values = int(np.ceil(alpha * len(values)))
+    return np.sort(values)[:number_of_worst_values].mean()
+
+
+def get_compact_problem(demand_rates, primary_survivals, secondary_survivals, beta, R):
+    """
+    Removes the pickup locations with no demand from any patient class. These
+    contribute nothing to the objective function or to the vehicle station
+    utilisations, so the objective function is unchanged.
+
+    Parameters
+    ----------
+    demand_rates : np.array
+        The demand rates of given patient classes from given pickup locations.
+    primary_survivals : np.array
+        The survival probability due to primary vehicles.
+    secondary_survivals : np.array
+        The survival probability due to secondary vehicles.
     beta : np.array
         A three dimensional array denoting which vehicles are preferred.
+    R : np.array
+        A three dimensional array denoting which primary vehicles are preferred.
 
     Returns
     -------
-    np.array
-        Returns a vector:
-          + `all_same_closer_busy[a][p]` indicating the probability
-          of all vehicles of the same type and closer to p than
-          a being busy.
+    tuple
+        The demand rates, primary survivals, secondary survivals, beta and R
+        restricted to the pickup locations with some demand.
     """
-    all_same_closer_busy = np.prod(
-        np.power(
-            vehicle_station_utilisation,
-            np.multiply(beta.transpose(0, 2, 1), allocation),
-        ),
-        axis=2,
-    ).T
-    return all_same_closer_busy
+    has_demand = demand_rates.sum(axis=0) > 0
+    return (
+        demand_rates[:, has_demand],
+        primary_survivals[:, has_demand],
+        secondary_survivals[:, has_demand],
+        beta[has_demand],
+        R[has_demand],
+    )
 
 
-def get_all_primary_closer_busy_vector(vehicle_station_utilisation, allocation, R):
+def get_low_precision_problem(
+    demand_rates, primary_survivals, secondary_survivals, beta, R
+):
     """
-    Returns the probability of all primary vehicles that are preferred
-    being busy.
+    Stores beta and R as booleans and the demand rates and survival
+    probabilities as single precision floats. The objective function and the
+    vehicle station utilisations are then computed in single precision (see
+    `get_precision`), halving the memory traffic of the three dimensional
+    arrays, while the root finding of the utilisations stays in double
+    precision.
 
     Parameters
     ----------
-    vehicle_station_utilisation : np.array
-        The utilisation of vehicles at every station
-    allocation : np.array
-        The number of vehicles at every station
+    demand_rates : np.array
+        The demand rates of given patient classes from given pickup locations.
+    primary_survivals : np.array
+        The survival probability due to primary vehicles.
+    secondary_survivals : np.array
+        The survival probability due to secondary vehicles.
+    beta : np.array
+        A three dimensional array denoting which vehicles are preferred.
     R : np.array
         A three dimensional array denoting which primary vehicles are preferred.
 
+    Returns
+    -------
+    tuple
+        The demand rates, primary survivals, secondary survivals, beta and R
+        in low precision.
+    """
+    return (
+        demand_rates.astype(np.float32),
+        primary_survivals.astype(np.float32),
+        secondary_survivals.astype(np.float32),
+        beta.astype(bool),
+        R.astype(bool),
+    )
+
+
+def get_precision(demand_rates):
+    """
+    Returns the floating point type that the objective function and the
+    vehicle station utilisations are computed in: that of the demand rates,
+    and double precision if they are integers.
+
+    Parameters
+    ----------
+    demand_rates : np.array
+        The demand rates of given patient classes from given pickup locations.
+
+    Returns
+    -------
+    np.dtype
+    """
+    return np.result_type(demand_rates, np.float32)
+
+
+def get_weighted_clusters(
+    profiles, weights, number_of_clusters, number_of_iterations=100, seed=None
+):
+    """
+    Clusters the rows of `profiles` using k-means with every row weighted by
+    the given weights. Clusters that end up empty are removed.
+
+    Parameters
+    ----------
+    profiles : np.array
+        A two dimensional array with a row for every point to cluster.
+    weights : np.array
+        The weight of every point.
+    number_of_clusters : int
+        The number of clusters to start with.
+    number_of_iterations : int
+        The maximum number of iterations of k-means.
+    seed : int
+        The seed of the random choice of the initial cluster centres.
+
     Returns
     -------
     np.array
-        Returns a vector:
-          + `all_primary_closer_busy_vector[a][p]` indicating
-          the probability of all primary vehicles closer to p
-          than a secondary vehicle at a being busy.
+        Returns an integer array of the cluster of every point.
     """
-    all_primary_closer_busy_vector = np.prod(
-        np.power(
-            vehicle_station_utilisation, np.multiply(R.transpose(0, 2, 1), allocation)
-        ),
-        axis=2,
+    rng = np.random.default_rng(seed)
+    centres = profiles[rng.choice(len(profiles), number_of_clusters, replace=False)]
+    clusters = None
+    for _ in range(number_of_iterations):
+        # The squared distances, less the squared norm of each profile.
+        distances = (centres**2).sum(axis=1) - 2 * profiles @ centres.T
+        new_clusters = np.argmin(distances, axis=1)
+        if np.array_equal(new_clusters, clusters):
+            break
+        clusters = new_clusters
+        indicator = np.eye(number_of_clusters)[clusters]
+        cluster_weights = weights @ indicator
+        has_weight = cluster_weights > 0
+        centres[has_weight] = ((indicator * weights[:, np.newaxis]).T @ profiles)[
+            has_weight
+        ] / cluster_weights[has_weight, np.newaxis]
+    return np.unique(clusters, return_inverse=True)[1]
+
+
+def get_pickup_clusters(
+    travel_times, demand_rates, number_of_clusters, number_of_iterations=100, seed=None
+):
+    """
+    Clusters the pickup locations with similar travel times from every station,
+    using k-means with every pickup location weighted by its total demand.
+
+    Parameters
+    ----------
+    travel_times : np.array
+        The travel time matrix rows correspond to ambulance locations and the
+        columns correspond to pickup locations.
+    demand_rates : np.array
+        The demand rates of given patient classes from given pickup locations.
+    number_of_clusters : int
+        The number of clusters to start with. Clusters that end up empty are
+        removed.
+    number_of_iterations : int
+        The maximum number of iterations of k-means.
+    seed : int
+        The seed of the random choice of the initial cluster centres.
+
+    Returns
+    -------
+    np.array
+        Returns an integer array:
+          + `pickup_clusters[p]` the cluster of pickup location p.
+    """
+    return get_weighted_clusters(
+        travel_times.T,
+        demand_rates.sum(axis=0),
+        number_of_clusters,
+        number_of_iterations,
+        seed,
     )
-    return all_primary_closer_busy_vector
 
 
-def get_all_secondary_closer_busy_vector(vehicle_station_utilisation, allocation, R):
+def get_station_regions(
+    travel_times, number_of_regions, number_of_iterations=100, seed=None
+):
     """
-    Returns the probability of all secondary vehicles that are preferred
-    being busy.
+    Groups the stations with similar travel times to every pickup location into
+    regions, using k-means.
 
     Parameters
     ----------
-    vehicle_station_utilisation : np.array
-        The utilisation of vehicles at every station
-    allocation : np.array
-        The number of vehicles at every station
+    travel_times : np.array
+        The travel time matrix rows correspond to ambulance locations and the
+        columns correspond to pickup locations.
+    number_of_regions : int
+        The number of regions to start with. Regions that end up empty are
+        removed.
+    number_of_iterations : int
+        The maximum number of iterations of k-means.
+    seed : int
+        The seed of the random choice of the initial region centres.
+
+    Returns
+    -------
+    np.array
+        Returns an integer array:
+          + `station_regions[a]` the region of station a.
+    """
+    return get_weighted_clusters(
+        travel_times,
+        np.ones(len(travel_times)),
+        number_of_regions,
+        number_of_iterations,
+        seed,
+    )
+
+
+def get_regional_problem(
+    demand_rates, primary_survivals, secondary_survivals, beta, R, station_regions
+):
+    """
+    Reduces the problem to one station for every region: the station of the
+    region with the largest expected number of survivors, if it had the only
+    primary vehicle.
+
+    Parameters
+    ----------
+    demand_rates : np.array
+        The demand rates of given patient classes from given pickup locations.
+    primary_survivals : np.array
+        The survival probability due to primary vehicles.
+    secondary_survivals : np.array
+        The survival probability due to secondary vehicles.
+    beta : np.array
+        A three dimensional array denoting which vehicles are preferred.
     R : np.array
         A three dimensional array denoting which primary vehicles are preferred.
+    station_regions : np.array
+        The region of every station, as given by `get_station_regions`.
 
     Returns
     -------
-    np.array
-        Returns a vector:
-          + `all_secondary_closer_busy_vector[a][p]` indicating
-          the probability of all secondary vehicles closer to p
-          than a primary vehicle at a being busy.
+    tuple
+        The primary survivals, secondary survivals, beta and R of the
+        representative stations, and the representative station of every
+        region.
     """
-    all_secondary_closer_busy_vector = np.prod(
-        np.power(
-            vehicle_station_utilisation,
-            np.multiply(1 - R, allocation),
-        ),
-        axis=2,
+    station_scores = np.einsum("kp,kpa->a", demand_rates, primary_survivals)
+    order = np.lexsort((-station_scores, station_regions))
+    representatives = order[
+        np.searchsorted(station_regions[order], np.arange(station_regions.max() + 1))
+    ]
+    return (
+        primary_survivals[:, :, representatives],
+        secondary_survivals[:, :, representatives],
+        beta[:, representatives][:, :, representatives],
+        R[:, representatives][:, :, representatives],
+        representatives,
     )
-    return all_secondary_closer_busy_vector
 
 
-def get_psi(primary_survivals, primary_is_not_busy, all_closer_busy_primary):
+def get_clustered_problem(
+    demand_rates, primary_survivals, secondary_survivals, beta, R, pickup_clusters
+):
     """
-    Returns the value of psi
+    Aggregates every cluster of pickup locations into a single pickup location.
+    Its demand is the total demand of the cluster and its survival
+    probabilities are the means over the cluster weighted by the demand of
+    each patient class, so that the expected number of survivors from a given
+    station is unchanged. Its beta and R are those of the pickup location of
+    the cluster with the most demand.
 
     Parameters
     ----------
+    demand_rates : np.array
+        The demand rates of given patient classes from given pickup locations.
     primary_survivals : np.array
         The survival probability due to primary vehicles.
-    primary_is_not_busy : np.array
-        The probability of a primary vehicle not being busy
-    all_closer_busy_primary : np.array
-        the probability of all vehicles of the same time that are preferred being busy
+    secondary_survivals : np.array
+        The survival probability due to secondary vehicles.
+    beta : np.array
+        A three dimensional array denoting which vehicles are preferred.
+    R : np.array
+        A three dimensional array denoting which primary vehicles are preferred.
+    pickup_clusters : np.array
+        The cluster of every pickup location, as given by `get_pickup_clusters`.
+
+    Returns
+    -------
+    tuple
+        The demand rates, primary survivals, secondary survivals, beta and R
+        of the clusters.
+    """
+    number_of_clusters = pickup_clusters.max() + 1
+    indicator = np.eye(number_of_clusters)[pickup_clusters]
+    clustered_demand_rates = demand_rates @ indicator
+    clustered_survivals = [
+        np.divide(
+            np.einsum("kpa,kp,pc->kca", survivals, demand_rates, indicator),
+            clustered_demand_rates[:, :, np.newaxis],
+            out=np.zeros((len(demand_rates), number_of_clusters, beta.shape[1])),
+            where=clustered_demand_rates[:, :, np.newaxis] > 0,
+        )
+        for survivals in (primary_survivals, secondary_survivals)
+    ]
+    order = np.lexsort((-demand_rates.sum(axis=0), pickup_clusters))
+    representatives = order[
+        np.searchsorted(pickup_clusters[order], np.arange(number_of_clusters))
+    ]
+    return (
+        clustered_demand_rates,
+        *clustered_survivals,
+        beta[representatives],
+        R[representatives],
+    )
+
+
+def get_nearest_stations(beta, number_of_nearest_stations):
+    """
+    Returns the stations nearest to every pickup location. The stations are
+    ranked by the number of stations preferred to them in beta.
+
+    Parameters
+    ----------
+    beta : np.array
+        A three dimensional array denoting which vehicles are preferred.
+    number_of_nearest_stations : int
+        The number of stations to keep for every pickup location.
 
     Returns
     -------
     np.array
-        Returns a vector:
-          + `psi[k][p][a]` indicating the probability of survival
-          of a patient at pickup location p of type k by a primary
-          vehicle at location a.
+        Returns an integer array:
+          + `nearest_stations[p][i]` the index of the ith nearest station
+          to pickup location p.
     """
-    psi = primary_survivals * primary_is_not_busy * all_closer_busy_primary.T
-    return psi
+    station_ranks = beta.sum(axis=1)
+    return np.argsort(station_ranks, axis=1, kind="stable")[
+        :, :number_of_nearest_stations
+    ]
 
 
-def get_psi_tilde(
-    primary_survivals,
-    secondary_survivals,
-    primary_is_not_busy,
-    secondary_is_not_busy,
-    all_closer_busy_primary,
-    all_closer_busy_secondary,
-    all_secondary_closer_than_primary_busy,
-    all_primary_closer_than_secondary_busy,
+def get_truncated_problem(
+    primary_survivals, secondary_survivals, beta, R, number_of_nearest_stations
+):
+    """
+    Restricts the survival functions, beta and R to the nearest stations of
+    every pickup location, for use by `get_truncated_objective`. The arrays
+    have a station axis of length `number_of_nearest_stations` in place of the
+    number of stations, but keep every station that may be preferred to a
+    nearest station.
+
+    Parameters
+    ----------
+    primary_survivals : np.array
+        The survival probability due to primary vehicles.
+    secondary_survivals : np.array
+        The survival probability due to secondary vehicles.
+    beta : np.array
+        A three dimensional array denoting which vehicles are preferred.
+    R : np.array
+        A three dimensional array denoting which primary vehicles are preferred.
+    number_of_nearest_stations : int
+        The number of stations to keep for every pickup location.
+
+    Returns
+    -------
+    dict
+        Returns a dictionary with keys:
+          + `nearest_stations` the nearest stations to every pickup location,
+          + `primary_survivals` and `secondary_survivals` the survival
+            probabilities from the nearest stations,
+          + `beta` the columns of beta of the nearest stations,
+          + `R_primary` the columns and `R_secondary` the rows of R of the
+            nearest stations,
+          + `dropped_primary_survivals` and `dropped_secondary_survivals` the
+            largest survival probability from any other station.
+    """
+    nearest_stations = get_nearest_stations(beta, number_of_nearest_stations)
+    is_dropped = np.ones(beta.shape[:2], dtype=bool)
+    np.put_along_axis(is_dropped, nearest_stations, False, axis=1)
+    return {
+        "nearest_stations": nearest_stations,
+        "primary_survivals": np.take_along_axis(
+            primary_survivals, nearest_stations[np.newaxis], axis=2
+        ),
+        "secondary_survivals": np.take_along_axis(
+            secondary_survivals, nearest_stations[np.newaxis], axis=2
+        ),
+        "beta": np.take_along_axis(beta, nearest_stations[:, np.newaxis], axis=2),
+        "R_primary": np.take_along_axis(R, nearest_stations[:, np.newaxis], axis=2),
+        "R_secondary": np.take_along_axis(
+            R, nearest_stations[:, :, np.newaxis], axis=1
+        ),
+        "dropped_primary_survivals": np.max(
+            primary_survivals * is_dropped, axis=2, initial=0
+        ),
+        "dropped_secondary_survivals": np.max(
+            secondary_survivals * is_dropped, axis=2, initial=0
+        ),
+    }
+
+
+def get_is_not_busy_vector(
+    vehicle_station_utilisation,
+    allocation,
+):
+    """
+    Returns the probability vector of given stations not being busy.
+
+    Parameters
+    ----------
+    vehicle_station_utilisation : np.array
+        The utilisation of vehicles at every station
+    allocation : np.array
+        The number of vehicles at every station
+
+    Returns
+    -------
+    np.array
+        Returns a vector:
+          + `is_not_busy[a]` indicating the probability of a vehicle
+             at location a not being busy.
+    """
+    is_not_busy = 1 - np.power(vehicle_station_utilisation, allocation)
+    return is_not_busy
+
+
+def get_pickup_chunks(number_of_pickups, pickup_chunk_size=None):
+    """
+    Returns slices of the pickup locations with at most `pickup_chunk_size`
+    locations each, so that the pickup locations by station by station
+    temporaries have a bounded size.
+
+    Parameters
+    ----------
+    number_of_pickups : int
+        The number of pickup locations.
+    pickup_chunk_size : int
+        The number of pickup locations in each chunk. If None all pickup
+        locations are in one chunk.
+
+    Returns
+    -------
+    list
+    """
+    if pickup_chunk_size is None:
+        return [slice(None)]
+    return [
+        slice(start, start + pickup_chunk_size)
+        for start in range(0, number_of_pickups, pickup_chunk_size)
+    ]
+
+
+def map_pickup_chunks(
+    function,
+    number_of_pickups,
+    pickup_chunk_size=None,
+    pickup_num_workers=None,
+    workspace=None,
+):
+    """
+    Applies a function to each chunk of pickup locations, returning the results
+    in order. If `pickup_num_workers` is more than one the chunks are processed
+    on a pool of threads: numpy releases the GIL in its array operations, so a
+    single evaluation can use a number of cores. In that case, if no
+    `pickup_chunk_size` is given, there is one chunk for each thread, and the
+    pool is kept in the workspace (see `get_workspace_executor`).
+
+    Parameters
+    ----------
+    function : callable
+        Maps a slice of the pickup locations to a result.
+    number_of_pickups : int
+        The number of pickup locations.
+    pickup_chunk_size : int
+        The number of pickup locations in each chunk. If None all pickup
+        locations are in one chunk.
+    pickup_num_workers : int
+        The number of threads processing chunks of pickup locations at once.
+        If None the chunks are processed in turn.
+    workspace : dict
+        Holds the pool of threads, reused by later calls. If None a pool is
+        created and shut down on every call.
+
+    Returns
+    -------
+    list
+    """
+    if pickup_num_workers is None or pickup_num_workers <= 1:
+        return [
+            function(chunk)
+            for chunk in get_pickup_chunks(number_of_pickups, pickup_chunk_size)
+        ]
+    if pickup_chunk_size is None:
+        pickup_chunk_size = int(np.ceil(number_of_pickups / pickup_num_workers))
+    chunks = get_pickup_chunks(number_of_pickups, pickup_chunk_size)
+    if workspace is None:
+        with concurrent.futures.ThreadPoolExecutor(pickup_num_workers) as executor:
+            return list(executor.map(function, chunks))
+    executor = get_workspace_executor(workspace, pickup_num_workers)
+    return list(executor.map(function, chunks))
+
+
+def get_workspace_executor(workspace, pickup_num_workers):
+    """
+    Returns a pool of threads from the workspace, creating it on first use, so
+    that the calls of a solve or of an optimisation share one pool instead of
+    starting and joining threads on every call.
+
+    Parameters
+    ----------
+    workspace : dict
+        A dictionary holding the pools of threads by their number of threads,
+        alongside the buffers of `get_workspace_buffer`.
+    pickup_num_workers : int
+        The number of threads in the pool.
+
+    Returns
+    -------
+    concurrent.futures.ThreadPoolExecutor
+    """
+    keyname = ("executor", pickup_num_workers)
+    if keyname not in workspace:
+        executor = concurrent.futures.ThreadPoolExecutor(pickup_num_workers)
+        if workspace.setdefault(keyname, executor) is not executor:
+            executor.shutdown()
+    return workspace[keyname]
+
+
+@contextlib.contextmanager
+def pickup_workspace(workspace, pickup_num_workers):
+    """
+    Yields the workspace, or a new one if there is none and the pickup
+    locations are processed on a pool of threads, so that one pool serves the
+    whole of the calling evaluation or solve. The pools of a new workspace are
+    shut down on exit.
+
+    Parameters
+    ----------
+    workspace : dict
+        The workspace passed to the caller, or None.
+    pickup_num_workers : int
+        The number of threads processing chunks of pickup locations at once.
+
+    Yields
+    ------
+    dict
+        The workspace to use, None if there is none and the pickup locations
+        are processed in turn.
+    """
+    if workspace is not None or pickup_num_workers is None or pickup_num_workers <= 1:
+        yield workspace
+        return
+    workspace = {}
+    try:
+        yield workspace
+    finally:
+        shutdown_workspace_executors(workspace)
+
+
+def shutdown_workspace_executors(workspace):
+    """
+    Shuts down the pools of threads held in the workspace (see
+    `get_workspace_executor`) and removes them from it.
+
+    Parameters
+    ----------
+    workspace : dict
+        A dictionary holding pools of threads and buffers.
+    """
+    for keyname in [key for key in workspace if key[0] == "executor"]:
+        workspace.pop(keyname).shutdown()
+
+
+def get_workspace_buffer(workspace, shape, dtype):
+    """
+    Returns a buffer of the given shape and type from the workspace, creating
+    it on first use. Buffers are kept separately for every thread, so that
+    chunks of pickup locations processed at once do not share them.
+
+    Parameters
+    ----------
+    workspace : dict
+        A dictionary mapping thread identifiers, shapes and types to buffers.
+        If None a new array is returned.
+    shape : tuple
+        The shape of the buffer.
+    dtype : np.dtype
+        The type of the buffer.
+
+    Returns
+    -------
+    np.array
+    """
+    if workspace is None:
+        return np.empty(shape, dtype=dtype)
+    keyname = (threading.get_ident(), shape, np.dtype(dtype))
+    if keyname not in workspace:
+        workspace[keyname] = np.empty(shape, dtype=dtype)
+    return workspace[keyname]
+
+
+def get_closer_busy_product(
+    vehicle_station_utilisation,
+    allocation,
+    preferred,
+    workspace=None,
+    not_preferred=False,
+):
+    """
+    Returns the product of the probabilities of the preferred vehicles being
+    busy, computing the powers in a buffer from the workspace. If
+    `not_preferred` the vehicles that are not marked in `preferred` are used
+    instead, without forming the complement of `preferred`.
+
+    Parameters
+    ----------
+    vehicle_station_utilisation : np.array
+        The utilisation of vehicles at every station
+    allocation : np.array
+        The number of vehicles at every station
+    preferred : np.array
+        A three dimensional array: `preferred[p][a][b]` indicating whether
+        the vehicles at b are preferred to a for pickup location p.
+    workspace : dict
+        Buffers for the largest temporary arrays, filled in place and reused
+        by later calls (see `get_workspace_buffer`). If None the temporary
+        arrays are allocated on every call.
+    not_preferred : bool
+        Whether to use the vehicles not marked in `preferred`.
+
+    Returns
+    -------
+    np.array
+    """
+    vehicle_station_utilisation = np.asarray(vehicle_station_utilisation)
+    allocation = np.asarray(allocation)
+    busy_powers = get_workspace_buffer(
+        workspace,
+        preferred.shape,
+        np.result_type(vehicle_station_utilisation, allocation, preferred),
+    )
+    np.multiply(preferred, allocation, out=busy_powers)
+    if not_preferred:
+        np.subtract(allocation, busy_powers, out=busy_powers)
+    np.power(vehicle_station_utilisation, busy_powers, out=busy_powers)
+    return np.prod(busy_powers, axis=2)
+
+
+def get_all_same_closer_busy_vector(
+    vehicle_station_utilisation,
+    allocation,
+    beta,
+    pickup_chunk_size=None,
+    pickup_num_workers=None,
+    workspace=None,
+):
+    """
+    Returns the probability of all vehicles of the same type that are preferred
+    being busy.
+
+    Parameters
+    ----------
+    vehicle_station_utilisation : np.array
+        The utilisation of vehicles at every station
+    allocation : np.array
+        The number of vehicles at every station
+    beta : np.array
+        A three dimensional array denoting which vehicles are preferred.
+    pickup_chunk_size : int
+        The number of pickup locations to process at once. If None all pickup
+        locations are processed at once.
+    pickup_num_workers : int
+        The number of threads processing chunks of pickup locations at once.
+        If None the chunks are processed in turn.
+    workspace : dict
+        Buffers for the largest temporary arrays, filled in place and reused
+        by later calls (see `get_workspace_buffer`). If None the temporary
+        arrays are allocated on every call.
+
+    Returns
+    -------
+    np.array
+        Returns a vector:
+          + `all_same_closer_busy[a][p]` indicating the probability
+          of all vehicles of the same type and closer to p than
+          a being busy.
+    """
+    all_same_closer_busy = np.concatenate(
+        map_pickup_chunks(
+            lambda chunk: get_closer_busy_product(
+                vehicle_station_utilisation,
+                allocation,
+                beta[chunk].transpose(0, 2, 1),
+                workspace,
+            ),
+            len(beta),
+            pickup_chunk_size,
+            pickup_num_workers,
+            workspace,
+        )
+    ).T
+    return all_same_closer_busy
+
+
+def get_all_primary_closer_busy_vector(
+    vehicle_station_utilisation,
+    allocation,
+    R,
+    pickup_chunk_size=None,
+    pickup_num_workers=None,
+    workspace=None,
+):
+    """
+    Returns the probability of all primary vehicles that are preferred
+    being busy.
+
+    Parameters
+    ----------
+    vehicle_station_utilisation : np.array
+        The utilisation of vehicles at every station
+    allocation : np.array
+        The number of vehicles at every station
+    R : np.array
+        A three dimensional array denoting which primary vehicles are preferred.
+    pickup_chunk_size : int
+        The number of pickup locations to process at once. If None all pickup
+        locations are processed at once.
+    pickup_num_workers : int
+        The number of threads processing chunks of pickup locations at once.
+        If None the chunks are processed in turn.
+    workspace : dict
+        Buffers for the largest temporary arrays, filled in place and reused
+        by later calls (see `get_workspace_buffer`). If None the temporary
+        arrays are allocated on every call.
+
+    Returns
+    -------
+    np.array
+        Returns a vector:
+          + `all_primary_closer_busy_vector[a][p]` indicating
+          the probability of all primary vehicles closer to p
+          than a secondary vehicle at a being busy.
+    """
+    all_primary_closer_busy_vector = np.concatenate(
+        map_pickup_chunks(
+            lambda chunk: get_closer_busy_product(
+                vehicle_station_utilisation,
+                allocation,
+                R[chunk].transpose(0, 2, 1),
+                workspace,
+            ),
+            len(R),
+            pickup_chunk_size,
+            pickup_num_workers,
+            workspace,
+        )
+    )
+    return all_primary_closer_busy_vector
+
+
+def get_all_secondary_closer_busy_vector(
+    vehicle_station_utilisation,
+    allocation,
+    R,
+    pickup_chunk_size=None,
+    pickup_num_workers=None,
+    workspace=None,
+):
+    """
+    Returns the probability of all secondary vehicles that are preferred
+    being busy.
+
+    Parameters
+    ----------
+    vehicle_station_utilisation : np.array
+        The utilisation of vehicles at every station
+    allocation : np.array
+        The number of vehicles at every station
+    R : np.array
+        A three dimensional array denoting which primary vehicles are preferred.
+    pickup_chunk_size : int
+        The number of pickup locations to process at once. If None all pickup
+        locations are processed at once.
+    pickup_num_workers : int
+        The number of threads processing chunks of pickup locations at once.
+        If None the chunks are processed in turn.
+    workspace : dict
+        Buffers for the largest temporary arrays, filled in place and reused
+        by later calls (see `get_workspace_buffer`). If None the temporary
+        arrays are allocated on every call.
+
+    Returns
+    -------
+    np.array
+        Returns a vector:
+          + `all_secondary_closer_busy_vector[a][p]` indicating
+          the probability of all secondary vehicles closer to p
+          than a primary vehicle at a being busy.
+    """
+    all_secondary_closer_busy_vector = np.concatenate(
+        map_pickup_chunks(
+            lambda chunk: get_closer_busy_product(
+                vehicle_station_utilisation,
+                allocation,
+                R[chunk],
+                workspace,
+                not_preferred=True,
+            ),
+            len(R),
+            pickup_chunk_size,
+            pickup_num_workers,
+            workspace,
+        )
+    )
+    return all_secondary_closer_busy_vector
+
+
+def get_psi(primary_survivals, primary_is_not_busy, all_closer_busy_primary):
+    """
+    Returns the value of psi
+
+    Parameters
+    ----------
+    primary_survivals : np.array
+        The survival probability due to primary vehicles.
+    primary_is_not_busy : np.array
+        The probability of a primary vehicle not being busy
+    all_closer_busy_primary : np.array
+        the probability of all vehicles of the same time that are preferred being busy
+
+    Returns
+    -------
+    np.array
+        Returns a vector:
+          + `psi[k][p][a]` indicating the probability of survival
+          of a patient at pickup location p of type k by a primary
+          vehicle at location a.
+    """
+    psi = primary_survivals * primary_is_not_busy * all_closer_busy_primary.T
+    return psi
+
+
+def get_psi_tilde(
+    primary_survivals,
+    secondary_survivals,
+    primary_is_not_busy,
+    secondary_is_not_busy,
+    all_closer_busy_primary,
+    all_closer_busy_secondary,
+    all_secondary_closer_than_primary_busy,
+    all_primary_closer_than_secondary_busy,
+):
+    """
+    Returns the value of psi tilde
+
+    Parameters
+    ----------
+    primary_survivals : np.array
+        The survival probability due to primary vehicles.
+    secondary_survivals : np.array
+        The survival probability due to secondary vehicles.
+    primary_is_not_busy : np.array
+        The probability of a primary vehicle not being busy
+    secondary_is_not_busy : np.array
+        The probability of a secondary vehicle not being busy
+    all_closer_busy_primary : np.array
+        the probability of all primary vehicles of the same type that are preferred being busy
+    all_closer_busy_secondary : np.array
+        the probability of all secondary vehicles of the same type that are preferred being busy
+    all_secondary_closer_than_primary_busy : np.array
+        the probability of all secondary vehicles that are preferred being busy
+    all_primary_closer_than_secondary_busy : np.array
+        the probability of all primary vehicles that are preferred being busy
+
+    Returns
+    -------
+    np.array
+        Returns a vector:
+          + `psi_tilde[k][p][a]` indicating the probability of survival
+          of a patient at pickup location p of type k by a secondary
+          vehicle at location a.
+    """
+    pass
+
+    secondary_reached = (
+        secondary_survivals
+        * secondary_is_not_busy
+        * all_closer_busy_secondary.T
+        * all_primary_closer_than_secondary_busy
+    )
+
+    primary_reached = (
+        primary_survivals
+        * primary_is_not_busy
+        * all_closer_busy_primary.T
+        * all_secondary_closer_than_primary_busy
+    )
+
+    psi_tilde = secondary_reached + primary_reached
+    return psi_tilde
+
+
+def get_weighted_survivals(
+    demand_rates,
+    primary_survivals,
+    secondary_survivals,
+    weights_single_vehicle,
+    weights_multiple_vehicles,
+):
+    """
+    Returns the survival probabilities multiplied by the weighted demand rates
+    and summed over the patient classes. These are the factors of the
+    objective function that do not depend on the allocation. They are kept in
+    double precision so that the objective function is summed in double
+    precision.
+
+    Parameters
+    ----------
+    demand_rates : np.array
+        The demand rates of given patient classes from given pickup locations,
+        optionally with a leading scenario axis.
+    primary_survivals : np.array
+        The survival probability due to primary vehicles, optionally with a
+        leading scenario axis.
+    secondary_survivals : np.array
+        The survival probability due to secondary vehicles, optionally with a
+        leading scenario axis.
+    weights_single_vehicle : np.array
+        The weighting given to each class of patients
+    weights_multiple_vehicles : np.array
+        The weighting given to each class of patients
+
+    Returns
+    -------
+    tuple
+        Returns three arrays, indexed by pickup location and station (after
+        any leading scenario axis):
+          + the primary survivals of the single vehicle classes,
+          + the primary survivals of the multiple vehicle classes,
+          + the secondary survivals of the multiple vehicle classes.
+    """
+    # Only the patient classes with a non zero weight contribute.
+    weights_single_vehicle = np.asarray(weights_single_vehicle)
+    weights_multiple_vehicles = np.asarray(weights_multiple_vehicles)
+    single_classes = np.flatnonzero(weights_single_vehicle)
+    multiple_classes = np.flatnonzero(weights_multiple_vehicles)
+    single_demand_rates = (
+        weights_single_vehicle[single_classes, np.newaxis]
+        * demand_rates[..., single_classes, :]
+    )
+    multiple_demand_rates = (
+        weights_multiple_vehicles[multiple_classes, np.newaxis]
+        * demand_rates[..., multiple_classes, :]
+    )
+    return (
+        np.einsum(
+            "...kp,...kpa->...pa",
+            single_demand_rates,
+            primary_survivals[..., single_classes, :, :],
+        ),
+        np.einsum(
+            "...kp,...kpa->...pa",
+            multiple_demand_rates,
+            primary_survivals[..., multiple_classes, :, :],
+        ),
+        np.einsum(
+            "...kp,...kpa->...pa",
+            multiple_demand_rates,
+            secondary_survivals[..., multiple_classes, :, :],
+        ),
+    )
+
+
+class Problem(NamedTuple):
+    """
+    An instance of the problem, built once by `get_problem`, with the
+    quantities that do not depend on the allocation precomputed. Its fields
+    are keyword arguments of `get_objective`, `get_survival_A1_only`,
+    `optimisation.rank_population` and `optimisation.optimise`, so it is
+    passed to them as `**problem._asdict()`. The precomputed fields are then
+    forwarded to the vehicle station utilisation function, for example
+    `utilisation.solve_utilisations`. The arrays are read only.
+    """
+
+    demand_rates: npt.NDArray[np.floating]
+    primary_survivals: npt.NDArray[np.floating]
+    secondary_survivals: npt.NDArray[np.floating]
+    weights_single_vehicle: npt.NDArray[np.floating]
+    weights_multiple_vehicles: npt.NDArray[np.floating]
+    beta: npt.NDArray[np.generic]
+    R: npt.NDArray[np.generic]
+    weighted_survivals: Tuple[npt.NDArray[np.floating], ...]
+    pickup_demand_rates: npt.NDArray[np.floating]
+    multiple_pickup_demand_rates: npt.NDArray[np.floating]
+
+
+# The fields of a `Problem` that are computed from the others, and so must not
+# be passed on to a different (clustered, regional or truncated) problem.
+PROBLEM_INVARIANTS = (
+    "weighted_survivals",
+    "pickup_demand_rates",
+    "multiple_pickup_demand_rates",
+)
+
+
+def get_read_only(array):
+    """
+    Returns a read only view of the array.
+
+    Parameters
+    ----------
+    array : np.array
+        An array.
+
+    Returns
+    -------
+    np.array
+    """
+    view = np.asarray(array).view()
+    view.flags.writeable = False
+    return view
+
+
+def get_problem(
+    demand_rates,
+    primary_survivals,
+    secondary_survivals,
+    weights_single_vehicle,
+    weights_multiple_vehicles,
+    beta,
+    R,
+    low_precision=False,
+):
+    """
+    Builds an instance of the problem, precomputing the weighted survival
+    probabilities (see `get_weighted_survivals`) and the demand rates from
+    every pickup location of all patient classes and of the multiple vehicle
+    classes, which would otherwise be recomputed on every evaluation of the
+    objective function and the utilisation relationships.
+
+    Parameters
+    ----------
+    demand_rates : np.array
+        The demand rates of given patient classes from given pickup locations.
+    primary_survivals : np.array
+        The survival probability due to primary vehicles.
+    secondary_survivals : np.array
+        The survival probability due to secondary vehicles.
+    weights_single_vehicle : np.array
+        The weighting given to each class of patients
+    weights_multiple_vehicles : np.array
+        The weighting given to each class of patients
+    beta : np.array
+        A three dimensional array denoting which vehicles are preferred.
+    R : np.array
+        A three dimensional array denoting which primary vehicles are preferred.
+    low_precision : bool
+        Whether to store the problem in the compact types of
+        `get_low_precision_problem`.
+
+    Returns
+    -------
+    Problem
+    """
+    demand_rates = np.asarray(demand_rates)
+    primary_survivals = np.asarray(primary_survivals)
+    secondary_survivals = np.asarray(secondary_survivals)
+    beta = np.asarray(beta)
+    R = np.asarray(R)
+    if low_precision:
+        (
+            demand_rates,
+            primary_survivals,
+            secondary_survivals,
+            beta,
+            R,
+        ) = get_low_precision_problem(
+            demand_rates, primary_survivals, secondary_survivals, beta, R
+        )
+    weighted_survivals = get_weighted_survivals(
+        demand_rates,
+        primary_survivals,
+        secondary_survivals,
+        weights_single_vehicle,
+        weights_multiple_vehicles,
+    )
+    return Problem(
+        demand_rates=get_read_only(demand_rates),
+        primary_survivals=get_read_only(primary_survivals),
+        secondary_survivals=get_read_only(secondary_survivals),
+        weights_single_vehicle=get_read_only(weights_single_vehicle),
+        weights_multiple_vehicles=get_read_only(weights_multiple_vehicles),
+        beta=get_read_only(beta),
+        R=get_read_only(R),
+        weighted_survivals=tuple(
+            get_read_only(survivals) for survivals in weighted_survivals
+        ),
+        pickup_demand_rates=get_read_only(demand_rates.sum(axis=0)),
+        multiple_pickup_demand_rates=get_read_only(demand_rates[:-1].sum(axis=0)),
+    )
+
+
+def get_objective(
+    demand_rates,
+    primary_survivals,
+    secondary_survivals,
+    weights_single_vehicle,
+    weights_multiple_vehicles,
+    beta,
+    R,
+    vehicle_station_utilisation_function,
+    allocation_primary,
+    allocation_secondary,
+    cache=None,
+    pickup_chunk_size=None,
+    pickup_num_workers=None,
+    workspace=None,
+    weighted_survivals=None,
+    **kwargs,
+):
+    """
+    Returns the value of psi tilde
+
+    Parameters
+    ----------
+    demand_rates : np.array
+        The demand rates of given patient classes from given pickup locations.
+    primary_survivals : np.array
+        The survival probability due to primary vehicles.
+    secondary_survivals : np.array
+        The survival probability due to secondary vehicles.
+    weights_single_vehicle : np.array
+        The weighting given to each class of patients
+    weights_multiple_vehicles : np.array
+        The weighting given to each class of patients
+    beta : np.array
+        A three dimensional array denoting which vehicles are preferred.
+    R : np.array
+        A three dimensional array denoting which primary vehicles are preferred.
+    allocation_primary : np.array
+        An integer array of number of primary vehicles at every station
+    allocation_secondary : np.array
+        An integer array of number of secondary vehicles at every station
+    vehicle_station_utilisation_function : callable
+          returns two arrays of floats -- must be defined with `(**kwargs)`.
+    cache : dict
+        a dictionary mapping tuples of str representations of allocations
+        to objective function values.
+    pickup_chunk_size : int
+        The number of pickup locations to process at once, bounding the size
+        of the temporary arrays. It is also passed to the vehicle station
+        utilisation function. If None all pickup locations are processed at
+        once.
+    pickup_num_workers : int
+        The number of threads processing chunks of pickup locations at once.
+        If None the chunks are processed in turn.
+    workspace : dict
+        Buffers for the largest temporary arrays, filled in place and reused
+        by later calls (see `get_workspace_buffer`). If None the temporary
+        arrays are allocated on every call.
+    weighted_survivals : tuple
+        The output of `get_weighted_survivals`, which does not depend on the
+        allocation, to reuse between calls. If None it is computed.
+    **kwargs : keyword arguments
+        remaining keyword arguments to be passed to the vehicle station
+        utilisation function.
+
+
+
+    Returns
+    -------
+    float
+        Returns the value of the objective function.
+    """
+
+    if (cache is not None) and (
+        (keyname := (str(allocation_primary), str(allocation_secondary))) in cache
+    ):
+        return cache[keyname]
+    with pickup_workspace(workspace, pickup_num_workers) as workspace:
+        (
+            primary_vehicle_station_utilisation,
+            secondary_vehicle_station_utilisation,
+        ) = vehicle_station_utilisation_function(
+            demand_rates=demand_rates,
+            primary_survivals=primary_survivals,
+            secondary_survivals=secondary_survivals,
+            weights_single_vehicle=weights_single_vehicle,
+            weights_multiple_vehicles=weights_multiple_vehicles,
+            beta=beta,
+            R=R,
+            allocation_primary=allocation_primary,
+            allocation_secondary=allocation_secondary,
+            pickup_chunk_size=pickup_chunk_size,
+            pickup_num_workers=pickup_num_workers,
+            workspace=workspace,
+            **kwargs,
+        )
+        precision = get_precision(demand_rates)
+        primary_vehicle_station_utilisation = (
+            primary_vehicle_station_utilisation.astype(precision)
+        )
+        secondary_vehicle_station_utilisation = (
+            secondary_vehicle_station_utilisation.astype(precision)
+        )
+        allocation_primary = np.asarray(allocation_primary, dtype=precision)
+        allocation_secondary = np.asarray(allocation_secondary, dtype=precision)
+
+        primary_is_not_busy = get_is_not_busy_vector(
+            primary_vehicle_station_utilisation, allocation_primary
+        )
+        all_closer_busy_primary = get_all_same_closer_busy_vector(
+            primary_vehicle_station_utilisation,
+            allocation_primary,
+            beta,
+            pickup_chunk_size,
+            pickup_num_workers,
+            workspace,
+        )
+
+        if weighted_survivals is None:
+            weighted_survivals = get_weighted_survivals(
+                demand_rates,
+                primary_survivals,
+                secondary_survivals,
+                weights_single_vehicle,
+                weights_multiple_vehicles,
+            )
+        (
+            single_primary_survivals,
+            multiple_primary_survivals,
+            multiple_secondary_survivals,
+        ) = weighted_survivals
+
+        g = 0
+        if np.any(weights_single_vehicle):
+            g += np.einsum(
+                "pa,a,ap->",
+                single_primary_survivals,
+                primary_is_not_busy,
+                all_closer_busy_primary,
+            )
+
+        if np.any(weights_multiple_vehicles):
+            secondary_is_not_busy = get_is_not_busy_vector(
+                secondary_vehicle_station_utilisation, allocation_secondary
+            )
+            all_closer_busy_secondary = get_all_same_closer_busy_vector(
+                secondary_vehicle_station_utilisation,
+                allocation_secondary,
+                beta,
+                pickup_chunk_size,
+                pickup_num_workers,
+                workspace,
+            )
+            all_primary_closer_than_secondary_busy = get_all_primary_closer_busy_vector(
+                primary_vehicle_station_utilisation,
+                allocation_primary,
+                R,
+                pickup_chunk_size,
+                pickup_num_workers,
+                workspace,
+            )
+            all_secondary_closer_than_primary_busy = (
+                get_all_secondary_closer_busy_vector(
+                    secondary_vehicle_station_utilisation,
+                    allocation_secondary,
+                    R,
+                    pickup_chunk_size,
+                    pickup_num_workers,
+                    workspace,
+                )
+            )
+            g += np.einsum(
+                "pa,a,ap,pa->",
+                multiple_secondary_survivals,
+                secondary_is_not_busy,
+                all_closer_busy_secondary,
+                all_primary_closer_than_secondary_busy,
+            ) + np.einsum(
+                "pa,a,ap,pa->",
+                multiple_primary_survivals,
+                primary_is_not_busy,
+                all_closer_busy_primary,
+                all_secondary_closer_than_primary_busy,
+            )
+
+    if cache is not None:
+        cache[keyname] = g
+
+    return g
+
+
+def get_truncated_objective(
+    demand_rates,
+    primary_survivals,
+    secondary_survivals,
+    weights_single_vehicle,
+    weights_multiple_vehicles,
+    beta,
+    R,
+    vehicle_station_utilisation_function,
+    allocation_primary,
+    allocation_secondary,
+    truncated_problem,
+    cache=None,
+    return_error_bound=False,
+    pickup_chunk_size=None,
+    pickup_num_workers=None,
+    workspace=None,
+    **kwargs,
+):
+    """
+    Returns an approximation of the objective function that only counts the
+    patients reached from the nearest stations of every pickup location, as
+    given by `get_truncated_problem`.
+
+    The terms of the nearest stations are exact, so the approximation is a
+    lower bound of the objective function. A patient is only reached from
+    another station if the vehicles at all the nearest stations are busy, so
+    the error is at most the probability of this times the largest survival
+    probability from the other stations, summed over the weighted demand. If
+    `return_error_bound` this bound is also returned.
+
+    Parameters
+    ----------
+    demand_rates : np.array
+        The demand rates of given patient classes from given pickup locations.
+    primary_survivals : np.array
+        The survival probability due to primary vehicles.
+    secondary_survivals : np.array
+        The survival probability due to secondary vehicles.
+    weights_single_vehicle : np.array
+        The weighting given to each class of patients
+    weights_multiple_vehicles : np.array
+        The weighting given to each class of patients
+    beta : np.array
+        A three dimensional array denoting which vehicles are preferred.
+    R : np.array
+        A three dimensional array denoting which primary vehicles are preferred.
+    vehicle_station_utilisation_function : callable
+          returns two arrays of floats -- must be defined with `(**kwargs)`.
+    allocation_primary : np.array
+        An integer array of number of primary vehicles at every station
+    allocation_secondary : np.array
+        An integer array of number of secondary vehicles at every station
+    truncated_problem : dict
+        The output of `get_truncated_problem`.
+    cache : dict
+        a dictionary mapping tuples of str representations of allocations
+        to objective function values.
+    return_error_bound : bool
+        Whether to also return the bound on the error of the approximation.
+    pickup_chunk_size : int
+        The number of pickup locations to process at once, bounding the size
+        of the temporary arrays. It is also passed to the vehicle station
+        utilisation function. If None all pickup locations are processed at
+        once.
+    pickup_num_workers : int
+        The number of threads processing chunks of pickup locations at once.
+        If None the chunks are processed in turn.
+    workspace : dict
+        Buffers for the largest temporary arrays, filled in place and reused
+        by later calls (see `get_workspace_buffer`). If None the temporary
+        arrays are allocated on every call.
+    **kwargs : keyword arguments
+        remaining keyword arguments to be passed to the vehicle station
+        utilisation function.
+
+    Returns
+    -------
+    float
+        Returns the approximate value of the objective function, and the bound
+        on its error if `return_error_bound`.
+    """
+    if (cache is not None) and (
+        (keyname := (str(allocation_primary), str(allocation_secondary))) in cache
+    ):
+        return cache[keyname]
+    with pickup_workspace(workspace, pickup_num_workers) as workspace:
+        (
+            primary_vehicle_station_utilisation,
+            secondary_vehicle_station_utilisation,
+        ) = vehicle_station_utilisation_function(
+            demand_rates=demand_rates,
+            primary_survivals=primary_survivals,
+            secondary_survivals=secondary_survivals,
+            weights_single_vehicle=weights_single_vehicle,
+            weights_multiple_vehicles=weights_multiple_vehicles,
+            beta=beta,
+            R=R,
+            allocation_primary=allocation_primary,
+            allocation_secondary=allocation_secondary,
+            pickup_chunk_size=pickup_chunk_size,
+            pickup_num_workers=pickup_num_workers,
+            workspace=workspace,
+            **kwargs,
+        )
+        nearest_stations = truncated_problem["nearest_stations"]
+
+        primary_is_not_busy = get_is_not_busy_vector(
+            primary_vehicle_station_utilisation, allocation_primary
+        )[nearest_stations]
+        all_closer_busy_primary = get_all_same_closer_busy_vector(
+            primary_vehicle_station_utilisation,
+            allocation_primary,
+            truncated_problem["beta"],
+            pickup_chunk_size,
+            pickup_num_workers,
+            workspace,
+        )
+        all_nearest_busy_primary = np.prod(1 - primary_is_not_busy, axis=1)
+
+        single_classes = np.flatnonzero(weights_single_vehicle)
+        multiple_classes = np.flatnonzero(weights_multiple_vehicles)
+
+        g = 0
+        error_bound = 0
+        if len(single_classes) > 0:
+            psi = get_psi(
+                truncated_problem["primary_survivals"][single_classes],
+                primary_is_not_busy,
+                all_closer_busy_primary,
+            )
+            g += (
+                (psi.T * weights_single_vehicle[single_classes])
+                * demand_rates[single_classes].T
+            ).sum()
+            error_bound += (
+                weights_single_vehicle[single_classes]
+                * demand_rates[single_classes].T
+                * truncated_problem["dropped_primary_survivals"][single_classes].T
+                * all_nearest_busy_primary[:, np.newaxis]
+            ).sum()
+
+        if len(multiple_classes) > 0:
+            secondary_is_not_busy = get_is_not_busy_vector(
+                secondary_vehicle_station_utilisation, allocation_secondary
+            )[nearest_stations]
+            all_closer_busy_secondary = get_all_same_closer_busy_vector(
+                secondary_vehicle_station_utilisation,
+                allocation_secondary,
+                truncated_problem["beta"],
+                pickup_chunk_size,
+                pickup_num_workers,
+                workspace,
+            )
+            all_primary_closer_than_secondary_busy = get_all_primary_closer_busy_vector(
+                primary_vehicle_station_utilisation,
+                allocation_primary,
+                truncated_problem["R_primary"],
+                pickup_chunk_size,
+                pickup_num_workers,
+                workspace,
+            )
+            all_secondary_closer_than_primary_busy = (
+                get_all_secondary_closer_busy_vector(
+                    secondary_vehicle_station_utilisation,
+                    allocation_secondary,
+                    truncated_problem["R_secondary"],
+                    pickup_chunk_size,
+                    pickup_num_workers,
+                    workspace,
+                )
+            )
+            psi_tilde = get_psi_tilde(
+                truncated_problem["primary_survivals"][multiple_classes],
+                truncated_problem["secondary_survivals"][multiple_classes],
+                primary_is_not_busy,
+                secondary_is_not_busy,
+                all_closer_busy_primary,
+                all_closer_busy_secondary,
+                all_secondary_closer_than_primary_busy,
+                all_primary_closer_than_secondary_busy,
+            )
+            g += (
+                (psi_tilde.T * weights_multiple_vehicles[multiple_classes])
+                * demand_rates[multiple_classes].T
+            ).sum()
+            all_nearest_busy_secondary = np.prod(1 - secondary_is_not_busy, axis=1)
+            error_bound += (
+                weights_multiple_vehicles[multiple_classes]
+                * demand_rates[multiple_classes].T
+                * (
+                    truncated_problem["dropped_primary_survivals"][multiple_classes].T
+                    * all_nearest_busy_primary[:, np.newaxis]
+                    + truncated_problem["dropped_secondary_survivals"][
+                        multiple_classes
+                    ].T
+                    * all_nearest_busy_secondary[:, np.newaxis]
+                )
+            ).sum()
+
+    if return_error_bound:
+        g = (g, error_bound)
+    if cache is not None:
+        cache[keyname] = g
+
+    return g
+
+
+def get_scenario_log_busy(vehicle_station_utilisation, allocation):
+    """
+    Returns the logarithm of the probability of all vehicles at each station
+    being busy, for each scenario. Stations without vehicles contribute zero,
+    so that contracting these against the preference arrays gives the
+    logarithm of the products over the preferred stations.
+
+    Parameters
+    ----------
+    vehicle_station_utilisation : np.array
+        The utilisation of vehicles at every station for each scenario
+    allocation : np.array
+        The number of vehicles at every station
+
+    Returns
+    -------
+    np.array
+        Returns an array:
+          + `log_busy[s, a]` the logarithm of the probability of all the
+             vehicles at station a being busy in scenario s.
+    """
+    utilisation = np.maximum(vehicle_station_utilisation, np.finfo(float).tiny)
+    return np.where(allocation > 0, allocation * np.log(utilisation), 0)
+
+
+def get_scenario_objectives(
+    demand_rates,
+    primary_survivals,
+    secondary_survivals,
+    weights_single_vehicle,
+    weights_multiple_vehicles,
+    beta,
+    R,
+    vehicle_station_utilisation_function,
+    allocation_primary,
+    allocation_secondary,
+    **kwargs,
+):
+    """
+    Returns the value of the objective function for each of a stack of demand
+    scenarios, for example the hours of the day. The survivals, beta and R are
+    either shared by all scenarios or given for each of them (see
+    `get_time_varying_parameters`).
+
+    The utilisations of every scenario come from one call of the vehicle
+    station utilisation function. The objective is then evaluated for all
+    scenarios at once: the products over the preferred stations are taken as
+    exponentials of contractions of `get_scenario_log_busy` against beta and
+    R, so the preference arrays are read once rather than once per scenario.
+
+    Parameters
+    ----------
+    demand_rates : np.array
+        A three dimensional array: the demand rates of given patient classes
+        from given pickup locations for each scenario.
+    primary_survivals : np.array
+        The survival probability due to primary vehicles, optionally for
+        each scenario.
+    secondary_survivals : np.array
+        The survival probability due to secondary vehicles, optionally for
+        each scenario.
+    weights_single_vehicle : np.array
+        The weighting given to each class of patients
+    weights_multiple_vehicles : np.array
+        The weighting given to each class of patients
+    beta : np.array
+        A three dimensional array denoting which vehicles are preferred,
+        optionally for each scenario.
+    R : np.array
+        A three dimensional array denoting which primary vehicles are
+        preferred, optionally for each scenario.
+    vehicle_station_utilisation_function : callable
+          called once with the stacked demand rates, it returns two arrays of
+          utilisations with a row per scenario (for example
+          `utilisation.solve_utilisations_scenarios`) or two vectors used for
+          every scenario -- must be defined with `(**kwargs)`.
+    allocation_primary : np.array
+        An integer array of number of primary vehicles at every station
+    allocation_secondary : np.array
+        An integer array of number of secondary vehicles at every station
+    **kwargs : keyword arguments
+        remaining keyword arguments to be passed to the vehicle station
+        utilisation function.
+
+    Returns
+    -------
+    np.array
+        Returns the value of the objective function for each scenario.
+    """
+    (
+        primary_vehicle_station_utilisation,
+        secondary_vehicle_station_utilisation,
+    ) = vehicle_station_utilisation_function(
+        demand_rates=demand_rates,
+        primary_survivals=primary_survivals,
+        secondary_survivals=secondary_survivals,
+        weights_single_vehicle=weights_single_vehicle,
+        weights_multiple_vehicles=weights_multiple_vehicles,
+        beta=beta,
+        R=R,
+        allocation_primary=allocation_primary,
+        allocation_secondary=allocation_secondary,
+        **kwargs,
+    )
+    number_of_scenarios = len(demand_rates)
+    primary_vehicle_station_utilisation = np.broadcast_to(
+        primary_vehicle_station_utilisation,
+        (number_of_scenarios, len(allocation_primary)),
+    )
+    secondary_vehicle_station_utilisation = np.broadcast_to(
+        secondary_vehicle_station_utilisation,
+        (number_of_scenarios, len(allocation_secondary)),
+    )
+    allocation_primary = np.asarray(allocation_primary, dtype=float)
+    allocation_secondary = np.asarray(allocation_secondary, dtype=float)
+    (
+        single_primary_survivals,
+        multiple_primary_survivals,
+        multiple_secondary_survivals,
+    ) = get_weighted_survivals(
+        demand_rates,
+        primary_survivals,
+        secondary_survivals,
+        weights_single_vehicle,
+        weights_multiple_vehicles,
+    )
+
+    primary_log_busy = get_scenario_log_busy(
+        primary_vehicle_station_utilisation, allocation_primary
+    )
+    primary_is_not_busy = get_is_not_busy_vector(
+        primary_vehicle_station_utilisation, allocation_primary
+    )
+    all_closer_busy_primary = np.exp(
+        np.einsum("...pba,...b->...pa", beta, primary_log_busy)
+    )
+
+    g = np.zeros(number_of_scenarios)
+    if np.any(weights_single_vehicle):
+        g += np.einsum(
+            "spa,sa,spa->s",
+            single_primary_survivals,
+            primary_is_not_busy,
+            all_closer_busy_primary,
+        )
+
+    if np.any(weights_multiple_vehicles):
+        secondary_log_busy = get_scenario_log_busy(
+            secondary_vehicle_station_utilisation, allocation_secondary
+        )
+        secondary_is_not_busy = get_is_not_busy_vector(
+            secondary_vehicle_station_utilisation, allocation_secondary
+        )
+        all_closer_busy_secondary = np.exp(
+            np.einsum("...pba,...b->...pa", beta, secondary_log_busy)
+        )
+        all_primary_closer_than_secondary_busy = np.exp(
+            np.einsum("...pba,...b->...pa", R, primary_log_busy)
+        )
+        all_secondary_closer_than_primary_busy = np.exp(
+            secondary_log_busy.sum(axis=-1)[:, np.newaxis, np.newaxis]
+            - np.einsum("...pab,...b->...pa", R, secondary_log_busy)
+        )
+        g += np.einsum(
+            "spa,sa,spa,spa->s",
+            multiple_secondary_survivals,
+            secondary_is_not_busy,
+            all_closer_busy_secondary,
+            all_primary_closer_than_secondary_busy,
+        )
+        g += np.einsum(
+            "spa,sa,spa,spa->s",
+            multiple_primary_survivals,
+            primary_is_not_busy,
+            all_closer_busy_primary,
+            all_secondary_closer_than_primary_busy,
+        )
+
+    return g
+
+
+def get_aggregated_scenario_objective(
+    demand_rates,
+    primary_survivals,
+    secondary_survivals,
+    weights_single_vehicle,
+    weights_multiple_vehicles,
+    beta,
+    R,
+    vehicle_station_utilisation_function,
+    allocation_primary,
+    allocation_secondary,
+    aggregation=np.mean,
+    cache=None,
+    **kwargs,
 ):
     """
-    Returns the value of psi tilde
+    Returns an aggregate (by default the mean) of the values of the objective
+    function over a stack of demand scenarios. This can be given to
+    `optimisation.optimise` as its `objective_function`, for example with
+    `aggregation=np.min` to optimise the worst case.
 
     Parameters
     ----------
+    demand_rates : np.array
+        A three dimensional array: the demand rates of given patient classes
+        from given pickup locations for each scenario.
     primary_survivals : np.array
         The survival probability due to primary vehicles.
     secondary_survivals : np.array
         The survival probability due to secondary vehicles.
-    primary_is_not_busy : np.array
-        The probability of a primary vehicle not being busy
-    secondary_is_not_busy : np.array
-        The probability of a secondary vehicle not being busy
-    all_closer_busy_primary : np.array
-        the probability of all primary vehicles of the same type that are preferred being busy
-    all_closer_busy_secondary : np.array
-        the probability of all secondary vehicles of the same type that are preferred being busy
-    all_secondary_closer_than_primary_busy : np.array
-        the probability of all secondary vehicles that are preferred being busy
-    all_primary_closer_than_secondary_busy : np.array
-        the probability of all primary vehicles that are preferred being busy
+    weights_single_vehicle : np.array
+        The weighting given to each class of patients
+    weights_multiple_vehicles : np.array
+        The weighting given to each class of patients
+    beta : np.array
+        A three dimensional array denoting which vehicles are preferred.
+    R : np.array
+        A three dimensional array denoting which primary vehicles are preferred.
+    vehicle_station_utilisation_function : callable
+          called once with the stacked demand rates, it returns two arrays of
+          utilisations with a row per scenario or two vectors used for every
+          scenario -- must be defined with `(**kwargs)`.
+    allocation_primary : np.array
+        An integer array of number of primary vehicles at every station
+    allocation_secondary : np.array
+        An integer array of number of secondary vehicles at every station
+    aggregation : callable
+        maps the vector of objective function values of each scenario to a
+        float.
+    cache : dict
+        a dictionary mapping tuples of str representations of allocations
+        to objective function values.
+    **kwargs : keyword arguments
+        remaining keyword arguments to be passed to the vehicle station
+        utilisation function.
 
     Returns
     -------
-    np.array
-        Returns a vector:
-          + `psi_tilde[k][p][a]` indicating the probability of survival
-          of a patient at pickup location p of type k by a secondary
-          vehicle at location a.
+    float
+        Returns the aggregated value of the objective function.
     """
-    pass
-
-    secondary_reached = (
-        secondary_survivals
-        * secondary_is_not_busy
-        * all_closer_busy_secondary.T
-        * all_primary_closer_than_secondary_busy
-    )
-
-    primary_reached = (
-        primary_survivals
-        * primary_is_not_busy
-        * all_closer_busy_primary.T
-        * all_secondary_closer_than_primary_busy
+    if (cache is not None) and (
+        (keyname := (str(allocation_primary), str(allocation_secondary))) in cache
+    ):
+        return cache[keyname]
+    g = aggregation(
+        get_scenario_objectives(
+            demand_rates=demand_rates,
+            primary_survivals=primary_survivals,
+            secondary_survivals=secondary_survivals,
+            weights_single_vehicle=weights_single_vehicle,
+            weights_multiple_vehicles=weights_multiple_vehicles,
+            beta=beta,
+            R=R,
+            vehicle_station_utilisation_function=vehicle_station_utilisation_function,
+            allocation_primary=allocation_primary,
+            allocation_secondary=allocation_secondary,
+            **kwargs,
+        )
     )
-
-    psi_tilde = secondary_reached + primary_reached
-    return psi_tilde
+    if cache is not None:
+        cache[keyname] = g
+    return g
 
 
-def get_objective(
+def get_survival_A1_only(
     demand_rates,
     primary_survivals,
     secondary_survivals,
@@ -327,11 +2035,10 @@ def get_objective(
     vehicle_station_utilisation_function,
     allocation_primary,
     allocation_secondary,
-    cache=None,
     **kwargs,
 ):
     """
-    Returns the value of psi tilde
+    Returns the expected number of A1 patients surviving
 
     Parameters
     ----------
@@ -355,9 +2062,6 @@ def get_objective(
         An integer array of number of secondary vehicles at every station
     vehicle_station_utilisation_function : callable
           returns two arrays of floats -- must be defined with `(**kwargs)`.
-    cache : dict
-        a dictionary mapping tuples of str representations of allocations
-        to objective function values.
     **kwargs : keyword arguments
         remaining keyword arguments to be passed to the vehicle station
         utilisation function.
@@ -367,13 +2071,8 @@ def get_objective(
     Returns
     -------
     float
-        Returns the value of the objective function.
+        Returns the value of the expected number of A1 patients surviving
     """
-
-    if (cache is not None) and (
-        (keyname := (str(allocation_primary), str(allocation_secondary))) in cache
-    ):
-        return cache[keyname]
     (
         primary_vehicle_station_utilisation,
         secondary_vehicle_station_utilisation,
@@ -412,10 +2111,9 @@ def get_objective(
         secondary_vehicle_station_utilisation, allocation_secondary, R
     )
 
-    psi = get_psi(primary_survivals, primary_is_not_busy, all_closer_busy_primary)
     psi_tilde = get_psi_tilde(
-        primary_survivals,
-        secondary_survivals,
+        primary_survivals[:1],
+        secondary_survivals[:1],
         primary_is_not_busy,
         secondary_is_not_busy,
         all_closer_busy_primary,
@@ -424,18 +2122,10 @@ def get_objective(
         all_primary_closer_than_secondary_busy,
     )
 
-    g = (
-        ((psi.T * weights_single_vehicle) * demand_rates.T).sum(axis=2)
-        + ((psi_tilde.T * weights_multiple_vehicles) * demand_rates.T).sum(axis=2)
-    ).sum()
-
-    if cache is not None:
-        cache[keyname] = g
-
-    return g
+    return (psi_tilde[0].T * demand_rates[0].T).sum()
 
 
-def get_survival_A1_only(
+def evaluate_breakdown(
     demand_rates,
     primary_survivals,
     secondary_survivals,
@@ -449,7 +2139,8 @@ def get_survival_A1_only(
     **kwargs,
 ):
     """
-    Returns the expected number of A1 patients surviving
+    Returns the objective function together with its decomposition by patient
+    class, pickup location and station, solving for the utilisations once.
 
     Parameters
     ----------
@@ -467,22 +2158,34 @@ def get_survival_A1_only(
         A three dimensional array denoting which vehicles are preferred.
     R : np.array
         A three dimensional array denoting which primary vehicles are preferred.
+    vehicle_station_utilisation_function : callable
+          returns two arrays of floats -- must be defined with `(**kwargs)`.
     allocation_primary : np.array
         An integer array of number of primary vehicles at every station
     allocation_secondary : np.array
         An integer array of number of secondary vehicles at every station
-    vehicle_station_utilisation_function : callable
-          returns two arrays of floats -- must be defined with `(**kwargs)`.
     **kwargs : keyword arguments
         remaining keyword arguments to be passed to the vehicle station
         utilisation function.
 
-
-
     Returns
     -------
-    float
-        Returns the value of the expected number of A1 patients surviving
+    dict
+        A dictionary with keys:
+          + "objective": the value of the objective function;
+          + "survival_A1": the expected number of A1 patients surviving, as
+            given by `get_survival_A1_only`;
+          + "class_objectives": the weighted contribution of each class;
+          + "single_vehicle_survivals": the expected number of survivors of
+            each class if a single vehicle is dispatched;
+          + "multiple_vehicle_survivals": the expected number of survivors of
+            each class if multiple vehicles are dispatched;
+          + "pickup_contributions": the weighted contribution of each pickup
+            location;
+          + "station_contributions": the weighted contribution of the vehicles
+            at each station;
+          + "primary_utilisations" and "secondary_utilisations": the vehicle
+            station utilisations.
     """
     (
         primary_vehicle_station_utilisation,
@@ -506,15 +2209,12 @@ def get_survival_A1_only(
     secondary_is_not_busy = get_is_not_busy_vector(
         secondary_vehicle_station_utilisation, allocation_secondary
     )
-
     all_closer_busy_primary = get_all_same_closer_busy_vector(
         primary_vehicle_station_utilisation, allocation_primary, beta
     )
-
     all_closer_busy_secondary = get_all_same_closer_busy_vector(
         secondary_vehicle_station_utilisation, allocation_secondary, beta
     )
-
     all_primary_closer_than_secondary_busy = get_all_primary_closer_busy_vector(
         primary_vehicle_station_utilisation, allocation_primary, R
     )
@@ -522,6 +2222,7 @@ def get_survival_A1_only(
         secondary_vehicle_station_utilisation, allocation_secondary, R
     )
 
+    psi = get_psi(primary_survivals, primary_is_not_busy, all_closer_busy_primary)
     psi_tilde = get_psi_tilde(
         primary_survivals,
         secondary_survivals,
@@ -533,4 +2234,233 @@ def get_survival_A1_only(
         all_primary_closer_than_secondary_busy,
     )
 
-    return (psi_tilde[0].T * demand_rates[0].T).sum()
+    single_vehicle_survivors = psi * demand_rates[:, :, np.newaxis]
+    multiple_vehicle_survivors = psi_tilde * demand_rates[:, :, np.newaxis]
+    contributions = np.einsum(
+        "kpa,k->kpa", single_vehicle_survivors, weights_single_vehicle
+    ) + np.einsum("kpa,k->kpa", multiple_vehicle_survivors, weights_multiple_vehicles)
+
+    return {
+        "objective": contributions.sum(),
+        "survival_A1": multiple_vehicle_survivors[0].sum(),
+        "class_objectives": contributions.sum(axis=(1, 2)),
+        "single_vehicle_survivals": single_vehicle_survivors.sum(axis=(1, 2)),
+        "multiple_vehicle_survivals": multiple_vehicle_survivors.sum(axis=(1, 2)),
+        "pickup_contributions": contributions.sum(axis=(0, 2)),
+        "station_contributions": contributions.sum(axis=(0, 1)),
+        "primary_utilisations": primary_vehicle_station_utilisation,
+        "secondary_utilisations": secondary_vehicle_station_utilisation,
+    }
+
+
+def get_objective_by_weights(
+    demand_rates,
+    primary_survivals,
+    secondary_survivals,
+    weights_single_vehicle,
+    weights_multiple_vehicles,
+    beta,
+    R,
+    vehicle_station_utilisation_function,
+    allocation_primary,
+    allocation_secondary,
+    **kwargs,
+):
+    """
+    Returns the value of the objective function under each of a number of
+    weightings of the patient classes. The utilisations do not depend on the
+    weights and the objective function is linear in them, so this costs a
+    single evaluation.
+
+    Parameters
+    ----------
+    demand_rates : np.array
+        The demand rates of given patient classes from given pickup locations.
+    primary_survivals : np.array
+        The survival probability due to primary vehicles.
+    secondary_survivals : np.array
+        The survival probability due to secondary vehicles.
+    weights_single_vehicle : np.array
+        A two dimensional array: each row is a weighting of the classes of
+        patients.
+    weights_multiple_vehicles : np.array
+        A two dimensional array: each row is a weighting of the classes of
+        patients.
+    beta : np.array
+        A three dimensional array denoting which vehicles are preferred.
+    R : np.array
+        A three dimensional array denoting which primary vehicles are preferred.
+    vehicle_station_utilisation_function : callable
+          returns two arrays of floats -- must be defined with `(**kwargs)`.
+    allocation_primary : np.array
+        An integer array of number of primary vehicles at every station
+    allocation_secondary : np.array
+        An integer array of number of secondary vehicles at every station
+    **kwargs : keyword arguments
+        remaining keyword arguments to be passed to the vehicle station
+        utilisation function.
+
+    Returns
+    -------
+    np.array
+        The value of the objective function for each row of weights.
+    """
+    weights_single_vehicle = np.atleast_2d(weights_single_vehicle)
+    weights_multiple_vehicles = np.atleast_2d(weights_multiple_vehicles)
+    breakdown = evaluate_breakdown(
+        demand_rates=demand_rates,
+        primary_survivals=primary_survivals,
+        secondary_survivals=secondary_survivals,
+        weights_single_vehicle=weights_single_vehicle[0],
+        weights_multiple_vehicles=weights_multiple_vehicles[0],
+        beta=beta,
+        R=R,
+        vehicle_station_utilisation_function=vehicle_station_utilisation_function,
+        allocation_primary=allocation_primary,
+        allocation_secondary=allocation_secondary,
+        **kwargs,
+    )
+    return (
+        weights_single_vehicle @ breakdown["single_vehicle_survivals"]
+        + weights_multiple_vehicles @ breakdown["multiple_vehicle_survivals"]
+    )
+
+
+def get_marginal_gains(
+    demand_rates,
+    primary_survivals,
+    secondary_survivals,
+    weights_single_vehicle,
+    weights_multiple_vehicles,
+    beta,
+    R,
+    vehicle_station_utilisation_function,
+    allocation_primary,
+    allocation_secondary,
+    **kwargs,
+):
+    """
+    Returns the increase in the objective function obtained by adding a single
+    primary or secondary vehicle to each station, with the utilisations held
+    at those of the given allocation. This uses the fact that beta and R only
+    contain zeros and ones so that adding a vehicle at station b multiplies
+    the probability of all preferred vehicles being busy by `u[b] ** beta`,
+    which equals `1 + beta * (u[b] - 1)`.
+
+    Parameters
+    ----------
+    demand_rates : np.array
+        The demand rates of given patient classes from given pickup locations.
+    primary_survivals : np.array
+        The survival probability due to primary vehicles.
+    secondary_survivals : np.array
+        The survival probability due to secondary vehicles.
+    weights_single_vehicle : np.array
+        The weighting given to each class of patients
+    weights_multiple_vehicles : np.array
+        The weighting given to each class of patients
+    beta : np.array
+        A three dimensional array denoting which vehicles are preferred.
+    R : np.array
+        A three dimensional array denoting which primary vehicles are preferred.
+    vehicle_station_utilisation_function : callable
+          returns two arrays of floats -- must be defined with `(**kwargs)`.
+    allocation_primary : np.array
+        An integer array of number of primary vehicles at every station
+    allocation_secondary : np.array
+        An integer array of number of secondary vehicles at every station
+    **kwargs : keyword arguments
+        remaining keyword arguments to be passed to the vehicle station
+        utilisation function.
+
+    Returns
+    -------
+    tuple
+        Returns two vectors:
+         + the gain from adding a primary vehicle at every station
+         + the gain from adding a secondary vehicle at every station
+    """
+    (
+        primary_vehicle_station_utilisation,
+        secondary_vehicle_station_utilisation,
+    ) = vehicle_station_utilisation_function(
+        demand_rates=demand_rates,
+        primary_survivals=primary_survivals,
+        secondary_survivals=secondary_survivals,
+        weights_single_vehicle=weights_single_vehicle,
+        weights_multiple_vehicles=weights_multiple_vehicles,
+        beta=beta,
+        R=R,
+        allocation_primary=allocation_primary,
+        allocation_secondary=allocation_secondary,
+        **kwargs,
+    )
+
+    primary_is_not_busy = get_is_not_busy_vector(
+        primary_vehicle_station_utilisation, allocation_primary
+    )
+    secondary_is_not_busy = get_is_not_busy_vector(
+        secondary_vehicle_station_utilisation, allocation_secondary
+    )
+    all_closer_busy_primary = get_all_same_closer_busy_vector(
+        primary_vehicle_station_utilisation, allocation_primary, beta
+    )
+    all_closer_busy_secondary = get_all_same_closer_busy_vector(
+        secondary_vehicle_station_utilisation, allocation_secondary, beta
+    )
+    all_primary_closer_than_secondary_busy = get_all_primary_closer_busy_vector(
+        primary_vehicle_station_utilisation, allocation_primary, R
+    )
+    all_secondary_closer_than_primary_busy = get_all_secondary_closer_busy_vector(
+        secondary_vehicle_station_utilisation, allocation_secondary, R
+    )
+
+    single_primary = np.einsum(
+        "kpa,k,kp->pa", primary_survivals, weights_single_vehicle, demand_rates
+    )
+    multiple_primary = np.einsum(
+        "kpa,k,kp->pa", primary_survivals, weights_multiple_vehicles, demand_rates
+    )
+    multiple_secondary = np.einsum(
+        "kpa,k,kp->pa", secondary_survivals, weights_multiple_vehicles, demand_rates
+    )
+
+    primary_reached = (
+        single_primary + multiple_primary * all_secondary_closer_than_primary_busy
+    ) * all_closer_busy_primary.T
+    secondary_reached = (
+        multiple_secondary
+        * all_closer_busy_secondary.T
+        * all_primary_closer_than_secondary_busy
+    )
+    primary_terms = primary_reached * primary_is_not_busy
+    secondary_terms = secondary_reached * secondary_is_not_busy
+    multiple_primary_terms = (
+        multiple_primary
+        * all_closer_busy_primary.T
+        * all_secondary_closer_than_primary_busy
+        * primary_is_not_busy
+    )
+
+    primary_is_not_busy_increase = (
+        get_is_not_busy_vector(
+            primary_vehicle_station_utilisation, allocation_primary + 1
+        )
+        - primary_is_not_busy
+    )
+    secondary_is_not_busy_increase = (
+        get_is_not_busy_vector(
+            secondary_vehicle_station_utilisation, allocation_secondary + 1
+        )
+        - secondary_is_not_busy
+    )
+
+    primary_gains = (primary_vehicle_station_utilisation - 1) * (
+        np.einsum("pa,pba->b", primary_terms, beta)
+        + np.einsum("pa,pba->b", secondary_terms, R)
+    ) + primary_is_not_busy_increase * primary_reached.sum(axis=0)
+    secondary_gains = (secondary_vehicle_station_utilisation - 1) * (
+        np.einsum("pa,pba->b", secondary_terms, beta)
+        + np.einsum("pa,pab->b", multiple_primary_terms, 1 - R)
+    ) + secondary_is_not_busy_increase * secondary_reached.sum(axis=0)
+    return primary_gains, secondary_gains
@@ -1,7 +1,11 @@
 from typing import Tuple
+import functools
+import time
 import numpy as np
 import numpy.typing as npt
 import objective
+import utilisation
+import scipy.stats  # type: ignore
 import tqdm  # type: ignore
 import dask  # type: ignore
 
@@ -78,48 +82,83 @@ def switch_secondary_to_primary(
     return new_primary_allocation, new_secondary_allocation
 
 
+def choose_mutation(possible_mutations, operator_weights=None, applied_operators=None):
+    """
+    Chooses one of the (name, mutation) pairs, uniformly at random or with
+    probabilities proportional to `operator_weights`. The name of the chosen
+    mutation is appended to `applied_operators` if it is a list.
+    """
+    if operator_weights is None:
+        index = np.random.choice(len(possible_mutations))
+    else:
+        weights = np.array([operator_weights[name] for name, _ in possible_mutations])
+        index = np.random.choice(len(possible_mutations), p=weights / weights.sum())
+    name, mutation_function = possible_mutations[index]
+    if applied_operators is not None:
+        applied_operators.append(name)
+    return mutation_function
+
+
 def mutate_full(
     primary_allocation,
     secondary_allocation,
     max_primary,
     max_secondary,
     primary_to_secondary_ratio=3,
+    operator_weights=None,
+    applied_operators=None,
 ):
     number_primary_vehicles = sum(primary_allocation)
     number_secondary_vehicles = sum(secondary_allocation)
     possible_mutations = [
-        lambda x, y, max_primary, max_secondary: move_vehicle_of_same_type(
-            allocation_for_moving=x,
-            allocation_not_for_moving=y,
-            max_allocation=max_primary,
+        (
+            "move_primary",
+            lambda x, y, max_primary, max_secondary: move_vehicle_of_same_type(
+                allocation_for_moving=x,
+                allocation_not_for_moving=y,
+                max_allocation=max_primary,
+            ),
         )
     ]
     if number_secondary_vehicles > 0:
         possible_mutations.append(
-            lambda x, y, max_primary, max_secondary: move_vehicle_of_same_type(
-                allocation_for_moving=y,
-                allocation_not_for_moving=x,
-                max_allocation=max_secondary,
-            )[::-1]
+            (
+                "move_secondary",
+                lambda x, y, max_primary, max_secondary: move_vehicle_of_same_type(
+                    allocation_for_moving=y,
+                    allocation_not_for_moving=x,
+                    max_allocation=max_secondary,
+                )[::-1],
+            )
         )
     if (
         number_primary_vehicles * primary_to_secondary_ratio
         > number_secondary_vehicles + primary_to_secondary_ratio
     ):
         possible_mutations.append(
-            lambda x, y, max_primary, max_secondary: switch_primary_to_secondary(
-                primary_allocation=x,
-                secondary_allocation=y,
-                max_allocation=max_secondary,
+            (
+                "primary_to_secondary",
+                lambda x, y, max_primary, max_secondary: switch_primary_to_secondary(
+                    primary_allocation=x,
+                    secondary_allocation=y,
+                    max_allocation=max_secondary,
+                ),
             )
         )
     if number_secondary_vehicles > primary_to_secondary_ratio:
         possible_mutations.append(
-            lambda x, y, max_primary, max_secondary: switch_secondary_to_primary(
-                primary_allocation=x, secondary_allocation=y, max_allocation=max_primary
+            (
+                "secondary_to_primary",
+                lambda x, y, max_primary, max_secondary: switch_secondary_to_primary(
+                    primary_allocation=x,
+                    secondary_allocation=y,
+                    max_allocation=max_primary,
+                ),
             )
         )
-    mutation_function = np.random.choice(possible_mutations)
+    mutation_function = choose_mutation(
+        possible_mutations, operator_weights, applied_operators
+    )
     return mutation_function(
         primary_allocation, secondary_allocation, max_primary, max_secondary
     )
@@ -130,24 +169,34 @@ def mutate_retain_vehicle_numbers(
     secondary_allocation,
     max_primary,
     max_secondary,
+    operator_weights=None,
+    applied_operators=None,
 ):
     number_secondary_vehicles = sum(secondary_allocation)
     possible_mutations = [
-        lambda x, y, max_primary, max_secondary: move_vehicle_of_same_type(
-            allocation_for_moving=x,
-            allocation_not_for_moving=y,
-            max_allocation=max_primary,
+        (
+            "move_primary",
+            lambda x, y, max_primary, max_secondary: move_vehicle_of_same_type(
+                allocation_for_moving=x,
+                allocation_not_for_moving=y,
+                max_allocation=max_primary,
+            ),
         )
     ]
     if number_secondary_vehicles > 0:
         possible_mutations.append(
-            lambda x, y, max_primary, max_secondary: move_vehicle_of_same_type(
-                allocation_for_moving=y,
-                allocation_not_for_moving=x,
-                max_allocation=max_secondary,
-            )[::-1]
+            (
+                "move_secondary",
+                lambda x, y, max_primary, max_secondary: move_vehicle_of_same_type(
+                    allocation_for_moving=y,
+                    allocation_not_for_moving=x,
+                    max_allocation=max_secondary,
+                )[::-1],
+            )
         )
-    mutation_function = np.random.choice(possible_mutations)
+    mutation_function = choose_mutation(
+        possible_mutations, operator_weights, applied_operators
+    )
     return mutation_function(
         primary_allocation, secondary_allocation, max_primary, max_secondary
     )
@@ -174,6 +223,101 @@ def repeat_mutation(
     return primary_allocation, secondary_allocation
 
 
+MUTATION_OPERATORS = (
+    "move_primary",
+    "move_secondary",
+    "primary_to_secondary",
+    "secondary_to_primary",
+)
+
+# The type of the population buffers of `optimise`: the number of vehicles at
+# a station is small.
+POPULATION_DTYPE = np.int16
+
+
+def get_initial_operator_statistics():
+    """
+    Returns the statistics of each mutation operator before any application
+    """
+    return {
+        name: {"applications": 0, "improvement": 0.0, "evaluation_time": 0.0}
+        for name in MUTATION_OPERATORS
+    }
+
+
+def update_operator_statistics(
+    operator_statistics, applied_operators, improvement, evaluation_time
+):
+    """
+    Credits the improvement of a child over its parent and the time taken to
+    evaluate it equally to each of the operators applied to create it.
+    """
+    if len(applied_operators) == 0:
+        return
+    share = 1 / len(applied_operators)
+    for name in applied_operators:
+        operator_statistics[name]["applications"] += share
+        operator_statistics[name]["improvement"] += share * max(improvement, 0)
+        operator_statistics[name]["evaluation_time"] += share * evaluation_time
+
+
+def get_operator_weights(operator_statistics, minimum_operator_weight=0.1):
+    """
+    Returns the weight of each operator: its share of the total improvement
+    per second of evaluation time, plus a floor so that no operator is starved.
+    """
+    rates = np.array(
+        [
+            statistics["improvement"]
+            / max(statistics["evaluation_time"], np.finfo(float).tiny)
+            for statistics in operator_statistics.values()
+        ]
+    )
+    total = rates.sum()
+    if total > 0:
+        rates = rates / total
+    return {
+        name: minimum_operator_weight + rate
+        for name, rate in zip(operator_statistics, rates)
+    }
+
+
+def get_greedy_allocation(
+    number_of_locations: int,
+    number_of_primary_vehicles: int,
+    number_of_secondary_vehicles: int,
+    max_primary: int,
+    max_secondary: int,
+    marginal_gains_function,
+    top_k: int = 1,
+) -> npt.NDArray[np.int64]:
+    """
+    Builds a (2, number_of_locations) allocation by adding vehicles one at a
+    time where `marginal_gains_function(allocation_primary, allocation_secondary)`
+    gives the largest gain. If top_k > 1 the addition is chosen at random
+    from the top_k largest gains.
+    """
+    allocation = np.zeros((2, number_of_locations), dtype=np.int64)
+    remaining = np.array([number_of_primary_vehicles, number_of_secondary_vehicles])
+    max_allocation = np.array([[max_primary], [max_secondary]])
+    for _ in range(remaining.sum()):
+        gains = np.array(
+            marginal_gains_function(
+                allocation_primary=allocation[0], allocation_secondary=allocation[1]
+            )
+        )
+        is_possible = (allocation < max_allocation) & (remaining[:, None] > 0)
+        candidates = np.flatnonzero(is_possible)
+        ordering = np.argsort(-gains.flatten()[candidates], kind="stable")
+        best_candidates = candidates[ordering][:top_k]
+        vehicle_type, location = np.unravel_index(
+            np.random.choice(best_candidates), allocation.shape
+        )
+        allocation[vehicle_type, location] += 1
+        remaining[vehicle_type] -= 1
+    return allocation
+
+
 def create_initial_population(
     number_of_locations: int,
     number_of_primary_vehicles: int,
@@ -182,12 +326,16 @@ def create_initial_population(
     max_secondary: int,
     population_size: int,
     randomise_vehicle_numbers: bool = False,
+    marginal_gains_function=None,
+    greedy_top_k: int = 1,
 ) -> npt.NDArray[np.int64]:
     """
     Creates a (population_size, 2, number_of_locations) array of population_size allocations.
     Each allocation is a (2, number_of_locations) array consisting of a primary allocation and a secondary allocation.
+    If a marginal_gains_function is given the allocations are built greedily:
+    the first is the greedy allocation and the others choose from the greedy_top_k best additions.
     """
-    population = []
+    population: list = []
     n_primary = number_of_primary_vehicles
     n_secondary = number_of_secondary_vehicles
     total_number_of_vehicles = int(n_primary + (n_secondary / 3))
@@ -201,6 +349,19 @@ def create_initial_population(
                 )
             )
             n_secondary = (total_number_of_vehicles - n_primary) * 3
+        if marginal_gains_function is not None:
+            population.append(
+                get_greedy_allocation(
+                    number_of_locations=number_of_locations,
+                    number_of_primary_vehicles=n_primary,
+                    number_of_secondary_vehicles=n_secondary,
+                    max_primary=max_primary,
+                    max_secondary=max_secondary,
+                    marginal_gains_function=marginal_gains_function,
+                    top_k=1 if entry == 0 else greedy_top_k,
+                )
+            )
+            continue
         # create primary allocation
         primary_allocation = np.zeros(number_of_locations)
         temp = np.random.choice(
@@ -226,7 +387,81 @@ def create_initial_population(
     return np.array(population).astype(np.int64)
 
 
-def rank_population(
+def get_surrogate_features(population):
+    """
+    Returns the features of the surrogate model for every allocation: a
+    constant, the number of primary and secondary vehicles at every station,
+    their squares and their product.
+    """
+    primary_allocations = population[:, 0].astype(np.float64)
+    secondary_allocations = population[:, 1].astype(np.float64)
+    return np.hstack(
+        [
+            np.ones((len(population), 1)),
+            primary_allocations,
+            secondary_allocations,
+            primary_allocations**2,
+            secondary_allocations**2,
+            primary_allocations * secondary_allocations,
+        ]
+    )
+
+
+def update_surrogate(surrogate, population, objective_values):
+    """
+    Adds the allocations not yet seen by the surrogate to its sufficient
+    statistics. The surrogate is a dictionary that is modified in place.
+    """
+    if "seen" not in surrogate:
+        number_of_features = get_surrogate_features(population[:1]).shape[1]
+        surrogate["seen"] = set()
+        surrogate["gram"] = np.zeros((number_of_features, number_of_features))
+        surrogate["moment"] = np.zeros(number_of_features)
+    keys = [(str(allocation[0]), str(allocation[1])) for allocation in population]
+    is_new = np.array([key not in surrogate["seen"] for key in keys], dtype=bool)
+    surrogate["seen"].update(keys)
+    features = get_surrogate_features(population[is_new])
+    surrogate["gram"] += features.T @ features
+    surrogate["moment"] += features.T @ np.asarray(objective_values)[is_new]
+
+
+def predict_surrogate(surrogate, population, regularisation=1.0):
+    """
+    Predicts the objective of every allocation by ridge regression on the
+    evaluations seen so far. The constant is not penalised.
+    """
+    penalty = regularisation * np.eye(len(surrogate["moment"]))
+    penalty[0, 0] = 0
+    coefficients = np.linalg.lstsq(
+        surrogate["gram"] + penalty, surrogate["moment"], rcond=None
+    )[0]
+    return get_surrogate_features(population) @ coefficients
+
+
+def get_timed_objective(objective_function=objective.get_objective, **kwargs):
+    """
+    Returns the objective function and the time taken to compute it
+    """
+    start = time.perf_counter()
+    value = objective_function(**kwargs)
+    return value, time.perf_counter() - start
+
+
+def record_utilisations(
+    utilisation_cache, vehicle_station_utilisation_function, **kwargs
+):
+    """
+    Returns the utilisations of the vehicle station utilisation function,
+    recording them in `utilisation_cache` by the str representations of the
+    allocations.
+    """
+    utilisations = vehicle_station_utilisation_function(**kwargs)
+    keyname = (str(kwargs["allocation_primary"]), str(kwargs["allocation_secondary"]))
+    utilisation_cache[keyname] = utilisations
+    return utilisations
+
+
+def evaluate_population(
     population,
     demand_rates,
     primary_survivals,
@@ -238,13 +473,143 @@ def rank_population(
     vehicle_station_utilisation_function,
     num_workers,
     cache=None,
+    return_times=False,
+    objective_function=objective.get_objective,
+    population_utilisation_function=None,
+    utilisation_cache=None,
+    given_population_utilisations=None,
     **kwargs,
 ):
     """
-    Ranks the population according to the objective function
+    Evaluates the objective function for each member of the population,
+    returning the values in the same order as the population. If
+    `return_times` the time taken by each evaluation is also returned.
+
+    If a `population_utilisation_function` is given (for example
+    `utilisation.solve_population_utilisations`) the utilisations of all
+    members not in the cache are found with one call to it, instead of the
+    `vehicle_station_utilisation_function` of each member, and its time is
+    shared equally between them.
+
+    If a `utilisation_cache` dictionary is given the utilisations solved for
+    every member not in the cache are recorded in it (see
+    `record_utilisations`). If `given_population_utilisations` (a pair of
+    primary and secondary utilisations for every member) are given the members
+    are evaluated with them by `utilisation.given_utilisations` instead.
+
+    If the pickup locations are processed on a pool of threads
+    (`pickup_num_workers` more than one) and no `workspace` is given, one
+    workspace, and so one pool, is shared by all the members and shut down
+    once they are evaluated.
+    """
+    if return_times:
+        objective_function = functools.partial(
+            get_timed_objective, objective_function=objective_function
+        )
+    utilisation_kwargs = [
+        dict(vehicle_station_utilisation_function=vehicle_station_utilisation_function)
+        for _ in population
+    ]
+    if given_population_utilisations is not None:
+        utilisation_kwargs = [
+            dict(
+                vehicle_station_utilisation_function=utilisation.given_utilisations,
+                given_utilisations_primary=primary,
+                given_utilisations_secondary=secondary,
+            )
+            for primary, secondary in given_population_utilisations
+        ]
+    solve_time = 0.0
+    if population_utilisation_function is not None:
+        is_new = np.array(
+            [
+                cache is None or (str(allocation[0]), str(allocation[1])) not in cache
+                for allocation in population
+            ],
+            dtype=bool,
+        )
+        if is_new.any():
+            start = time.perf_counter()
+            (
+                utilisations_primary,
+                utilisations_secondary,
+            ) = population_utilisation_function(
+                population=population[is_new],
+                demand_rates=demand_rates,
+                beta=beta,
+                R=R,
+                **kwargs,
+            )
+            solve_time = (time.perf_counter() - start) / is_new.sum()
+            for index, primary, secondary in zip(
+                np.flatnonzero(is_new), utilisations_primary, utilisations_secondary
+            ):
+                utilisation_kwargs[index] = dict(
+                    vehicle_station_utilisation_function=utilisation.given_utilisations,
+                    given_utilisations_primary=primary,
+                    given_utilisations_secondary=secondary,
+                )
+    if utilisation_cache is not None:
+        for member_utilisation_kwargs in utilisation_kwargs:
+            member_utilisation_kwargs[
+                "vehicle_station_utilisation_function"
+            ] = functools.partial(
+                record_utilisations,
+                utilisation_cache,
+                member_utilisation_kwargs["vehicle_station_utilisation_function"],
+            )
+    with objective.pickup_workspace(
+        kwargs.get("workspace"), kwargs.get("pickup_num_workers")
+    ) as workspace:
+        if workspace is not None:
+            kwargs["workspace"] = workspace
+        tasks = [
+            dask.delayed(objective_function)(
+                demand_rates=demand_rates,
+                primary_survivals=primary_survivals,
+                secondary_survivals=secondary_survivals,
+                weights_single_vehicle=weights_single_vehicle,
+                weights_multiple_vehicles=weights_multiple_vehicles,
+                beta=beta,
+                R=R,
+                allocation_primary=allocation[0],
+                allocation_secondary=allocation[1],
+                cache=cache,
+                **member_utilisation_kwargs,
+                **kwargs,
+            )
+            for allocation, member_utilisation_kwargs in zip(
+                population, utilisation_kwargs
+            )
+        ]
+        results = dask.compute(*tasks, num_workers=num_workers)
+    if return_times:
+        values, times = zip(*results)
+        if population_utilisation_function is not None:
+            times = np.array(times) + np.where(is_new, solve_time, 0)
+        return np.array(values), np.array(times)
+    return np.array(results)
+
+
+def evaluate_population_by_weights(
+    population,
+    demand_rates,
+    primary_survivals,
+    secondary_survivals,
+    weights_single_vehicle,
+    weights_multiple_vehicles,
+    beta,
+    R,
+    vehicle_station_utilisation_function,
+    num_workers,
+    **kwargs,
+):
+    """
+    Evaluates the objective function for each member of the population under
+    each row of weights, returning an array with a row per member.
     """
     tasks = [
-        dask.delayed(objective.get_objective)(
+        dask.delayed(objective.get_objective_by_weights)(
             demand_rates=demand_rates,
             primary_survivals=primary_survivals,
             secondary_survivals=secondary_survivals,
@@ -255,14 +620,53 @@ def rank_population(
             vehicle_station_utilisation_function=vehicle_station_utilisation_function,
             allocation_primary=allocation[0],
             allocation_secondary=allocation[1],
-            cache=cache,
             **kwargs,
         )
         for allocation in population
     ]
-    objective_values = -np.array(dask.compute(*tasks, num_workers=num_workers))
+    return np.array(dask.compute(*tasks, num_workers=num_workers))
+
+
+def rank_population(
+    population,
+    demand_rates,
+    primary_survivals,
+    secondary_survivals,
+    weights_single_vehicle,
+    weights_multiple_vehicles,
+    beta,
+    R,
+    vehicle_station_utilisation_function,
+    num_workers,
+    cache=None,
+    out=None,
+    **kwargs,
+):
+    """
+    Ranks the population according to the objective function. If `out` (an
+    array of the shape and type of the population, not overlapping it) is
+    given the ranked population is written to it instead of a new array.
+    """
+    objective_values = -evaluate_population(
+        population=population,
+        demand_rates=demand_rates,
+        primary_survivals=primary_survivals,
+        secondary_survivals=secondary_survivals,
+        weights_single_vehicle=weights_single_vehicle,
+        weights_multiple_vehicles=weights_multiple_vehicles,
+        beta=beta,
+        R=R,
+        vehicle_station_utilisation_function=vehicle_station_utilisation_function,
+        num_workers=num_workers,
+        cache=cache,
+        **kwargs,
+    )
     ordering = np.argsort(objective_values)
-    return np.array(population[ordering]), -np.array(objective_values)[ordering]
+    if out is None:
+        out = np.array(population[ordering])
+    else:
+        np.take(population, ordering, axis=0, out=out)
+    return out, -np.array(objective_values)[ordering]
 
 
 def optimise(
@@ -289,15 +693,187 @@ def optimise(
     num_workers,
     randomise_vehicle_numbers=False,
     progress_bar=False,
+    screening_utilisation_function=None,
+    promotion_fraction=1,
+    screening_kwargs=None,
+    surrogate_screening=False,
+    surrogate_regularisation=1.0,
+    greedy_initialisation=False,
+    greedy_top_k=3,
+    initial_allocations=None,
+    run_statistics=None,
+    adaptive_operator_selection=False,
+    minimum_operator_weight=0.1,
+    objective_function=objective.get_objective,
+    pickup_clusters=None,
+    coarse_number_of_iterations=None,
+    solver_diagnostics=False,
+    parent_utilisation_screening=False,
+    screening_sample_size=0,
     **kwargs,
 ):
     """
     Optimise
+
+    If a `screening_utilisation_function` is given (for example
+    `utilisation.constant_utilisation`, with its parameters in
+    `screening_kwargs`) then ceil(offspring / promotion_fraction) candidate
+    offspring are scored with it and only the best are promoted to a full
+    evaluation. If `surrogate_screening` the candidates are instead scored by a
+    ridge regression surrogate fitted to all evaluations seen so far. If
+    `parent_utilisation_screening` the candidates are instead scored with the
+    utilisations solved for their parent, by `utilisation.given_utilisations`:
+    the utilisations of every full evaluation are kept for this. If
+    `run_statistics` is a dictionary it is populated in place with per
+    generation statistics of the screening: the Spearman rank correlation
+    between the screened and full objectives (and the RMSE of the surrogate)
+    are over the promoted offspring, so they are conditional on promotion
+    and do not measure how well the screening ranks all candidates. If
+    `screening_sample_size` is positive that many of the candidates that are
+    not promoted, chosen at random, are also fully evaluated every generation
+    and included in these statistics.
+
+    If `greedy_initialisation` the initial population is built greedily using
+    the marginal gains of the screening utilisation function if given, and of
+    `vehicle_station_utilisation_function` otherwise. Any `initial_allocations`
+    (for example from `relaxation.optimise_relaxation`) replace the first
+    members of the initial population.
+
+    If `adaptive_operator_selection` the `mutation_function` (which must accept
+    `operator_weights` and `applied_operators`, as `mutate_full` and
+    `mutate_retain_vehicle_numbers` do) picks its operators with probabilities
+    proportional to their improvement per second of evaluation time so far,
+    plus `minimum_operator_weight`. The cumulative operator statistics of each
+    generation are recorded in `run_statistics["operator_statistics"]`.
+
+    The `objective_function` is called with the same arguments as
+    `objective.get_objective`. For example
+    `functools.partial(objective.get_aggregated_scenario_objective,
+    aggregation=np.min)` with stacked `demand_rates` and
+    `vehicle_station_utilisation_function=utilisation.solve_utilisations_scenarios`
+    optimises the worst case over a number of demand scenarios.
+
+    If `pickup_clusters` (from `objective.get_pickup_clusters`) are given the
+    problem is first optimised for `coarse_number_of_iterations` (or
+    `number_of_iterations`) on the clustered problem of
+    `objective.get_clustered_problem`, and its best allocation is added to the
+    `initial_allocations` of the optimisation of the full problem. Its
+    objective by iteration is recorded in
+    `run_statistics["coarse_objective_by_iteration"]`.
+
+    An `objective.Problem` is passed as `**problem._asdict()`. Its precomputed
+    fields are not passed on to the clustered problem.
+
+    The population is held in two preallocated (population_size, 2,
+    number_of_locations) buffers of `POPULATION_DTYPE`: every generation is
+    ranked into the other buffer, and the offspring are written into the slots
+    after the kept population.
+
+    A `population_utilisation_function` (see `evaluate_population`) is used
+    for the full evaluations only, not for the screening.
+
+    If `solver_diagnostics` and `run_statistics` is a dictionary the
+    diagnostics of the utilisation solves of the full evaluations of every
+    generation, and of the final ranking, are summarised by
+    `utilisation.get_diagnostics_summary` in
+    `run_statistics["solver_diagnostics"]`.
     """
+    if pickup_clusters is not None:
+        coarse_kwargs = {
+            key: value
+            for key, value in kwargs.items()
+            if key not in objective.PROBLEM_INVARIANTS
+        }
+        (
+            coarse_demand_rates,
+            coarse_primary_survivals,
+            coarse_secondary_survivals,
+            coarse_beta,
+            coarse_R,
+        ) = objective.get_clustered_problem(
+            demand_rates,
+            primary_survivals,
+            secondary_survivals,
+            beta,
+            R,
+            pickup_clusters,
+        )
+        coarse_primary, coarse_secondary, coarse_objective_by_iteration = optimise(
+            number_of_locations=number_of_locations,
+            number_of_primary_vehicles=number_of_primary_vehicles,
+            number_of_secondary_vehicles=number_of_secondary_vehicles,
+            max_primary=max_primary,
+            max_secondary=max_secondary,
+            population_size=population_size,
+            keep_size=keep_size,
+            number_of_iterations=coarse_number_of_iterations or number_of_iterations,
+            mutation_function=mutation_function,
+            initial_number_of_mutatation_repetitions=initial_number_of_mutatation_repetitions,
+            cooling_rate=cooling_rate,
+            demand_rates=coarse_demand_rates,
+            primary_survivals=coarse_primary_survivals,
+            secondary_survivals=coarse_secondary_survivals,
+            weights_single_vehicle=weights_single_vehicle,
+            weights_multiple_vehicles=weights_multiple_vehicles,
+            beta=coarse_beta,
+            R=coarse_R,
+            vehicle_station_utilisation_function=vehicle_station_utilisation_function,
+            seed=seed,
+            num_workers=num_workers,
+            randomise_vehicle_numbers=randomise_vehicle_numbers,
+            progress_bar=progress_bar,
+            screening_utilisation_function=screening_utilisation_function,
+            promotion_fraction=promotion_fraction,
+            screening_kwargs=screening_kwargs,
+            surrogate_screening=surrogate_screening,
+            surrogate_regularisation=surrogate_regularisation,
+            greedy_initialisation=greedy_initialisation,
+            greedy_top_k=greedy_top_k,
+            initial_allocations=initial_allocations,
+            adaptive_operator_selection=adaptive_operator_selection,
+            minimum_operator_weight=minimum_operator_weight,
+            objective_function=objective_function,
+            **coarse_kwargs,
+        )
+        initial_allocations = [np.array([coarse_primary, coarse_secondary])] + list(
+            initial_allocations if initial_allocations is not None else []
+        )
+        if run_statistics is not None:
+            run_statistics[
+                "coarse_objective_by_iteration"
+            ] = coarse_objective_by_iteration
+
+    if surrogate_screening and screening_utilisation_function is not None:
+        raise ValueError(
+            "Use either a screening utilisation function or surrogate screening."
+        )
     cache = {}
     np.random.seed(seed)
     objective_by_iteration = []
-    population = create_initial_population(
+    marginal_gains_function = None
+    if greedy_initialisation:
+        greedy_kwargs = kwargs
+        greedy_utilisation_function = vehicle_station_utilisation_function
+        if screening_utilisation_function is not None:
+            greedy_kwargs = {**kwargs, **(screening_kwargs or {})}
+            greedy_utilisation_function = screening_utilisation_function
+        marginal_gains_function = functools.partial(
+            objective.get_marginal_gains,
+            demand_rates=demand_rates,
+            primary_survivals=primary_survivals,
+            secondary_survivals=secondary_survivals,
+            weights_single_vehicle=weights_single_vehicle,
+            weights_multiple_vehicles=weights_multiple_vehicles,
+            beta=beta,
+            R=R,
+            vehicle_station_utilisation_function=greedy_utilisation_function,
+            **greedy_kwargs,
+        )
+    population, spare_population = (
+        np.empty((population_size, 2, number_of_locations), dtype=POPULATION_DTYPE)
+        for _ in range(2)
+    )
+    population[:] = create_initial_population(
         number_of_locations=number_of_locations,
         number_of_primary_vehicles=number_of_primary_vehicles,
         number_of_secondary_vehicles=number_of_secondary_vehicles,
@@ -305,10 +881,52 @@ def optimise(
         max_secondary=max_secondary,
         population_size=population_size,
         randomise_vehicle_numbers=randomise_vehicle_numbers,
+        marginal_gains_function=marginal_gains_function,
+        greedy_top_k=greedy_top_k,
     )
+    if initial_allocations is not None:
+        population[: len(initial_allocations)] = initial_allocations
 
     new_pop_size = population_size - keep_size
 
+    screening = (
+        surrogate_screening
+        or parent_utilisation_screening
+        or screening_utilisation_function is not None
+    )
+    number_of_candidates = new_pop_size
+    if screening:
+        screening_cache = {}
+        screening_kwargs = {
+            **kwargs,
+            "population_utilisation_function": None,
+            **(screening_kwargs or {}),
+        }
+        surrogate = {}
+        number_of_candidates = int(np.ceil(new_pop_size / promotion_fraction))
+        candidate_population = np.empty(
+            (number_of_candidates, 2, number_of_locations), dtype=POPULATION_DTYPE
+        )
+        if parent_utilisation_screening:
+            kwargs["utilisation_cache"] = {}
+        if run_statistics is not None:
+            run_statistics["screening_rank_correlation"] = []
+            run_statistics["screening_evaluations_saved"] = []
+            if surrogate_screening:
+                run_statistics["surrogate_rmse"] = []
+
+    if adaptive_operator_selection:
+        operator_statistics = get_initial_operator_statistics()
+        operator_weights = get_operator_weights(
+            operator_statistics, minimum_operator_weight
+        )
+        if run_statistics is not None:
+            run_statistics["operator_statistics"] = []
+
+    solver_diagnostics = solver_diagnostics and run_statistics is not None
+    if solver_diagnostics:
+        run_statistics["solver_diagnostics"] = []
+
     steps_to_reach_1 = (initial_number_of_mutatation_repetitions - 1) / cooling_rate
     repetitions = np.int64(
         np.ceil(
@@ -323,6 +941,8 @@ def optimise(
     if progress_bar:
         repetitions = tqdm.tqdm(repetitions)
     for number_of_repetitions in repetitions:
+        if solver_diagnostics:
+            kwargs["diagnostics"] = []
         ranked_population, objective_values = rank_population(
             population=population,
             demand_rates=demand_rates,
@@ -334,28 +954,194 @@ def optimise(
             R=R,
             vehicle_station_utilisation_function=vehicle_station_utilisation_function,
             num_workers=num_workers,
+            objective_function=objective_function,
             cache=cache,
+            out=spare_population,
             **kwargs,
         )
         objective_by_iteration.append(objective_values)
+        if surrogate_screening:
+            update_surrogate(surrogate, ranked_population, objective_values)
         kept_population = ranked_population[:keep_size]
-        new_population = []
-        for new_solution in range(new_pop_size):
+        new_population = ranked_population[keep_size:]
+        if screening:
+            new_population = candidate_population
+        parent_values = []
+        parent_indices = []
+        applied_operators_by_child = []
+        for new_solution in range(number_of_candidates):
+            parent_index = np.random.choice(range(keep_size))
+            parent_indices.append(parent_index)
             (
                 primary_allocation_to_mutate,
                 secondary_allocation_to_mutate,
-            ) = kept_population[np.random.choice(range(keep_size))]
+            ) = kept_population[parent_index]
+            child_mutation_function = mutation_function
+            if adaptive_operator_selection:
+                applied_operators = []
+                child_mutation_function = functools.partial(
+                    mutation_function,
+                    operator_weights=operator_weights,
+                    applied_operators=applied_operators,
+                )
+                applied_operators_by_child.append(applied_operators)
+                parent_values.append(objective_values[parent_index])
             mutated_solution = repeat_mutation(
-                mutation_function=mutation_function,
+                mutation_function=child_mutation_function,
                 times_to_repeat=number_of_repetitions,
                 primary_allocation=primary_allocation_to_mutate,
                 secondary_allocation=secondary_allocation_to_mutate,
                 max_primary=max_primary,
                 max_secondary=max_secondary,
             )
-            new_population.append(mutated_solution)
-        population = np.vstack([kept_population, np.array(new_population)])
+            new_population[new_solution] = mutated_solution
+        if screening:
+            if surrogate_screening:
+                screened_values = predict_surrogate(
+                    surrogate, new_population, surrogate_regularisation
+                )
+            elif parent_utilisation_screening:
+                screened_values = evaluate_population(
+                    population=new_population,
+                    demand_rates=demand_rates,
+                    primary_survivals=primary_survivals,
+                    secondary_survivals=secondary_survivals,
+                    weights_single_vehicle=weights_single_vehicle,
+                    weights_multiple_vehicles=weights_multiple_vehicles,
+                    beta=beta,
+                    R=R,
+                    vehicle_station_utilisation_function=vehicle_station_utilisation_function,
+                    num_workers=num_workers,
+                    objective_function=objective_function,
+                    given_population_utilisations=[
+                        kwargs["utilisation_cache"][
+                            (
+                                str(kept_population[parent_index][0]),
+                                str(kept_population[parent_index][1]),
+                            )
+                        ]
+                        for parent_index in parent_indices
+                    ],
+                    **screening_kwargs,
+                )
+            else:
+                screened_values = evaluate_population(
+                    population=new_population,
+                    demand_rates=demand_rates,
+                    primary_survivals=primary_survivals,
+                    secondary_survivals=secondary_survivals,
+                    weights_single_vehicle=weights_single_vehicle,
+                    weights_multiple_vehicles=weights_multiple_vehicles,
+                    beta=beta,
+                    R=R,
+                    vehicle_station_utilisation_function=screening_utilisation_function,
+                    num_workers=num_workers,
+                    objective_function=objective_function,
+                    cache=screening_cache,
+                    **screening_kwargs,
+                )
+            promoted = np.argsort(-screened_values)[:new_pop_size]
+            candidates, candidate_values = new_population, screened_values
+            new_population = np.take(
+                new_population,
+                promoted,
+                axis=0,
+                out=ranked_population[keep_size:],
+            )
+            screened_values = screened_values[promoted]
+            if adaptive_operator_selection:
+                parent_values = [parent_values[index] for index in promoted]
+                applied_operators_by_child = [
+                    applied_operators_by_child[index] for index in promoted
+                ]
+        if adaptive_operator_selection or (screening and run_statistics is not None):
+            # Offspring are evaluated now and read from the cache when the next
+            # generation is ranked.
+            promoted_values, evaluation_times = evaluate_population(
+                population=new_population,
+                demand_rates=demand_rates,
+                primary_survivals=primary_survivals,
+                secondary_survivals=secondary_survivals,
+                weights_single_vehicle=weights_single_vehicle,
+                weights_multiple_vehicles=weights_multiple_vehicles,
+                beta=beta,
+                R=R,
+                vehicle_station_utilisation_function=vehicle_station_utilisation_function,
+                num_workers=num_workers,
+                objective_function=objective_function,
+                cache=cache,
+                return_times=True,
+                **kwargs,
+            )
+        if adaptive_operator_selection:
+            for applied_operators, parent_value, value, evaluation_time in zip(
+                applied_operators_by_child,
+                parent_values,
+                promoted_values,
+                evaluation_times,
+            ):
+                update_operator_statistics(
+                    operator_statistics=operator_statistics,
+                    applied_operators=applied_operators,
+                    improvement=value - parent_value,
+                    evaluation_time=evaluation_time,
+                )
+            operator_weights = get_operator_weights(
+                operator_statistics, minimum_operator_weight
+            )
+            if run_statistics is not None:
+                run_statistics["operator_statistics"].append(
+                    {
+                        name: {**statistics, "weight": operator_weights[name]}
+                        for name, statistics in operator_statistics.items()
+                    }
+                )
+        if screening and run_statistics is not None:
+            sample = np.array([], dtype=int)
+            if screening_sample_size > 0:
+                not_promoted = np.setdiff1d(np.arange(number_of_candidates), promoted)
+                sample = np.random.choice(
+                    not_promoted,
+                    size=min(screening_sample_size, len(not_promoted)),
+                    replace=False,
+                )
+            sampled_values = evaluate_population(
+                population=candidates[sample],
+                demand_rates=demand_rates,
+                primary_survivals=primary_survivals,
+                secondary_survivals=secondary_survivals,
+                weights_single_vehicle=weights_single_vehicle,
+                weights_multiple_vehicles=weights_multiple_vehicles,
+                beta=beta,
+                R=R,
+                vehicle_station_utilisation_function=vehicle_station_utilisation_function,
+                num_workers=num_workers,
+                objective_function=objective_function,
+                cache=cache,
+                **kwargs,
+            )
+            all_screened_values = np.concatenate(
+                (screened_values, candidate_values[sample])
+            )
+            all_values = np.concatenate((promoted_values, sampled_values))
+            run_statistics["screening_rank_correlation"].append(
+                scipy.stats.spearmanr(all_screened_values, all_values).correlation
+            )
+            if surrogate_screening:
+                run_statistics["surrogate_rmse"].append(
+                    np.sqrt(np.mean((all_screened_values - all_values) ** 2))
+                )
+            run_statistics["screening_evaluations_saved"].append(
+                number_of_candidates - new_pop_size - len(sample)
+            )
+        if solver_diagnostics:
+            run_statistics["solver_diagnostics"].append(
+                utilisation.get_diagnostics_summary(kwargs["diagnostics"])
+            )
+        population, spare_population = ranked_population, population
 
+    if solver_diagnostics:
+        kwargs["diagnostics"] = []
     ranked_population, objective_values = rank_population(
         population=population,
         demand_rates=demand_rates,
@@ -367,14 +1153,247 @@ def optimise(
         R=R,
         vehicle_station_utilisation_function=vehicle_station_utilisation_function,
         num_workers=num_workers,
+        objective_function=objective_function,
         cache=cache,
         **kwargs,
     )
+    if solver_diagnostics:
+        run_statistics["solver_diagnostics"].append(
+            utilisation.get_diagnostics_summary(kwargs["diagnostics"])
+        )
 
-    best_primary_population, best_secondary_population = ranked_population[0]
+    best_primary_population, best_secondary_population = ranked_population[0].astype(
+        np.int64
+    )
 
     return (
         best_primary_population,
         best_secondary_population,
         np.array(objective_by_iteration),
     )
+
+
+def get_regional_allocation(
+    region_allocation, station_regions, representatives, max_allocation
+):
+    """
+    Places the vehicles of every region at its representative station, and
+    any that do not fit at the other stations of the region in turn.
+    """
+    allocation = np.zeros(len(station_regions), dtype=np.int64)
+    for region, number_of_vehicles in enumerate(region_allocation):
+        stations = np.flatnonzero(station_regions == region)
+        stations = np.concatenate(
+            ([representatives[region]], stations[stations != representatives[region]])
+        )
+        for station in stations:
+            allocation[station] = min(number_of_vehicles, max_allocation)
+            number_of_vehicles -= allocation[station]
+    return allocation
+
+
+def get_embedded_objective(
+    allocation_primary,
+    allocation_secondary,
+    stations,
+    fixed_allocation_primary,
+    fixed_allocation_secondary,
+    objective_function=objective.get_objective,
+    **kwargs,
+):
+    """
+    Evaluates the objective function of an allocation of some of the stations,
+    with the vehicles at all other stations fixed.
+    """
+    full_allocation_primary = np.array(fixed_allocation_primary)
+    full_allocation_secondary = np.array(fixed_allocation_secondary)
+    full_allocation_primary[stations] = allocation_primary
+    full_allocation_secondary[stations] = allocation_secondary
+    return objective_function(
+        allocation_primary=full_allocation_primary,
+        allocation_secondary=full_allocation_secondary,
+        **kwargs,
+    )
+
+
+def optimise_hierarchically(
+    station_regions,
+    number_of_primary_vehicles,
+    number_of_secondary_vehicles,
+    max_primary,
+    max_secondary,
+    population_size,
+    keep_size,
+    regional_number_of_iterations,
+    number_of_iterations,
+    initial_number_of_mutatation_repetitions,
+    cooling_rate,
+    demand_rates,
+    primary_survivals,
+    secondary_survivals,
+    weights_single_vehicle,
+    weights_multiple_vehicles,
+    beta,
+    R,
+    vehicle_station_utilisation_function,
+    seed,
+    num_workers,
+    objective_function=objective.get_objective,
+    run_statistics=None,
+    **kwargs,
+):
+    """
+    Optimise in two stages, given the region of every station from
+    `objective.get_station_regions`.
+
+    First the number of vehicles in every region is optimised for
+    `regional_number_of_iterations` on the problem of
+    `objective.get_regional_problem`, with one station for every region.
+    Then the vehicles of every region in turn are distributed between its
+    stations by optimising for `number_of_iterations` over those stations only,
+    with the vehicles in all other regions fixed. Regions where no vehicle can
+    be moved (without a primary vehicle, or with every station full) keep the
+    allocation of the first stage. A `population_utilisation_function` (see
+    `evaluate_population`) is only used in the first stage.
+
+    Returns the best allocation and the objective after the first stage and
+    after every region. If `run_statistics` is a dictionary the objective by
+    iteration of every optimisation is recorded in
+    `run_statistics["regional_objective_by_iteration"]` and
+    `run_statistics["objective_by_iteration_by_region"]`.
+    """
+    invariant_kwargs = {
+        key: value
+        for key, value in kwargs.items()
+        if key in objective.PROBLEM_INVARIANTS
+    }
+    problem_kwargs = dict(
+        demand_rates=demand_rates,
+        weights_single_vehicle=weights_single_vehicle,
+        weights_multiple_vehicles=weights_multiple_vehicles,
+        vehicle_station_utilisation_function=vehicle_station_utilisation_function,
+        num_workers=num_workers,
+        initial_number_of_mutatation_repetitions=initial_number_of_mutatation_repetitions,
+        cooling_rate=cooling_rate,
+        population_size=population_size,
+        keep_size=keep_size,
+        mutation_function=mutate_retain_vehicle_numbers,
+        seed=seed,
+        **{
+            key: value
+            for key, value in kwargs.items()
+            if key not in objective.PROBLEM_INVARIANTS
+        },
+    )
+    (
+        regional_primary_survivals,
+        regional_secondary_survivals,
+        regional_beta,
+        regional_R,
+        representatives,
+    ) = objective.get_regional_problem(
+        demand_rates, primary_survivals, secondary_survivals, beta, R, station_regions
+    )
+    region_sizes = np.bincount(station_regions)
+    region_primary, region_secondary, regional_objective_by_iteration = optimise(
+        number_of_locations=len(region_sizes),
+        number_of_primary_vehicles=number_of_primary_vehicles,
+        number_of_secondary_vehicles=number_of_secondary_vehicles,
+        max_primary=max_primary * region_sizes,
+        max_secondary=max_secondary * region_sizes,
+        number_of_iterations=regional_number_of_iterations,
+        primary_survivals=regional_primary_survivals,
+        secondary_survivals=regional_secondary_survivals,
+        beta=regional_beta,
+        R=regional_R,
+        objective_function=objective_function,
+        **problem_kwargs,
+    )
+
+    best_primary = get_regional_allocation(
+        region_primary, station_regions, representatives, max_primary
+    )
+    best_secondary = get_regional_allocation(
+        region_secondary, station_regions, representatives, max_secondary
+    )
+    full_problem_kwargs = dict(
+        demand_rates=demand_rates,
+        primary_survivals=primary_survivals,
+        secondary_survivals=secondary_survivals,
+        weights_single_vehicle=weights_single_vehicle,
+        weights_multiple_vehicles=weights_multiple_vehicles,
+        beta=beta,
+        R=R,
+        vehicle_station_utilisation_function=vehicle_station_utilisation_function,
+        **kwargs,
+    )
+    objective_by_stage = [
+        objective_function(
+            allocation_primary=best_primary,
+            allocation_secondary=best_secondary,
+            **full_problem_kwargs,
+        )
+    ]
+    objective_by_iteration_by_region = {}
+
+    for region, region_size in enumerate(region_sizes):
+        stations = np.flatnonzero(station_regions == region)
+        if (
+            0 < region_primary[region] < max_primary * region_size
+            and region_secondary[region] < max_secondary * region_size
+        ):
+            (
+                stations_primary,
+                stations_secondary,
+                objective_by_iteration,
+            ) = optimise(
+                number_of_locations=region_size,
+                number_of_primary_vehicles=region_primary[region],
+                number_of_secondary_vehicles=region_secondary[region],
+                max_primary=max_primary,
+                max_secondary=max_secondary,
+                number_of_iterations=number_of_iterations,
+                primary_survivals=primary_survivals,
+                secondary_survivals=secondary_survivals,
+                beta=beta,
+                R=R,
+                objective_function=functools.partial(
+                    get_embedded_objective,
+                    stations=stations,
+                    fixed_allocation_primary=best_primary,
+                    fixed_allocation_secondary=best_secondary,
+                    objective_function=objective_function,
+                ),
+                initial_allocations=[
+                    [best_primary[stations], best_secondary[stations]]
+                ],
+                **{
+                    **problem_kwargs,
+                    "population_utilisation_function": None,
+                },
+                **invariant_kwargs,
+            )
+            objective_by_iteration_by_region[region] = objective_by_iteration
+            best_primary = np.array(best_primary)
+            best_secondary = np.array(best_secondary)
+            best_primary[stations] = stations_primary
+            best_secondary[stations] = stations_secondary
+            objective_by_stage.append(
+                objective_function(
+                    allocation_primary=best_primary,
+                    allocation_secondary=best_secondary,
+                    **full_problem_kwargs,
+                )
+            )
+        else:
+            objective_by_stage.append(objective_by_stage[-1])
+
+    if run_statistics is not None:
+        run_statistics[
+            "regional_objective_by_iteration"
+        ] = regional_objective_by_iteration
+        run_statistics[
+            "objective_by_iteration_by_region"
+        ] = objective_by_iteration_by_region
+
+    return best_primary, best_secondary, np.array(objective_by_stage)
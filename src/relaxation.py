@@ -0,0 +1,659 @@
+"""
+This module contains code to optimise a continuous relaxation of the
+allocation problem: the number of vehicles at every station is treated as a
+real number so that the objective can be increased by projected gradient
+ascent. The gradients include the dependence of the utilisations on the
+allocation through the demand-utilisation relationships.
+"""
+import numpy as np
+import objective
+import scipy.optimize  # type: ignore
+
+
+def get_primary_relationship(
+    utilisations_primary, allocation_primary, beta, demand_rates, service_rate_primary
+):
+    """
+    Returns the residual of the primary demand rates relationship written in
+    terms of the utilisations, `rhs - service_rate * allocation * utilisations`,
+    and its derivatives.
+
+    Parameters
+    ----------
+    utilisations_primary : np.array
+        The utilisation rates of primary vehicles
+    allocation_primary : np.array
+        The (real valued) number of primary vehicles at every station
+    beta : np.array
+        A three dimensional array denoting which vehicles are preferred.
+    demand_rates : np.array
+        The demand rates of given patient classes from given pickup locations.
+    service_rate_primary : float
+        The service rates of primary vehicles
+
+    Returns
+    -------
+    tuple
+        Returns the residual vector and its Jacobians with respect to the
+        utilisations and to the allocation.
+    """
+    u, n = utilisations_primary, allocation_primary
+    not_busy = objective.get_is_not_busy_vector(u, n)
+    all_closer = objective.get_all_same_closer_busy_vector(u, n, beta)
+    weighted = demand_rates.sum(axis=0) * all_closer
+    reached = weighted.sum(axis=1)
+    preferred = np.einsum("ap,pba->ab", weighted, beta)
+
+    log_u = np.log(u)
+    residual = not_busy * reached - service_rate_primary * n * u
+    jacobian_utilisations = np.diag(
+        -n * np.power(u, n - 1) * reached - service_rate_primary * n
+    ) + not_busy[:, None] * preferred * (n / u)
+    jacobian_allocation = (
+        np.diag(-np.power(u, n) * log_u * reached - service_rate_primary * u)
+        + not_busy[:, None] * preferred * log_u
+    )
+    return residual, jacobian_utilisations, jacobian_allocation
+
+
+def get_secondary_relationship(
+    utilisations_secondary,
+    allocation_secondary,
+    utilisations_primary,
+    allocation_primary,
+    beta,
+    R,
+    demand_rates,
+    service_rate_secondary,
+):
+    """
+    Returns the residual of the secondary demand rates relationship written in
+    terms of the utilisations, `rhs - service_rate * allocation * utilisations`,
+    and its derivatives.
+
+    Parameters
+    ----------
+    utilisations_secondary : np.array
+        The utilisation rates of secondary vehicles
+    allocation_secondary : np.array
+        The (real valued) number of secondary vehicles at every station
+    utilisations_primary : np.array
+        The utilisation rates of primary vehicles
+    allocation_primary : np.array
+        The (real valued) number of primary vehicles at every station
+    beta : np.array
+        A three dimensional array denoting which vehicles are preferred.
+    R : np.array
+        A three dimensional array denoting which primary vehicles are preferred.
+    demand_rates : np.array
+        The demand rates of given patient classes from given pickup locations.
+    service_rate_secondary : float
+        The service rates of secondary vehicles
+
+    Returns
+    -------
+    tuple
+        Returns the residual vector and its Jacobians with respect to the
+        secondary utilisations, the secondary allocation, the primary
+        utilisations and the primary allocation.
+    """
+    u, n = utilisations_secondary, allocation_secondary
+    not_busy = objective.get_is_not_busy_vector(u, n)
+    all_closer = objective.get_all_same_closer_busy_vector(u, n, beta)
+    all_primary_closer = objective.get_all_primary_closer_busy_vector(
+        utilisations_primary, allocation_primary, R
+    )
+    weighted = demand_rates[:-1].sum(axis=0) * all_closer * all_primary_closer.T
+    reached = weighted.sum(axis=1)
+    preferred = np.einsum("ap,pba->ab", weighted, beta)
+    primary_preferred = not_busy[:, None] * np.einsum("ap,pba->ab", weighted, R)
+
+    log_u = np.log(u)
+    residual = not_busy * reached - service_rate_secondary * n * u
+    jacobian_utilisations = np.diag(
+        -n * np.power(u, n - 1) * reached - service_rate_secondary * n
+    ) + not_busy[:, None] * preferred * (n / u)
+    jacobian_allocation = (
+        np.diag(-np.power(u, n) * log_u * reached - service_rate_secondary * u)
+        + not_busy[:, None] * preferred * log_u
+    )
+    jacobian_primary_utilisations = primary_preferred * (
+        allocation_primary / utilisations_primary
+    )
+    jacobian_primary_allocation = primary_preferred * np.log(utilisations_primary)
+    return (
+        residual,
+        jacobian_utilisations,
+        jacobian_allocation,
+        jacobian_primary_utilisations,
+        jacobian_primary_allocation,
+    )
+
+
+def solve_relaxed_utilisations(
+    allocation_primary,
+    allocation_secondary,
+    beta,
+    R,
+    demand_rates,
+    service_rate_primary,
+    service_rate_secondary,
+    overall_utilisation_limit=0.99,
+    minimum_utilisation=1e-12,
+):
+    """
+    Finds the utilisations of a real valued allocation by finding roots of the
+    demand-utilisation relationships using their analytic Jacobians.
+
+    Parameters
+    ----------
+    allocation_primary : np.array
+        The (real valued) number of primary vehicles at every station
+    allocation_secondary : np.array
+        The (real valued) number of secondary vehicles at every station
+    beta : np.array
+        A three dimensional array denoting which vehicles are preferred.
+    R : np.array
+        A three dimensional array denoting which primary vehicles are preferred.
+    demand_rates : np.array
+        The demand rates of given patient classes from given pickup locations.
+    service_rate_primary : float
+        The service rates of primary vehicles
+    service_rate_secondary : float
+        The service rates of secondary vehicles
+    overall_utilisation_limit : float
+        A default limit for the utilisation which is used if the theoretic
+        utilisation is above 1.
+    minimum_utilisation : float
+        A lower bound on the utilisations so that their logarithms exist.
+
+    Returns
+    -------
+    tuple
+        Returns the primary utilisations, the secondary utilisations and two
+        booleans indicating whether each of them is fixed (that is does not
+        depend on the allocation).
+    """
+
+    def solve(relationship, total_demand, allocation, service_rate):
+        if allocation.sum() == 0:
+            return np.full(len(allocation), minimum_utilisation), True
+        if total_demand / (service_rate * allocation.sum()) > overall_utilisation_limit:
+            return np.full(len(allocation), overall_utilisation_limit), True
+        starting_utilisations = np.clip(
+            total_demand / (len(allocation) * allocation * service_rate),
+            minimum_utilisation,
+            overall_utilisation_limit,
+        )
+        utilisations = scipy.optimize.fsolve(
+            lambda u: relationship(np.maximum(u, minimum_utilisation))[0],
+            starting_utilisations,
+            fprime=lambda u: relationship(np.maximum(u, minimum_utilisation))[1],
+        )
+        return np.maximum(utilisations, minimum_utilisation), False
+
+    utilisations_primary, is_fixed_primary = solve(
+        lambda u: get_primary_relationship(
+            u, allocation_primary, beta, demand_rates, service_rate_primary
+        ),
+        demand_rates.sum(),
+        allocation_primary,
+        service_rate_primary,
+    )
+    utilisations_secondary, is_fixed_secondary = solve(
+        lambda u: get_secondary_relationship(
+            u,
+            allocation_secondary,
+            utilisations_primary,
+            allocation_primary,
+            beta,
+            R,
+            demand_rates,
+            service_rate_secondary,
+        ),
+        demand_rates[:-1].sum(),
+        allocation_secondary,
+        service_rate_secondary,
+    )
+    return (
+        utilisations_primary,
+        utilisations_secondary,
+        is_fixed_primary,
+        is_fixed_secondary,
+    )
+
+
+def get_objective_partial_derivatives(
+    demand_rates,
+    primary_survivals,
+    secondary_survivals,
+    weights_single_vehicle,
+    weights_multiple_vehicles,
+    beta,
+    R,
+    allocation_primary,
+    allocation_secondary,
+    utilisations_primary,
+    utilisations_secondary,
+):
+    """
+    Returns the objective function and its partial derivatives with respect to
+    the (real valued) allocations and the utilisations.
+
+    Parameters
+    ----------
+    demand_rates : np.array
+        The demand rates of given patient classes from given pickup locations.
+    primary_survivals : np.array
+        The survival probability due to primary vehicles.
+    secondary_survivals : np.array
+        The survival probability due to secondary vehicles.
+    weights_single_vehicle : np.array
+        The weighting given to each class of patients
+    weights_multiple_vehicles : np.array
+        The weighting given to each class of patients
+    beta : np.array
+        A three dimensional array denoting which vehicles are preferred.
+    R : np.array
+        A three dimensional array denoting which primary vehicles are preferred.
+    allocation_primary : np.array
+        The (real valued) number of primary vehicles at every station
+    allocation_secondary : np.array
+        The (real valued) number of secondary vehicles at every station
+    utilisations_primary : np.array
+        The utilisation rates of primary vehicles
+    utilisations_secondary : np.array
+        The utilisation rates of secondary vehicles
+
+    Returns
+    -------
+    tuple
+        Returns the objective and its partial derivatives with respect to the
+        primary allocation, the secondary allocation, the primary utilisations
+        and the secondary utilisations.
+    """
+    u_p, n_p = utilisations_primary, allocation_primary
+    u_s, n_s = utilisations_secondary, allocation_secondary
+    primary_is_not_busy = objective.get_is_not_busy_vector(u_p, n_p)
+    secondary_is_not_busy = objective.get_is_not_busy_vector(u_s, n_s)
+    all_closer_busy_primary = objective.get_all_same_closer_busy_vector(u_p, n_p, beta)
+    all_closer_busy_secondary = objective.get_all_same_closer_busy_vector(
+        u_s, n_s, beta
+    )
+    all_primary_closer_than_secondary_busy = (
+        objective.get_all_primary_closer_busy_vector(u_p, n_p, R)
+    )
+    all_secondary_closer_than_primary_busy = (
+        objective.get_all_secondary_closer_busy_vector(u_s, n_s, R)
+    )
+
+    single_primary = np.einsum(
+        "kpa,k,kp->pa", primary_survivals, weights_single_vehicle, demand_rates
+    )
+    multiple_primary = np.einsum(
+        "kpa,k,kp->pa", primary_survivals, weights_multiple_vehicles, demand_rates
+    )
+    multiple_secondary = np.einsum(
+        "kpa,k,kp->pa", secondary_survivals, weights_multiple_vehicles, demand_rates
+    )
+
+    primary_reached = (
+        single_primary + multiple_primary * all_secondary_closer_than_primary_busy
+    ) * all_closer_busy_primary.T
+    secondary_reached = (
+        multiple_secondary
+        * all_closer_busy_secondary.T
+        * all_primary_closer_than_secondary_busy
+    )
+    primary_terms = primary_reached * primary_is_not_busy
+    secondary_terms = secondary_reached * secondary_is_not_busy
+    multiple_primary_terms = (
+        multiple_primary
+        * all_closer_busy_primary.T
+        * all_secondary_closer_than_primary_busy
+        * primary_is_not_busy
+    )
+    g = primary_terms.sum() + secondary_terms.sum()
+
+    primary_exponent_sensitivity = np.einsum(
+        "pa,pba->b", primary_terms, beta
+    ) + np.einsum("pa,pba->b", secondary_terms, R)
+    secondary_exponent_sensitivity = np.einsum(
+        "pa,pba->b", secondary_terms, beta
+    ) + np.einsum("pa,pab->b", multiple_primary_terms, 1 - R)
+    primary_not_busy_sensitivity = primary_reached.sum(axis=0)
+    secondary_not_busy_sensitivity = secondary_reached.sum(axis=0)
+
+    d_allocation_primary = np.log(u_p) * (
+        primary_exponent_sensitivity - np.power(u_p, n_p) * primary_not_busy_sensitivity
+    )
+    d_allocation_secondary = np.log(u_s) * (
+        secondary_exponent_sensitivity
+        - np.power(u_s, n_s) * secondary_not_busy_sensitivity
+    )
+    d_utilisations_primary = n_p * (
+        primary_exponent_sensitivity / u_p
+        - np.power(u_p, n_p - 1) * primary_not_busy_sensitivity
+    )
+    d_utilisations_secondary = n_s * (
+        secondary_exponent_sensitivity / u_s
+        - np.power(u_s, n_s - 1) * secondary_not_busy_sensitivity
+    )
+    return (
+        g,
+        d_allocation_primary,
+        d_allocation_secondary,
+        d_utilisations_primary,
+        d_utilisations_secondary,
+    )
+
+
+def get_relaxed_objective_gradient(
+    demand_rates,
+    primary_survivals,
+    secondary_survivals,
+    weights_single_vehicle,
+    weights_multiple_vehicles,
+    beta,
+    R,
+    allocation_primary,
+    allocation_secondary,
+    service_rate_primary,
+    service_rate_secondary,
+    overall_utilisation_limit=0.99,
+):
+    """
+    Returns the objective function of a real valued allocation and its
+    gradient. The implicit dependence of the utilisations on the allocation is
+    obtained by solving the adjoint of the demand-utilisation relationships.
+
+    Parameters
+    ----------
+    demand_rates : np.array
+        The demand rates of given patient classes from given pickup locations.
+    primary_survivals : np.array
+        The survival probability due to primary vehicles.
+    secondary_survivals : np.array
+        The survival probability due to secondary vehicles.
+    weights_single_vehicle : np.array
+        The weighting given to each class of patients
+    weights_multiple_vehicles : np.array
+        The weighting given to each class of patients
+    beta : np.array
+        A three dimensional array denoting which vehicles are preferred.
+    R : np.array
+        A three dimensional array denoting which primary vehicles are preferred.
+    allocation_primary : np.array
+        The (real valued) number of primary vehicles at every station
+    allocation_secondary : np.array
+        The (real valued) number of secondary vehicles at every station
+    service_rate_primary : float
+        The service rates of primary vehicles
+    service_rate_secondary : float
+        The service rates of secondary vehicles
+    overall_utilisation_limit : float
+        A default limit for the utilisation which is used if the theoretic
+        utilisation is above 1.
+
+    Returns
+    -------
+    tuple
+        Returns the objective and its gradients with respect to the primary
+        allocation and the secondary allocation.
+    """
+    (
+        utilisations_primary,
+        utilisations_secondary,
+        is_fixed_primary,
+        is_fixed_secondary,
+    ) = solve_relaxed_utilisations(
+        allocation_primary=allocation_primary,
+        allocation_secondary=allocation_secondary,
+        beta=beta,
+        R=R,
+        demand_rates=demand_rates,
+        service_rate_primary=service_rate_primary,
+        service_rate_secondary=service_rate_secondary,
+        overall_utilisation_limit=overall_utilisation_limit,
+    )
+    (
+        g,
+        gradient_primary,
+        gradient_secondary,
+        d_utilisations_primary,
+        d_utilisations_secondary,
+    ) = get_objective_partial_derivatives(
+        demand_rates=demand_rates,
+        primary_survivals=primary_survivals,
+        secondary_survivals=secondary_survivals,
+        weights_single_vehicle=weights_single_vehicle,
+        weights_multiple_vehicles=weights_multiple_vehicles,
+        beta=beta,
+        R=R,
+        allocation_primary=allocation_primary,
+        allocation_secondary=allocation_secondary,
+        utilisations_primary=utilisations_primary,
+        utilisations_secondary=utilisations_secondary,
+    )
+
+    if not is_fixed_secondary:
+        (
+            _,
+            jacobian_utilisations,
+            jacobian_allocation,
+            jacobian_primary_utilisations,
+            jacobian_primary_allocation,
+        ) = get_secondary_relationship(
+            utilisations_secondary,
+            allocation_secondary,
+            utilisations_primary,
+            allocation_primary,
+            beta,
+            R,
+            demand_rates,
+            service_rate_secondary,
+        )
+        adjoint = np.linalg.solve(jacobian_utilisations.T, d_utilisations_secondary)
+        gradient_secondary = gradient_secondary - adjoint @ jacobian_allocation
+        gradient_primary = gradient_primary - adjoint @ jacobian_primary_allocation
+        d_utilisations_primary = (
+            d_utilisations_primary - adjoint @ jacobian_primary_utilisations
+        )
+
+    if not is_fixed_primary:
+        _, jacobian_utilisations, jacobian_allocation = get_primary_relationship(
+            utilisations_primary,
+            allocation_primary,
+            beta,
+            demand_rates,
+            service_rate_primary,
+        )
+        adjoint = np.linalg.solve(jacobian_utilisations.T, d_utilisations_primary)
+        gradient_primary = gradient_primary - adjoint @ jacobian_allocation
+
+    return g, gradient_primary, gradient_secondary
+
+
+def project_allocation(allocation, total, max_allocation, min_allocation=0):
+    """
+    Returns the closest real valued allocation to `allocation` with the given
+    total and every entry between `min_allocation` and `max_allocation`.
+
+    Parameters
+    ----------
+    allocation : np.array
+        A real valued allocation
+    total : float
+        The required total number of vehicles
+    max_allocation : float
+        The maximum number of vehicles at every station
+    min_allocation : float
+        The minimum number of vehicles at every station
+
+    Returns
+    -------
+    np.array
+    """
+    if total == 0:
+        return np.zeros_like(allocation, dtype=np.float64)
+    shift = scipy.optimize.brentq(
+        lambda tau: np.clip(allocation - tau, min_allocation, max_allocation).sum()
+        - total,
+        allocation.min() - max_allocation,
+        allocation.max() - min_allocation,
+    )
+    return np.clip(allocation - shift, min_allocation, max_allocation)
+
+
+def round_allocation(allocation, total, max_allocation):
+    """
+    Rounds a real valued allocation to an integer allocation with the given
+    total, giving the remaining vehicles to the largest fractional parts.
+
+    Parameters
+    ----------
+    allocation : np.array
+        A real valued allocation with every entry at most `max_allocation`
+    total : int
+        The required total number of vehicles
+    max_allocation : int
+        The maximum number of vehicles at every station
+
+    Returns
+    -------
+    np.array
+    """
+    rounded = np.minimum(np.floor(allocation), max_allocation).astype(np.int64)
+    fractional_part = np.where(rounded < max_allocation, allocation - rounded, -1)
+    remaining = int(total - rounded.sum())
+    rounded[np.argsort(-fractional_part, kind="stable")[:remaining]] += 1
+    return rounded
+
+
+def optimise_relaxation(
+    number_of_primary_vehicles,
+    number_of_secondary_vehicles,
+    max_primary,
+    max_secondary,
+    number_of_iterations,
+    demand_rates,
+    primary_survivals,
+    secondary_survivals,
+    weights_single_vehicle,
+    weights_multiple_vehicles,
+    beta,
+    R,
+    service_rate_primary,
+    service_rate_secondary,
+    step_size=1.0,
+    step_decay=0.9,
+    min_allocation=0.01,
+    overall_utilisation_limit=0.99,
+):
+    """
+    Optimises the continuous relaxation by projected gradient ascent and
+    rounds the best real valued allocation found to a feasible integer
+    allocation.
+
+    Parameters
+    ----------
+    number_of_primary_vehicles : int
+        The total number of primary vehicles
+    number_of_secondary_vehicles : int
+        The total number of secondary vehicles
+    max_primary : int
+        The maximum number of primary vehicles at every station
+    max_secondary : int
+        The maximum number of secondary vehicles at every station
+    number_of_iterations : int
+        The number of gradient steps
+    demand_rates : np.array
+        The demand rates of given patient classes from given pickup locations.
+    primary_survivals : np.array
+        The survival probability due to primary vehicles.
+    secondary_survivals : np.array
+        The survival probability due to secondary vehicles.
+    weights_single_vehicle : np.array
+        The weighting given to each class of patients
+    weights_multiple_vehicles : np.array
+        The weighting given to each class of patients
+    beta : np.array
+        A three dimensional array denoting which vehicles are preferred.
+    R : np.array
+        A three dimensional array denoting which primary vehicles are preferred.
+    service_rate_primary : float
+        The service rates of primary vehicles
+    service_rate_secondary : float
+        The service rates of secondary vehicles
+    step_size : float
+        The largest change (in vehicles) at any station in the first step.
+    step_decay : float
+        The factor by which the step size is reduced after every step.
+    min_allocation : float
+        The minimum real valued number of vehicles at every station, which
+        keeps the demand-utilisation relationships non singular.
+    overall_utilisation_limit : float
+        A default limit for the utilisation which is used if the theoretic
+        utilisation is above 1.
+
+    Returns
+    -------
+    tuple
+        Returns the best primary allocation, the best secondary allocation and
+        the relaxed objective at every iteration.
+    """
+    number_of_locations = beta.shape[1]
+    totals = (number_of_primary_vehicles, number_of_secondary_vehicles)
+    maximums = (max_primary, max_secondary)
+    minimums = [min(min_allocation, total / number_of_locations) for total in totals]
+    allocations = [
+        project_allocation(
+            np.full(number_of_locations, total / number_of_locations),
+            total,
+            maximum,
+            minimum,
+        )
+        for total, maximum, minimum in zip(totals, maximums, minimums)
+    ]
+    best_objective = -np.inf
+    best_allocations = allocations
+    objective_by_iteration = []
+    for _ in range(number_of_iterations):
+        g, *gradients = get_relaxed_objective_gradient(
+            demand_rates=demand_rates,
+            primary_survivals=primary_survivals,
+            secondary_survivals=secondary_survivals,
+            weights_single_vehicle=weights_single_vehicle,
+            weights_multiple_vehicles=weights_multiple_vehicles,
+            beta=beta,
+            R=R,
+            allocation_primary=allocations[0],
+            allocation_secondary=allocations[1],
+            service_rate_primary=service_rate_primary,
+            service_rate_secondary=service_rate_secondary,
+            overall_utilisation_limit=overall_utilisation_limit,
+        )
+        objective_by_iteration.append(g)
+        if g > best_objective:
+            best_objective, best_allocations = g, allocations
+        largest_gradient = max(np.abs(gradient).max() for gradient in gradients)
+        if largest_gradient == 0:
+            break
+        allocations = [
+            project_allocation(
+                allocation + step_size * gradient / largest_gradient,
+                total,
+                maximum,
+                minimum,
+            )
+            for allocation, gradient, total, maximum, minimum in zip(
+                allocations, gradients, totals, maximums, minimums
+            )
+        ]
+        step_size *= step_decay
+
+    best_primary, best_secondary = (
+        round_allocation(allocation, total, maximum)
+        for allocation, total, maximum in zip(best_allocations, totals, maximums)
+    )
+    return best_primary, best_secondary, np.array(objective_by_iteration)
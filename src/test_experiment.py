@@ -1,5 +1,6 @@
 import subprocess
 import pandas as pd  # type: ignore
+import optimisation
 
 
 def test_run_experiment():
@@ -582,3 +583,44 @@ def test_run_experiment_full_mutation():
         .sum()
     )
     assert total_primary + (total_secondary / 3) == 11
+
+
+def test_run_experiment_with_run_statistics():
+    """
+    Runs the experiment with adaptive operators and solver diagnostics and
+    checks the statistics files name the operators and the summaries.
+    """
+    args = [
+        "python",
+        "src/experiment.py",
+        "10",
+        "3",
+        "1",
+        "1",
+        "2",
+        "1",
+        "5",
+        "6",
+        "0.25",
+        "13",
+        "55555",
+        "1",
+        "--adaptive_operators",
+        "--solver_diagnostics",
+    ]
+    result = subprocess.check_call(args, cwd="../")
+    assert result == 0
+
+    operator_statistics = pd.read_csv("../results/operator_statistics_55555.csv")
+    assert list(operator_statistics.columns) == [
+        "iteration",
+        "operator",
+        "applications",
+        "improvement",
+        "evaluation_time",
+        "weight",
+    ]
+    assert set(operator_statistics["operator"]) == set(optimisation.MUTATION_OPERATORS)
+    solver_diagnostics = pd.read_csv("../results/solver_diagnostics_55555.csv")
+    assert list(solver_diagnostics["iteration"]) == list(range(6))
+    assert solver_diagnostics["solves"][0] > 0
@@ -1,4 +1,6 @@
 import numpy as np
+import pytest
+import tracemalloc
 import types
 import objective
 import utilisation
@@ -500,6 +502,70 @@ def test_get_objective():
     assert round(g, 4) == demand_rates.sum()
 
 
+def test_get_objective_ignores_zero_weighted_classes():
+    primary_travel_times = np.array(
+        [[0, 5, 10, 15, 20], [5, 0, 5, 10, 15], [10, 5, 0, 5, 10], [15, 10, 5, 0, 5]]
+    )
+    secondary_travel_times = 0.7 * primary_travel_times
+    beta = objective.get_beta(primary_travel_times)
+    R = objective.get_R(primary_travel_times, secondary_travel_times)
+    survival_functions = (
+        lambda t: 1 / (1 + np.exp(0.26 + 0.139 * t)),
+        lambda t: np.heaviside(15 - t, 1),
+        lambda t: np.heaviside(60 - t, 1),
+    )
+    primary_survivals, secondary_survivals = objective.get_survival_time_vectors(
+        survival_functions, primary_travel_times, secondary_travel_times
+    )
+    parameters = dict(
+        demand_rates=np.array(((2, 2, 3, 3, 7), (2, 0, 1, 2, 4), (1, 1, 1, 1, 1))),
+        beta=beta,
+        R=R,
+        vehicle_station_utilisation_function=utilisation.given_utilisations,
+        allocation_primary=np.array([1, 0, 0, 1]),
+        allocation_secondary=np.array([0, 2, 1, 1]),
+        given_utilisations_primary=np.array([0.2, 0.5, 0.7, 1.0]),
+        given_utilisations_secondary=np.array([0.6, 0.6, 0.2, 0.2]),
+    )
+
+    g = objective.get_objective(
+        primary_survivals=primary_survivals,
+        secondary_survivals=secondary_survivals,
+        weights_single_vehicle=np.array([0, 0, 1]),
+        weights_multiple_vehicles=np.array([1, 1, 0]),
+        **parameters,
+    )
+    g_single = objective.get_objective(
+        primary_survivals=primary_survivals,
+        secondary_survivals=secondary_survivals,
+        weights_single_vehicle=np.array([0, 0, 1]),
+        weights_multiple_vehicles=np.array([0, 0, 0]),
+        **parameters,
+    )
+    g_multiple = objective.get_objective(
+        primary_survivals=primary_survivals,
+        secondary_survivals=secondary_survivals,
+        weights_single_vehicle=np.array([0, 0, 0]),
+        weights_multiple_vehicles=np.array([1, 1, 0]),
+        **parameters,
+    )
+    assert np.isclose(g, g_single + g_multiple)
+
+    # The survivals of classes with no weight are never used
+    primary_survivals[2] = np.nan
+    secondary_survivals[2] = np.nan
+    assert np.isclose(
+        objective.get_objective(
+            primary_survivals=primary_survivals,
+            secondary_survivals=secondary_survivals,
+            weights_single_vehicle=np.array([0, 0, 0]),
+            weights_multiple_vehicles=np.array([1, 1, 0]),
+            **parameters,
+        ),
+        g_multiple,
+    )
+
+
 def test_caching_of_objective():
     """
     This confirms:
@@ -609,3 +675,931 @@ def test_caching_of_objective():
         ("[0 0 0 0]", "[0 0 0 0]"),
         ("[1 0 0 1]", "[0 2 1 1]"),
     }
+
+
+def test_get_marginal_gains():
+    primary_travel_times = np.array(
+        [[0, 5, 10, 15, 20], [5, 0, 5, 10, 15], [10, 5, 0, 5, 10], [15, 10, 5, 0, 5]]
+    )
+    secondary_travel_times = 0.7 * primary_travel_times
+    beta = objective.get_beta(primary_travel_times)
+    R = objective.get_R(primary_travel_times, secondary_travel_times)
+    survival_functions = (
+        lambda t: 1 / (1 + np.exp(0.26 + 0.139 * t)),
+        lambda t: np.heaviside(15 - t, 1),
+        lambda t: np.heaviside(60 - t, 1),
+    )
+    primary_survivals, secondary_survivals = objective.get_survival_time_vectors(
+        survival_functions, primary_travel_times, secondary_travel_times
+    )
+    parameters = dict(
+        demand_rates=np.array(((2, 2, 3, 3, 7), (2, 0, 1, 2, 4), (1, 1, 1, 1, 1))),
+        primary_survivals=primary_survivals,
+        secondary_survivals=secondary_survivals,
+        weights_single_vehicle=np.array([0, 0, 1]),
+        weights_multiple_vehicles=np.array([1, 1, 0]),
+        beta=beta,
+        R=R,
+        vehicle_station_utilisation_function=utilisation.given_utilisations,
+        given_utilisations_primary=np.array([0.2, 0.5, 0.7, 1.0]),
+        given_utilisations_secondary=np.array([0.6, 0.6, 0.2, 0.2]),
+    )
+    allocation_primary = np.array([1, 0, 0, 1])
+    allocation_secondary = np.array([0, 2, 1, 0])
+
+    primary_gains, secondary_gains = objective.get_marginal_gains(
+        allocation_primary=allocation_primary,
+        allocation_secondary=allocation_secondary,
+        **parameters,
+    )
+
+    g = objective.get_objective(
+        allocation_primary=allocation_primary,
+        allocation_secondary=allocation_secondary,
+        **parameters,
+    )
+    for station, add_one in enumerate(np.eye(4, dtype=np.int64)):
+        g_primary = objective.get_objective(
+            allocation_primary=allocation_primary + add_one,
+            allocation_secondary=allocation_secondary,
+            **parameters,
+        )
+        g_secondary = objective.get_objective(
+            allocation_primary=allocation_primary,
+            allocation_secondary=allocation_secondary + add_one,
+            **parameters,
+        )
+        assert np.isclose(primary_gains[station], g_primary - g)
+        assert np.isclose(secondary_gains[station], g_secondary - g)
+
+
+def test_get_compact_problem():
+    primary_travel_times = np.array(
+        [[0, 5, 10, 15, 20], [5, 0, 5, 10, 15], [10, 5, 0, 5, 10], [15, 10, 5, 0, 5]]
+    )
+    secondary_travel_times = 0.7 * primary_travel_times
+    beta = objective.get_beta(primary_travel_times)
+    R = objective.get_R(primary_travel_times, secondary_travel_times)
+    survival_functions = (
+        lambda t: 1 / (1 + np.exp(0.26 + 0.139 * t)),
+        lambda t: np.heaviside(15 - t, 1),
+        lambda t: np.heaviside(60 - t, 1),
+    )
+    primary_survivals, secondary_survivals = objective.get_survival_time_vectors(
+        survival_functions, primary_travel_times, secondary_travel_times
+    )
+    demand_rates = np.array(((2, 0, 3, 0, 7), (2, 0, 1, 0, 4), (1, 0, 1, 0, 1))) / 100
+
+    (
+        compact_demand_rates,
+        compact_primary_survivals,
+        compact_secondary_survivals,
+        compact_beta,
+        compact_R,
+    ) = objective.get_compact_problem(
+        demand_rates, primary_survivals, secondary_survivals, beta, R
+    )
+
+    assert compact_demand_rates.shape == (3, 3)
+    assert compact_primary_survivals.shape == (3, 3, 4)
+    assert compact_secondary_survivals.shape == (3, 3, 4)
+    assert compact_beta.shape == (3, 4, 4)
+    assert compact_R.shape == (3, 4, 4)
+    assert np.array_equal(compact_beta, beta[[0, 2, 4]])
+
+    allocation_primary = np.array([1, 0, 0, 1])
+    allocation_secondary = np.array([0, 2, 1, 0])
+    parameters = dict(
+        weights_single_vehicle=np.array([0, 0, 1]),
+        weights_multiple_vehicles=np.array([1, 1, 0]),
+        vehicle_station_utilisation_function=utilisation.solve_utilisations,
+        allocation_primary=allocation_primary,
+        allocation_secondary=allocation_secondary,
+        service_rate_primary=1 / 30,
+        service_rate_secondary=1 / 20,
+    )
+    g = objective.get_objective(
+        demand_rates=demand_rates,
+        primary_survivals=primary_survivals,
+        secondary_survivals=secondary_survivals,
+        beta=beta,
+        R=R,
+        **parameters,
+    )
+    compact_g = objective.get_objective(
+        demand_rates=compact_demand_rates,
+        primary_survivals=compact_primary_survivals,
+        secondary_survivals=compact_secondary_survivals,
+        beta=compact_beta,
+        R=compact_R,
+        **parameters,
+    )
+    assert np.isclose(g, compact_g)
+
+
+def test_evaluate_breakdown():
+    primary_travel_times = np.array(
+        [[0, 5, 10, 15, 20], [5, 0, 5, 10, 15], [10, 5, 0, 5, 10], [15, 10, 5, 0, 5]]
+    )
+    secondary_travel_times = 0.7 * primary_travel_times
+    beta = objective.get_beta(primary_travel_times)
+    R = objective.get_R(primary_travel_times, secondary_travel_times)
+    survival_functions = (
+        lambda t: 1 / (1 + np.exp(0.26 + 0.139 * t)),
+        lambda t: np.heaviside(15 - t, 1),
+        lambda t: np.heaviside(60 - t, 1),
+    )
+    primary_survivals, secondary_survivals = objective.get_survival_time_vectors(
+        survival_functions, primary_travel_times, secondary_travel_times
+    )
+    parameters = dict(
+        demand_rates=np.array(((2, 2, 3, 3, 7), (2, 0, 1, 2, 4), (1, 1, 1, 1, 1)))
+        / 100,
+        primary_survivals=primary_survivals,
+        secondary_survivals=secondary_survivals,
+        weights_single_vehicle=np.array([0, 0, 1]),
+        weights_multiple_vehicles=np.array([1, 1, 0]),
+        beta=beta,
+        R=R,
+        vehicle_station_utilisation_function=utilisation.solve_utilisations,
+        allocation_primary=np.array([1, 0, 0, 1]),
+        allocation_secondary=np.array([0, 2, 1, 0]),
+        service_rate_primary=1 / 30,
+        service_rate_secondary=1 / 20,
+    )
+
+    breakdown = objective.evaluate_breakdown(**parameters)
+
+    assert np.isclose(breakdown["objective"], objective.get_objective(**parameters))
+    assert np.isclose(
+        breakdown["survival_A1"], objective.get_survival_A1_only(**parameters)
+    )
+    assert breakdown["class_objectives"].shape == (3,)
+    assert breakdown["pickup_contributions"].shape == (5,)
+    assert breakdown["station_contributions"].shape == (4,)
+    assert np.isclose(breakdown["class_objectives"].sum(), breakdown["objective"])
+    assert np.isclose(breakdown["pickup_contributions"].sum(), breakdown["objective"])
+    assert np.isclose(breakdown["station_contributions"].sum(), breakdown["objective"])
+    assert np.allclose(
+        breakdown["class_objectives"],
+        [
+            breakdown["multiple_vehicle_survivals"][0],
+            breakdown["multiple_vehicle_survivals"][1],
+            breakdown["single_vehicle_survivals"][2],
+        ],
+    )
+    assert np.isclose(
+        breakdown["survival_A1"], breakdown["multiple_vehicle_survivals"][0]
+    )
+    primary_utilisations, secondary_utilisations = utilisation.solve_utilisations(
+        **parameters
+    )
+    assert np.allclose(breakdown["primary_utilisations"], primary_utilisations)
+    assert np.allclose(breakdown["secondary_utilisations"], secondary_utilisations)
+
+
+def test_get_objective_by_weights():
+    primary_travel_times = np.array(
+        [[0, 5, 10, 15, 20], [5, 0, 5, 10, 15], [10, 5, 0, 5, 10], [15, 10, 5, 0, 5]]
+    )
+    secondary_travel_times = 0.7 * primary_travel_times
+    beta = objective.get_beta(primary_travel_times)
+    R = objective.get_R(primary_travel_times, secondary_travel_times)
+    survival_functions = (
+        lambda t: 1 / (1 + np.exp(0.26 + 0.139 * t)),
+        lambda t: np.heaviside(15 - t, 1),
+        lambda t: np.heaviside(60 - t, 1),
+    )
+    primary_survivals, secondary_survivals = objective.get_survival_time_vectors(
+        survival_functions, primary_travel_times, secondary_travel_times
+    )
+    parameters = dict(
+        demand_rates=np.array(((2, 2, 3, 3, 7), (2, 0, 1, 2, 4), (1, 1, 1, 1, 1)))
+        / 100,
+        primary_survivals=primary_survivals,
+        secondary_survivals=secondary_survivals,
+        beta=beta,
+        R=R,
+        vehicle_station_utilisation_function=utilisation.solve_utilisations,
+        allocation_primary=np.array([1, 0, 0, 1]),
+        allocation_secondary=np.array([0, 2, 1, 0]),
+        service_rate_primary=1 / 30,
+        service_rate_secondary=1 / 20,
+    )
+    weights_single_vehicle = np.array([[0, 0, 1], [1, 1, 1], [0, 0, 0], [0.5, 0, 2]])
+    weights_multiple_vehicles = np.array([[1, 1, 0], [0, 0, 0], [1, 1, 1], [3, 0, 1]])
+
+    objectives = objective.get_objective_by_weights(
+        weights_single_vehicle=weights_single_vehicle,
+        weights_multiple_vehicles=weights_multiple_vehicles,
+        **parameters,
+    )
+
+    assert objectives.shape == (4,)
+    for single, multiple, value in zip(
+        weights_single_vehicle, weights_multiple_vehicles, objectives
+    ):
+        assert np.isclose(
+            value,
+            objective.get_objective(
+                weights_single_vehicle=single,
+                weights_multiple_vehicles=multiple,
+                **parameters,
+            ),
+        )
+
+
+def test_get_scenario_objectives():
+    primary_travel_times = np.array(
+        [[0, 5, 10, 15, 20], [5, 0, 5, 10, 15], [10, 5, 0, 5, 10], [15, 10, 5, 0, 5]]
+    )
+    secondary_travel_times = 0.7 * primary_travel_times
+    beta = objective.get_beta(primary_travel_times)
+    R = objective.get_R(primary_travel_times, secondary_travel_times)
+    survival_functions = (
+        lambda t: 1 / (1 + np.exp(0.26 + 0.139 * t)),
+        lambda t: np.heaviside(15 - t, 1),
+        lambda t: np.heaviside(60 - t, 1),
+    )
+    primary_survivals, secondary_survivals = objective.get_survival_time_vectors(
+        survival_functions, primary_travel_times, secondary_travel_times
+    )
+    demand_rates = (
+        np.array(
+            [
+                ((2, 2, 3, 3, 7), (2, 0, 1, 2, 4), (1, 1, 1, 1, 1)),
+                ((1, 4, 3, 0, 2), (2, 2, 1, 0, 4), (1, 0, 3, 1, 1)),
+            ]
+        )
+        / 1000
+    )
+    parameters = dict(
+        primary_survivals=primary_survivals,
+        secondary_survivals=secondary_survivals,
+        weights_single_vehicle=np.array([0, 0, 1]),
+        weights_multiple_vehicles=np.array([1, 1, 0]),
+        beta=beta,
+        R=R,
+        allocation_primary=np.array([1, 0, 2, 1]),
+        allocation_secondary=np.array([0, 2, 1, 0]),
+        service_rate_primary=1 / 30,
+        service_rate_secondary=1 / 20,
+    )
+
+    objectives = objective.get_scenario_objectives(
+        demand_rates=demand_rates,
+        vehicle_station_utilisation_function=utilisation.solve_utilisations_scenarios,
+        **parameters,
+    )
+    expected_objectives = [
+        objective.get_objective(
+            demand_rates=scenario_demand_rates,
+            vehicle_station_utilisation_function=utilisation.solve_utilisations,
+            **parameters,
+        )
+        for scenario_demand_rates in demand_rates
+    ]
+    assert np.allclose(objectives, expected_objectives)
+
+    # Utilisation functions returning vectors apply to every scenario
+    objectives = objective.get_scenario_objectives(
+        demand_rates=demand_rates,
+        vehicle_station_utilisation_function=utilisation.constant_utilisation,
+        utilisation_rate_primary=0.5,
+        utilisation_rate_secondary=0.4,
+        **parameters,
+    )
+    expected_objectives = [
+        objective.get_objective(
+            demand_rates=scenario_demand_rates,
+            vehicle_station_utilisation_function=utilisation.constant_utilisation,
+            utilisation_rate_primary=0.5,
+            utilisation_rate_secondary=0.4,
+            **parameters,
+        )
+        for scenario_demand_rates in demand_rates
+    ]
+    assert np.allclose(objectives, expected_objectives)
+
+    cache = {}
+    worst_objective = objective.get_aggregated_scenario_objective(
+        demand_rates=demand_rates,
+        vehicle_station_utilisation_function=utilisation.constant_utilisation,
+        utilisation_rate_primary=0.5,
+        utilisation_rate_secondary=0.4,
+        aggregation=np.min,
+        cache=cache,
+        **parameters,
+    )
+    assert np.isclose(worst_objective, min(expected_objectives))
+    assert list(cache.values()) == [worst_objective]
+
+
+def test_get_scenario_objectives_with_time_varying_travel_times():
+    primary_travel_times = np.array(
+        [
+            [
+                [0, 5, 10, 15, 20],
+                [5, 0, 5, 10, 15],
+                [10, 5, 0, 5, 10],
+                [15, 10, 5, 0, 5],
+            ],
+            [
+                [0, 9, 10, 30, 40],
+                [5, 0, 9, 10, 15],
+                [25, 5, 0, 5, 30],
+                [15, 10, 5, 0, 5],
+            ],
+        ]
+    )
+    secondary_travel_times = 0.7 * primary_travel_times
+    survival_functions = (
+        lambda t: 1 / (1 + np.exp(0.26 + 0.139 * t)),
+        lambda t: np.heaviside(15 - t, 1),
+        lambda t: np.heaviside(60 - t, 1),
+    )
+    (
+        beta,
+        R,
+        primary_survivals,
+        secondary_survivals,
+    ) = objective.get_time_varying_parameters(
+        survival_functions, primary_travel_times, secondary_travel_times
+    )
+    assert beta.shape == (2, 5, 4, 4)
+    assert R.shape == (2, 5, 4, 4)
+    assert primary_survivals.shape == (2, 3, 5, 4)
+    assert secondary_survivals.shape == (2, 3, 5, 4)
+    assert np.array_equal(beta[1], objective.get_beta(primary_travel_times[1]))
+
+    demand_rates = (
+        np.array(
+            [
+                ((2, 2, 3, 3, 7), (2, 0, 1, 2, 4), (1, 1, 1, 1, 1)),
+                ((1, 4, 3, 0, 2), (2, 2, 1, 0, 4), (1, 0, 3, 1, 1)),
+            ]
+        )
+        / 1000
+    )
+    parameters = dict(
+        weights_single_vehicle=np.array([0, 0, 1]),
+        weights_multiple_vehicles=np.array([1, 1, 0]),
+        allocation_primary=np.array([1, 0, 2, 1]),
+        allocation_secondary=np.array([0, 2, 1, 0]),
+        service_rate_primary=1 / 30,
+        service_rate_secondary=1 / 20,
+    )
+
+    objectives = objective.get_scenario_objectives(
+        demand_rates=demand_rates,
+        primary_survivals=primary_survivals,
+        secondary_survivals=secondary_survivals,
+        beta=beta,
+        R=R,
+        vehicle_station_utilisation_function=utilisation.solve_utilisations_scenarios,
+        **parameters,
+    )
+    for period in range(2):
+        assert np.isclose(
+            objectives[period],
+            objective.get_objective(
+                demand_rates=demand_rates[period],
+                primary_survivals=primary_survivals[period],
+                secondary_survivals=secondary_survivals[period],
+                beta=beta[period],
+                R=R[period],
+                vehicle_station_utilisation_function=utilisation.solve_utilisations,
+                **parameters,
+            ),
+        )
+
+
+def test_get_poisson_demand_samples():
+    demand_rates = np.array(((2, 2, 3, 3, 7), (2, 0, 1, 2, 4), (1, 1, 1, 1, 1))) / 10
+
+    samples = objective.get_poisson_demand_samples(
+        demand_rates, number_of_samples=2000, observation_period=10, seed=0
+    )
+
+    assert samples.shape == (2000, 3, 5)
+    assert np.all(samples[:, 1, 1] == 0)
+    assert np.allclose(samples.mean(axis=0), demand_rates, atol=0.05)
+    assert np.allclose(samples.var(axis=0), demand_rates / 10, atol=0.02)
+    assert np.array_equal(
+        samples,
+        objective.get_poisson_demand_samples(
+            demand_rates, number_of_samples=2000, observation_period=10, seed=0
+        ),
+    )
+
+
+def test_get_bootstrap_demand_samples():
+    historical_demand_rates = np.arange(4 * 3 * 5).reshape(4, 3, 5)
+
+    samples = objective.get_bootstrap_demand_samples(
+        historical_demand_rates, number_of_samples=10, seed=0
+    )
+
+    assert samples.shape == (10, 3, 5)
+    for sample in samples:
+        assert any(np.array_equal(sample, day) for day in historical_demand_rates)
+
+
+def test_get_conditional_value_at_risk():
+    values = np.array([5, 1, 4, 2, 3, 6, 8, 7, 10, 9])
+    assert objective.get_conditional_value_at_risk(values, alpha=0.2) == 1.5
+    assert objective.get_conditional_value_at_risk(values, alpha=0.25) == 2
+    assert objective.get_conditional_value_at_risk(values, alpha=1) == values.mean()
+
+
+def test_get_objective_with_pickup_chunks():
+    primary_travel_times = np.array(
+        [[0, 5, 10, 15, 20], [5, 0, 5, 10, 15], [10, 5, 0, 5, 10], [15, 10, 5, 0, 5]]
+    )
+    secondary_travel_times = 0.7 * primary_travel_times
+    beta = objective.get_beta(primary_travel_times)
+    R = objective.get_R(primary_travel_times, secondary_travel_times)
+    survival_functions = (
+        lambda t: 1 / (1 + np.exp(0.26 + 0.139 * t)),
+        lambda t: np.heaviside(15 - t, 1),
+        lambda t: np.heaviside(60 - t, 1),
+    )
+    primary_survivals, secondary_survivals = objective.get_survival_time_vectors(
+        survival_functions, primary_travel_times, secondary_travel_times
+    )
+    utilisations = np.array([0.2, 0.5, 0.7, 1.0])
+    allocation = np.array([1, 0, 2, 1])
+
+    assert objective.get_pickup_chunks(5, 2) == [
+        slice(0, 2),
+        slice(2, 4),
+        slice(4, 6),
+    ]
+    for pickup_chunk_size in (1, 2, 3, 5, 10):
+        assert np.allclose(
+            objective.get_all_same_closer_busy_vector(
+                utilisations, allocation, beta, pickup_chunk_size
+            ),
+            objective.get_all_same_closer_busy_vector(utilisations, allocation, beta),
+        )
+        assert np.allclose(
+            objective.get_all_primary_closer_busy_vector(
+                utilisations, allocation, R, pickup_chunk_size
+            ),
+            objective.get_all_primary_closer_busy_vector(utilisations, allocation, R),
+        )
+        assert np.allclose(
+            objective.get_all_secondary_closer_busy_vector(
+                utilisations, allocation, R, pickup_chunk_size
+            ),
+            objective.get_all_secondary_closer_busy_vector(utilisations, allocation, R),
+        )
+
+    parameters = dict(
+        demand_rates=np.array(((2, 2, 3, 3, 7), (2, 0, 1, 2, 4), (1, 1, 1, 1, 1)))
+        / 100,
+        primary_survivals=primary_survivals,
+        secondary_survivals=secondary_survivals,
+        weights_single_vehicle=np.array([0, 0, 1]),
+        weights_multiple_vehicles=np.array([1, 1, 0]),
+        beta=beta,
+        R=R,
+        vehicle_station_utilisation_function=utilisation.solve_utilisations,
+        allocation_primary=allocation,
+        allocation_secondary=np.array([0, 2, 1, 0]),
+        service_rate_primary=1 / 30,
+        service_rate_secondary=1 / 20,
+    )
+    g = objective.get_objective(**parameters)
+    assert np.isclose(objective.get_objective(pickup_chunk_size=2, **parameters), g)
+    assert np.isclose(
+        objective.get_objective(
+            pickup_chunk_size=2, pickup_num_workers=2, **parameters
+        ),
+        g,
+    )
+
+
+def get_real_objective_parameters():
+    raw_travel_times = np.genfromtxt(
+        "./test_data/travel_times_matrix.csv", delimiter=","
+    )
+    beta = objective.get_beta(travel_times=raw_travel_times)
+    primary_vehicle_travel_times = raw_travel_times / 0.75
+    secondary_vehicle_travel_times = raw_travel_times / 1.215
+    R = objective.get_R(
+        primary_vehicle_travel_times=primary_vehicle_travel_times,
+        secondary_vehicle_travel_times=secondary_vehicle_travel_times,
+    )
+    survival_functions = (
+        lambda t: 1 / (1 + np.exp(0.26 + 0.139 * t)),
+        lambda t: np.heaviside(15 - t, 1),
+        lambda t: np.heaviside(60 - t, 1),
+    )
+    primary_survivals, secondary_survivals = objective.get_survival_time_vectors(
+        survival_functions, primary_vehicle_travel_times, secondary_vehicle_travel_times
+    )
+    demand_rates = np.genfromtxt("./test_data/demand.csv", delimiter=",") / 1440
+    allocation = np.genfromtxt("./test_data/allocation_61.csv", delimiter=",")
+    return dict(
+        demand_rates=demand_rates,
+        primary_survivals=primary_survivals,
+        secondary_survivals=secondary_survivals,
+        weights_single_vehicle=np.array([0, 0, 1]),
+        weights_multiple_vehicles=np.array([1, 1, 0]),
+        beta=beta,
+        R=R,
+        vehicle_station_utilisation_function=utilisation.constant_utilisation,
+        allocation_primary=allocation[:67],
+        allocation_secondary=allocation[67:],
+        utilisation_rate_primary=0.5,
+        utilisation_rate_secondary=0.4,
+    )
+
+
+def get_peak_memory_of_objective(parameters, pickup_chunk_size):
+    tracemalloc.start()
+    g = objective.get_objective(pickup_chunk_size=pickup_chunk_size, **parameters)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return g, peak
+
+
+def test_pickup_chunks_bound_peak_memory():
+    parameters = get_real_objective_parameters()
+    g, peak = get_peak_memory_of_objective(parameters, pickup_chunk_size=None)
+    chunked_g, chunked_peak = get_peak_memory_of_objective(
+        parameters, pickup_chunk_size=16
+    )
+    assert np.isclose(g, chunked_g)
+    assert chunked_peak < peak / 4
+
+
+@pytest.mark.parametrize("pickup_chunk_size", [None, 128, 32, 8])
+def test_benchmark_pickup_chunk_size(benchmark, pickup_chunk_size):
+    parameters = get_real_objective_parameters()
+    _, peak = get_peak_memory_of_objective(parameters, pickup_chunk_size)
+    benchmark.extra_info["peak_memory"] = peak
+    g = benchmark(
+        objective.get_objective, pickup_chunk_size=pickup_chunk_size, **parameters
+    )
+    assert round(g, 6) == 0.175965
+
+
+def test_get_objective_with_pickup_workers():
+    assert objective.map_pickup_chunks(lambda chunk: chunk.start, 10, 3, 2) == [
+        0,
+        3,
+        6,
+        9,
+    ]
+    assert objective.map_pickup_chunks(lambda chunk: chunk, 10, None, 4) == [
+        slice(0, 3),
+        slice(3, 6),
+        slice(6, 9),
+        slice(9, 12),
+    ]
+
+    parameters = get_real_objective_parameters()
+    g = objective.get_objective(**parameters)
+    for pickup_chunk_size in (None, 32):
+        assert np.isclose(
+            objective.get_objective(
+                pickup_chunk_size=pickup_chunk_size, pickup_num_workers=4, **parameters
+            ),
+            g,
+        )
+
+
+def test_map_pickup_chunks_reuses_workspace_executor():
+    workspace: dict = {}
+    assert objective.map_pickup_chunks(
+        lambda chunk: chunk.start, 10, 3, 2, workspace
+    ) == [0, 3, 6, 9]
+    executor = workspace[("executor", 2)]
+    objective.map_pickup_chunks(lambda chunk: chunk.start, 10, 3, 2, workspace)
+    assert objective.get_workspace_executor(workspace, 2) is executor
+    assert len(workspace) == 1
+
+    with objective.pickup_workspace(workspace, 2) as given_workspace:
+        assert given_workspace is workspace
+    assert workspace[("executor", 2)] is executor
+    with objective.pickup_workspace(None, None) as no_workspace:
+        assert no_workspace is None
+    with objective.pickup_workspace(None, 1) as no_workspace:
+        assert no_workspace is None
+    with objective.pickup_workspace(None, 2) as new_workspace:
+        objective.map_pickup_chunks(lambda chunk: chunk, 10, 3, 2, new_workspace)
+        new_executor = new_workspace[("executor", 2)]
+    assert new_workspace == {}
+    with pytest.raises(RuntimeError):
+        new_executor.submit(print)
+
+
+@pytest.mark.parametrize("pickup_num_workers", [None, 2, 4])
+def test_benchmark_pickup_num_workers(benchmark, pickup_num_workers):
+    parameters = get_real_objective_parameters()
+    g = benchmark(
+        objective.get_objective, pickup_num_workers=pickup_num_workers, **parameters
+    )
+    assert round(g, 6) == 0.175965
+
+
+def test_get_truncated_objective():
+    primary_travel_times = np.array(
+        [[0, 5, 10, 15, 20], [5, 0, 5, 10, 15], [10, 5, 0, 5, 10], [15, 10, 5, 0, 5]]
+    )
+    secondary_travel_times = 0.7 * primary_travel_times
+    beta = objective.get_beta(primary_travel_times)
+    R = objective.get_R(primary_travel_times, secondary_travel_times)
+    survival_functions = (
+        lambda t: 1 / (1 + np.exp(0.26 + 0.139 * t)),
+        lambda t: np.heaviside(15 - t, 1),
+        lambda t: np.heaviside(60 - t, 1),
+    )
+    primary_survivals, secondary_survivals = objective.get_survival_time_vectors(
+        survival_functions, primary_travel_times, secondary_travel_times
+    )
+    assert np.array_equal(
+        objective.get_nearest_stations(beta, 2),
+        np.array([[0, 1], [1, 0], [2, 1], [3, 2], [3, 2]]),
+    )
+
+    parameters = dict(
+        demand_rates=np.array(((2, 2, 3, 3, 7), (2, 0, 1, 2, 4), (1, 1, 1, 1, 1)))
+        / 100,
+        primary_survivals=primary_survivals,
+        secondary_survivals=secondary_survivals,
+        weights_single_vehicle=np.array([0, 0, 1]),
+        weights_multiple_vehicles=np.array([1, 1, 0]),
+        beta=beta,
+        R=R,
+        vehicle_station_utilisation_function=utilisation.solve_utilisations,
+        allocation_primary=np.array([1, 0, 2, 1]),
+        allocation_secondary=np.array([0, 2, 1, 0]),
+        service_rate_primary=1 / 30,
+        service_rate_secondary=1 / 20,
+    )
+    g = objective.get_objective(**parameters)
+    for number_of_nearest_stations in (1, 2, 3):
+        truncated_problem = objective.get_truncated_problem(
+            primary_survivals, secondary_survivals, beta, R, number_of_nearest_stations
+        )
+        truncated_g, error_bound = objective.get_truncated_objective(
+            truncated_problem=truncated_problem, return_error_bound=True, **parameters
+        )
+        assert 0 <= g - truncated_g <= error_bound + 1e-12
+
+    truncated_problem = objective.get_truncated_problem(
+        primary_survivals, secondary_survivals, beta, R, 4
+    )
+    assert np.isclose(
+        objective.get_truncated_objective(
+            truncated_problem=truncated_problem, **parameters
+        ),
+        g,
+    )
+
+
+@pytest.mark.parametrize("number_of_nearest_stations", [4, 8, 16, 32])
+def test_benchmark_number_of_nearest_stations(benchmark, number_of_nearest_stations):
+    parameters = get_real_objective_parameters()
+    g = objective.get_objective(**parameters)
+    truncated_problem = objective.get_truncated_problem(
+        parameters["primary_survivals"],
+        parameters["secondary_survivals"],
+        parameters["beta"],
+        parameters["R"],
+        number_of_nearest_stations,
+    )
+    truncated_g, error_bound = benchmark(
+        objective.get_truncated_objective,
+        truncated_problem=truncated_problem,
+        return_error_bound=True,
+        **parameters,
+    )
+    benchmark.extra_info["error"] = g - truncated_g
+    benchmark.extra_info["error_bound"] = error_bound
+    assert 0 <= g - truncated_g <= error_bound
+
+
+def test_get_pickup_clusters():
+    travel_times = np.array(
+        [[1, 2, 20, 21, 1.5, 22], [20, 21, 1, 2, 20.5, 1.5], [5, 5, 5, 5, 5, 5]]
+    )
+    demand_rates = np.array([[1, 2, 1, 2, 0, 1], [0, 1, 1, 0, 0, 1]])
+    pickup_clusters = objective.get_pickup_clusters(
+        travel_times, demand_rates, number_of_clusters=2, seed=0
+    )
+    assert len(np.unique(pickup_clusters)) == 2
+    assert len(np.unique(pickup_clusters[[0, 1, 4]])) == 1
+    assert len(np.unique(pickup_clusters[[2, 3, 5]])) == 1
+
+    pickup_clusters = objective.get_pickup_clusters(
+        travel_times, demand_rates, number_of_clusters=6, seed=0
+    )
+    assert np.array_equal(np.sort(pickup_clusters), np.arange(6))
+
+
+def test_get_clustered_problem():
+    parameters = get_real_objective_parameters()
+    raw_travel_times = np.genfromtxt(
+        "./test_data/travel_times_matrix.csv", delimiter=","
+    )
+    pickup_clusters = objective.get_pickup_clusters(
+        raw_travel_times, parameters["demand_rates"], number_of_clusters=40, seed=0
+    )
+    (
+        demand_rates,
+        primary_survivals,
+        secondary_survivals,
+        beta,
+        R,
+    ) = objective.get_clustered_problem(
+        parameters["demand_rates"],
+        parameters["primary_survivals"],
+        parameters["secondary_survivals"],
+        parameters["beta"],
+        parameters["R"],
+        pickup_clusters,
+    )
+    assert demand_rates.shape == (3, 40)
+    assert primary_survivals.shape == secondary_survivals.shape == (3, 40, 67)
+    assert beta.shape == R.shape == (40, 67, 67)
+    assert np.allclose(demand_rates.sum(axis=1), parameters["demand_rates"].sum(axis=1))
+    assert np.allclose(
+        (demand_rates[:, :, np.newaxis] * primary_survivals).sum(axis=1),
+        (
+            parameters["demand_rates"][:, :, np.newaxis]
+            * parameters["primary_survivals"]
+        ).sum(axis=1),
+    )
+
+    g = objective.get_objective(**parameters)
+    clustered_g = objective.get_objective(
+        **{
+            **parameters,
+            "demand_rates": demand_rates,
+            "primary_survivals": primary_survivals,
+            "secondary_survivals": secondary_survivals,
+            "beta": beta,
+            "R": R,
+        }
+    )
+    assert np.isclose(clustered_g, g, rtol=0.1)
+
+    identity_problem = objective.get_clustered_problem(
+        parameters["demand_rates"],
+        parameters["primary_survivals"],
+        parameters["secondary_survivals"],
+        parameters["beta"],
+        parameters["R"],
+        np.arange(261),
+    )
+    assert np.allclose(identity_problem[0], parameters["demand_rates"])
+    assert np.array_equal(identity_problem[3], parameters["beta"])
+
+
+def test_get_regional_problem():
+    parameters = get_real_objective_parameters()
+    raw_travel_times = np.genfromtxt(
+        "./test_data/travel_times_matrix.csv", delimiter=","
+    )
+    station_regions = objective.get_station_regions(
+        raw_travel_times, number_of_regions=10, seed=0
+    )
+    assert station_regions.shape == (67,)
+    assert np.array_equal(np.unique(station_regions), np.arange(10))
+
+    (
+        primary_survivals,
+        secondary_survivals,
+        beta,
+        R,
+        representatives,
+    ) = objective.get_regional_problem(
+        parameters["demand_rates"],
+        parameters["primary_survivals"],
+        parameters["secondary_survivals"],
+        parameters["beta"],
+        parameters["R"],
+        station_regions,
+    )
+    assert np.array_equal(station_regions[representatives], np.arange(10))
+    assert primary_survivals.shape == secondary_survivals.shape == (3, 261, 10)
+    assert beta.shape == R.shape == (261, 10, 10)
+    assert np.array_equal(
+        beta[:, 2, 3], parameters["beta"][:, representatives[2], representatives[3]]
+    )
+
+
+def test_get_workspace_buffer():
+    workspace = {}
+    buffer = objective.get_workspace_buffer(workspace, (2, 3), np.float64)
+    assert buffer.shape == (2, 3)
+    assert objective.get_workspace_buffer(workspace, (2, 3), np.float64) is buffer
+    assert objective.get_workspace_buffer(workspace, (2, 3), np.float32) is not buffer
+    assert len(workspace) == 2
+    assert objective.get_workspace_buffer(None, (2, 3), np.float64) is not buffer
+
+
+def test_get_objective_with_workspace():
+    parameters = get_real_objective_parameters()
+    g = objective.get_objective(**parameters)
+    workspace = {}
+    for pickup_chunk_size, pickup_num_workers in ((None, None), (32, None), (32, 2)):
+        assert (
+            objective.get_objective(
+                workspace=workspace,
+                pickup_chunk_size=pickup_chunk_size,
+                pickup_num_workers=pickup_num_workers,
+                **parameters,
+            )
+            == g
+        )
+
+    tracemalloc.start()
+    objective.get_objective(workspace=workspace, **parameters)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    _, peak_without_workspace = get_peak_memory_of_objective(parameters, None)
+    assert peak < peak_without_workspace / 2
+
+
+def test_get_objective_with_weighted_survivals():
+    parameters = get_real_objective_parameters()
+    weighted_survivals = objective.get_weighted_survivals(
+        parameters["demand_rates"],
+        parameters["primary_survivals"],
+        parameters["secondary_survivals"],
+        parameters["weights_single_vehicle"],
+        parameters["weights_multiple_vehicles"],
+    )
+    assert len(weighted_survivals) == 3
+    assert all(survivals.shape == (261, 67) for survivals in weighted_survivals)
+    assert np.allclose(
+        weighted_survivals[0],
+        parameters["demand_rates"][2].reshape(-1, 1)
+        * parameters["primary_survivals"][2],
+    )
+
+    g = objective.get_objective(**parameters)
+    assert round(g, 6) == 0.175965
+    assert np.isclose(
+        objective.get_objective(weighted_survivals=weighted_survivals, **parameters),
+        g,
+        rtol=1e-12,
+    )
+
+
+def test_get_problem():
+    parameters = get_real_objective_parameters()
+    problem_parameters = {
+        key: parameters.pop(key)
+        for key in (
+            "demand_rates",
+            "primary_survivals",
+            "secondary_survivals",
+            "weights_single_vehicle",
+            "weights_multiple_vehicles",
+            "beta",
+            "R",
+        )
+    }
+    problem = objective.get_problem(**problem_parameters)
+    assert isinstance(problem, objective.Problem)
+    assert np.array_equal(
+        problem.pickup_demand_rates, problem_parameters["demand_rates"].sum(axis=0)
+    )
+    assert np.array_equal(
+        problem.multiple_pickup_demand_rates,
+        problem_parameters["demand_rates"][:-1].sum(axis=0),
+    )
+    assert not problem.beta.flags.writeable
+    assert problem_parameters["beta"].flags.writeable
+    with pytest.raises(ValueError):
+        problem.demand_rates[0, 0] = 1
+    with pytest.raises(AttributeError):
+        problem.beta = problem_parameters["beta"]  # type: ignore
+
+    g = objective.get_objective(**problem_parameters, **parameters)
+    assert np.isclose(
+        objective.get_objective(**problem._asdict(), **parameters), g, rtol=1e-12
+    )
+    assert np.isclose(
+        objective.get_survival_A1_only(**problem._asdict(), **parameters),
+        objective.get_survival_A1_only(**problem_parameters, **parameters),
+        rtol=1e-12,
+    )
+
+    low_precision_problem = objective.get_problem(
+        **problem_parameters, low_precision=True
+    )
+    assert low_precision_problem.demand_rates.dtype == np.float32
+    assert low_precision_problem.beta.dtype == bool
+    assert low_precision_problem.pickup_demand_rates.dtype == np.float32
+    assert np.isclose(
+        objective.get_objective(**low_precision_problem._asdict(), **parameters),
+        g,
+        rtol=1e-6,
+    )
@@ -1,8 +1,11 @@
+import functools
+import concurrent.futures
 import objective
 import optimisation
 import utilisation
 import numpy as np
 import random
+import pytest
 
 
 def test_move_vehicle_of_same_type():
@@ -224,6 +227,71 @@ def test_mutate_full_with_seed_5():
     assert resulting_secondary_allocation.dtype.type is np.int64
 
 
+def test_mutate_full_with_operator_weights():
+    primary_allocation = np.array([0, 1, 5, 1])
+    secondary_allocation = np.array([3, 9, 0, 0])
+    max_allocation = 5
+    operator_weights = {
+        "move_primary": 0,
+        "move_secondary": 0,
+        "primary_to_secondary": 1,
+        "secondary_to_primary": 0,
+    }
+
+    np.random.seed(0)
+    applied_operators = []
+    for _ in range(10):
+        (
+            resulting_primary_allocation,
+            resulting_secondary_allocation,
+        ) = optimisation.mutate_full(
+            primary_allocation=primary_allocation,
+            secondary_allocation=secondary_allocation,
+            max_primary=max_allocation,
+            max_secondary=max_allocation,
+            operator_weights=operator_weights,
+            applied_operators=applied_operators,
+        )
+        assert sum(resulting_primary_allocation) == sum(primary_allocation) - 1
+        assert sum(resulting_secondary_allocation) == sum(secondary_allocation) + 3
+    assert applied_operators == ["primary_to_secondary"] * 10
+
+
+def test_get_operator_weights():
+    operator_statistics = optimisation.get_initial_operator_statistics()
+    weights = optimisation.get_operator_weights(operator_statistics, 0.1)
+    assert weights == {name: 0.1 for name in optimisation.MUTATION_OPERATORS}
+
+    optimisation.update_operator_statistics(
+        operator_statistics=operator_statistics,
+        applied_operators=["move_primary", "move_secondary"],
+        improvement=2,
+        evaluation_time=1,
+    )
+    optimisation.update_operator_statistics(
+        operator_statistics=operator_statistics,
+        applied_operators=["primary_to_secondary"],
+        improvement=-5,
+        evaluation_time=1,
+    )
+    assert operator_statistics["move_primary"] == {
+        "applications": 0.5,
+        "improvement": 1.0,
+        "evaluation_time": 0.5,
+    }
+    assert operator_statistics["primary_to_secondary"] == {
+        "applications": 1,
+        "improvement": 0.0,
+        "evaluation_time": 1.0,
+    }
+
+    weights = optimisation.get_operator_weights(operator_statistics, 0.1)
+    assert np.isclose(weights["move_primary"], 0.6)
+    assert np.isclose(weights["move_secondary"], 0.6)
+    assert np.isclose(weights["primary_to_secondary"], 0.1)
+    assert np.isclose(weights["secondary_to_primary"], 0.1)
+
+
 def test_repeat_mutation():
     primary_allocation = np.array([0, 1, 5, 1])
     secondary_allocation = np.array([3, 9, 0, 0])
@@ -333,6 +401,74 @@ def test_create_initial_population_with_randomising_vehicle_numbers():
     assert np.array_equal(first_secondary_allocation, np.array([1, 0, 2, 2, 1, 3]))
 
 
+def test_create_initial_population_greedily():
+    number_of_locations = 6
+    population_size = 15
+    number_of_primary_vehicles = 8
+    number_of_secondary_vehicles = 12
+    max_primary = 3
+    max_secondary = 4
+
+    def marginal_gains_function(allocation_primary, allocation_secondary):
+        preference = np.array([6, 5, 4, 3, 2, 1])
+        return preference - allocation_primary, preference - 2 * allocation_secondary
+
+    np.random.seed(0)
+    population = optimisation.create_initial_population(
+        number_of_locations=number_of_locations,
+        number_of_primary_vehicles=number_of_primary_vehicles,
+        number_of_secondary_vehicles=number_of_secondary_vehicles,
+        max_primary=max_primary,
+        max_secondary=max_secondary,
+        population_size=population_size,
+        marginal_gains_function=marginal_gains_function,
+        greedy_top_k=3,
+    )
+
+    assert population.shape == (population_size, 2, number_of_locations)
+    for primary_allocation, secondary_allocation in population:
+        assert primary_allocation.sum() == number_of_primary_vehicles
+        assert secondary_allocation.sum() == number_of_secondary_vehicles
+        assert primary_allocation.max() <= max_primary
+        assert secondary_allocation.max() <= max_secondary
+        assert primary_allocation.dtype.type is np.int64
+        assert secondary_allocation.dtype.type is np.int64
+
+    first_primary_allocation, first_secondary_allocation = population[0]
+
+    assert np.array_equal(first_primary_allocation, np.array([3, 3, 2, 0, 0, 0]))
+    assert np.array_equal(first_secondary_allocation, np.array([3, 3, 2, 2, 1, 1]))
+    assert len({str(allocation) for allocation in population}) > 1
+
+
+def test_surrogate_fits_quadratic_objective():
+    np.random.seed(0)
+    population = np.random.randint(0, 4, size=(60, 2, 5))
+    objective_values = (
+        population[:, 0].sum(axis=1)
+        - 0.5 * (population[:, 1] ** 2).sum(axis=1)
+        + population[:, 0, 2] * population[:, 1, 2]
+    )
+
+    surrogate = {}
+    optimisation.update_surrogate(surrogate, population, objective_values)
+    optimisation.update_surrogate(surrogate, population[:10], objective_values[:10])
+
+    assert len(surrogate["seen"]) == len({(str(a[0]), str(a[1])) for a in population})
+    assert optimisation.get_surrogate_features(population).shape == (60, 26)
+
+    new_population = np.random.randint(0, 4, size=(10, 2, 5))
+    predictions = optimisation.predict_surrogate(
+        surrogate, new_population, regularisation=1e-8
+    )
+    expected = (
+        new_population[:, 0].sum(axis=1)
+        - 0.5 * (new_population[:, 1] ** 2).sum(axis=1)
+        + new_population[:, 0, 2] * new_population[:, 1, 2]
+    )
+    assert np.allclose(predictions, expected)
+
+
 def test_rank_population():
     # Read in data
     raw_travel_times = np.genfromtxt(
@@ -489,3 +625,1098 @@ def test_optimise(benchmark):
     assert sum(best_secondary) == num_vehicles
     assert objective_by_iteration.shape == (num_iters, pop_size)
     assert np.all(best_over_time[:-1] <= best_over_time[1:])
+
+
+def test_optimise_with_greedy_initialisation():
+    # Read in data
+    raw_travel_times = np.genfromtxt(
+        "./test_data/travel_times_matrix.csv", delimiter=","
+    )
+    beta = objective.get_beta(travel_times=raw_travel_times)
+    primary_vehicle_travel_times = raw_travel_times / 0.75
+    secondary_vehicle_travel_times = raw_travel_times / 1.215
+    R = objective.get_R(
+        primary_vehicle_travel_times=primary_vehicle_travel_times,
+        secondary_vehicle_travel_times=secondary_vehicle_travel_times,
+    )
+    survival_functions = (
+        lambda t: 1 / (1 + np.exp(0.26 + 0.139 * t)),
+        lambda t: np.heaviside(15 - t, 1),
+        lambda t: np.heaviside(60 - t, 1),
+    )
+    demand_rates = np.genfromtxt("./test_data/demand.csv", delimiter=",") / 1440
+
+    weights_single_vehicle = np.array([0, 0, 1])
+    weights_multiple_vehicles = np.array([1, 1, 0])
+
+    primary_survivals, secondary_survivals = objective.get_survival_time_vectors(
+        survival_functions, primary_vehicle_travel_times, secondary_vehicle_travel_times
+    )
+    given_utilisations_primary = np.genfromtxt(
+        "./test_data/primary_utilisations_61.csv", delimiter=","
+    )
+    given_utilisations_secondary = np.genfromtxt(
+        "./test_data/secondary_utilisations_61.csv", delimiter=","
+    )
+    parameters = dict(
+        number_of_locations=67,
+        number_of_primary_vehicles=6,
+        number_of_secondary_vehicles=3,
+        max_primary=2,
+        max_secondary=2,
+        population_size=6,
+        keep_size=2,
+        number_of_iterations=1,
+        mutation_function=optimisation.mutate_retain_vehicle_numbers,
+        initial_number_of_mutatation_repetitions=1,
+        cooling_rate=1,
+        demand_rates=demand_rates,
+        primary_survivals=primary_survivals,
+        secondary_survivals=secondary_survivals,
+        weights_single_vehicle=weights_single_vehicle,
+        weights_multiple_vehicles=weights_multiple_vehicles,
+        beta=beta,
+        R=R,
+        vehicle_station_utilisation_function=utilisation.given_utilisations,
+        seed=0,
+        num_workers=2,
+        given_utilisations_primary=given_utilisations_primary,
+        given_utilisations_secondary=given_utilisations_secondary,
+    )
+
+    _, _, random_objective_by_iteration = optimisation.optimise(**parameters)
+    best_primary, best_secondary, objective_by_iteration = optimisation.optimise(
+        greedy_initialisation=True, greedy_top_k=2, **parameters
+    )
+
+    assert sum(best_primary) == 6
+    assert sum(best_secondary) == 3
+    assert max(best_primary) <= 2
+    assert max(best_secondary) <= 2
+    assert objective_by_iteration[0].min() > random_objective_by_iteration[0].max()
+
+
+def test_optimise_with_initial_allocations():
+    # Read in data
+    raw_travel_times = np.genfromtxt(
+        "./test_data/travel_times_matrix.csv", delimiter=","
+    )
+    beta = objective.get_beta(travel_times=raw_travel_times)
+    primary_vehicle_travel_times = raw_travel_times / 0.75
+    secondary_vehicle_travel_times = raw_travel_times / 1.215
+    R = objective.get_R(
+        primary_vehicle_travel_times=primary_vehicle_travel_times,
+        secondary_vehicle_travel_times=secondary_vehicle_travel_times,
+    )
+    survival_functions = (
+        lambda t: 1 / (1 + np.exp(0.26 + 0.139 * t)),
+        lambda t: np.heaviside(15 - t, 1),
+        lambda t: np.heaviside(60 - t, 1),
+    )
+    demand_rates = np.genfromtxt("./test_data/demand.csv", delimiter=",") / 1440
+
+    weights_single_vehicle = np.array([0, 0, 1])
+    weights_multiple_vehicles = np.array([1, 1, 0])
+
+    primary_survivals, secondary_survivals = objective.get_survival_time_vectors(
+        survival_functions, primary_vehicle_travel_times, secondary_vehicle_travel_times
+    )
+    given_utilisations_primary = np.genfromtxt(
+        "./test_data/primary_utilisations_61.csv", delimiter=","
+    )
+    given_utilisations_secondary = np.genfromtxt(
+        "./test_data/secondary_utilisations_61.csv", delimiter=","
+    )
+    parameters = dict(
+        number_of_locations=67,
+        number_of_primary_vehicles=6,
+        number_of_secondary_vehicles=3,
+        max_primary=2,
+        max_secondary=2,
+        population_size=6,
+        keep_size=2,
+        number_of_iterations=1,
+        mutation_function=optimisation.mutate_retain_vehicle_numbers,
+        initial_number_of_mutatation_repetitions=1,
+        cooling_rate=1,
+        demand_rates=demand_rates,
+        primary_survivals=primary_survivals,
+        secondary_survivals=secondary_survivals,
+        weights_single_vehicle=weights_single_vehicle,
+        weights_multiple_vehicles=weights_multiple_vehicles,
+        beta=beta,
+        R=R,
+        vehicle_station_utilisation_function=utilisation.given_utilisations,
+        seed=0,
+        num_workers=2,
+        given_utilisations_primary=given_utilisations_primary,
+        given_utilisations_secondary=given_utilisations_secondary,
+    )
+
+    initial_allocations = np.zeros((2, 2, 67), dtype=np.int64)
+    initial_allocations[:, 0, :3] = 2
+    initial_allocations[0, 1, :3] = 1
+    initial_allocations[1, 1, 3:6] = 1
+    initial_objectives = optimisation.evaluate_population(
+        population=initial_allocations,
+        num_workers=2,
+        **{
+            key: value
+            for key, value in parameters.items()
+            if key in ("demand_rates", "primary_survivals", "secondary_survivals")
+            or key.startswith(("weights", "given", "beta", "R", "vehicle"))
+        },
+    )
+
+    _, _, objective_by_iteration = optimisation.optimise(
+        initial_allocations=initial_allocations, **parameters
+    )
+
+    assert np.all(np.isin(initial_objectives, objective_by_iteration[0]))
+
+
+def test_optimise_with_screening():
+    # Read in data
+    raw_travel_times = np.genfromtxt(
+        "./test_data/travel_times_matrix.csv", delimiter=","
+    )
+    beta = objective.get_beta(travel_times=raw_travel_times)
+    primary_vehicle_travel_times = raw_travel_times / 0.75
+    secondary_vehicle_travel_times = raw_travel_times / 1.215
+    R = objective.get_R(
+        primary_vehicle_travel_times=primary_vehicle_travel_times,
+        secondary_vehicle_travel_times=secondary_vehicle_travel_times,
+    )
+    survival_functions = (
+        lambda t: 1 / (1 + np.exp(0.26 + 0.139 * t)),
+        lambda t: np.heaviside(15 - t, 1),
+        lambda t: np.heaviside(60 - t, 1),
+    )
+    demand_rates = np.genfromtxt("./test_data/demand.csv", delimiter=",") / 1440
+
+    weights_single_vehicle = np.array([0, 0, 1])
+    weights_multiple_vehicles = np.array([1, 1, 0])
+
+    primary_survivals, secondary_survivals = objective.get_survival_time_vectors(
+        survival_functions, primary_vehicle_travel_times, secondary_vehicle_travel_times
+    )
+    given_utilisations_primary = np.genfromtxt(
+        "./test_data/primary_utilisations_61.csv", delimiter=","
+    )
+    given_utilisations_secondary = np.genfromtxt(
+        "./test_data/secondary_utilisations_61.csv", delimiter=","
+    )
+    pop_size = 10
+    keep_size = 4
+    num_iters = 5
+    max_alloc = 4
+    num_vehicles = 20
+
+    run_statistics = {}
+    best_primary, best_secondary, objective_by_iteration = optimisation.optimise(
+        number_of_locations=67,
+        number_of_primary_vehicles=num_vehicles,
+        number_of_secondary_vehicles=num_vehicles,
+        max_primary=max_alloc,
+        max_secondary=max_alloc,
+        population_size=pop_size,
+        keep_size=keep_size,
+        number_of_iterations=num_iters,
+        mutation_function=optimisation.mutate_retain_vehicle_numbers,
+        initial_number_of_mutatation_repetitions=1,
+        cooling_rate=1,
+        demand_rates=demand_rates,
+        primary_survivals=primary_survivals,
+        secondary_survivals=secondary_survivals,
+        weights_single_vehicle=weights_single_vehicle,
+        weights_multiple_vehicles=weights_multiple_vehicles,
+        beta=beta,
+        R=R,
+        vehicle_station_utilisation_function=utilisation.given_utilisations,
+        seed=0,
+        num_workers=2,
+        screening_utilisation_function=utilisation.constant_utilisation,
+        promotion_fraction=0.25,
+        screening_kwargs={
+            "utilisation_rate_primary": 0.7,
+            "utilisation_rate_secondary": 0.4,
+        },
+        run_statistics=run_statistics,
+        given_utilisations_primary=given_utilisations_primary,
+        given_utilisations_secondary=given_utilisations_secondary,
+    )
+    best_over_time = objective_by_iteration.max(axis=1)
+
+    assert sum(best_primary) == num_vehicles
+    assert sum(best_secondary) == num_vehicles
+    assert objective_by_iteration.shape == (num_iters, pop_size)
+    assert np.all(best_over_time[:-1] <= best_over_time[1:])
+    assert run_statistics["screening_evaluations_saved"] == [18] * num_iters
+    correlations = np.array(run_statistics["screening_rank_correlation"])
+    assert len(correlations) == num_iters
+    assert np.all((correlations >= -1) & (correlations <= 1))
+
+
+@pytest.mark.parametrize("screening_sample_size", [0, 3])
+def test_optimise_with_surrogate_screening(screening_sample_size):
+    # Read in data
+    raw_travel_times = np.genfromtxt(
+        "./test_data/travel_times_matrix.csv", delimiter=","
+    )
+    beta = objective.get_beta(travel_times=raw_travel_times)
+    primary_vehicle_travel_times = raw_travel_times / 0.75
+    secondary_vehicle_travel_times = raw_travel_times / 1.215
+    R = objective.get_R(
+        primary_vehicle_travel_times=primary_vehicle_travel_times,
+        secondary_vehicle_travel_times=secondary_vehicle_travel_times,
+    )
+    survival_functions = (
+        lambda t: 1 / (1 + np.exp(0.26 + 0.139 * t)),
+        lambda t: np.heaviside(15 - t, 1),
+        lambda t: np.heaviside(60 - t, 1),
+    )
+    demand_rates = np.genfromtxt("./test_data/demand.csv", delimiter=",") / 1440
+
+    weights_single_vehicle = np.array([0, 0, 1])
+    weights_multiple_vehicles = np.array([1, 1, 0])
+
+    primary_survivals, secondary_survivals = objective.get_survival_time_vectors(
+        survival_functions, primary_vehicle_travel_times, secondary_vehicle_travel_times
+    )
+    given_utilisations_primary = np.genfromtxt(
+        "./test_data/primary_utilisations_61.csv", delimiter=","
+    )
+    given_utilisations_secondary = np.genfromtxt(
+        "./test_data/secondary_utilisations_61.csv", delimiter=","
+    )
+    pop_size = 10
+    keep_size = 4
+    num_iters = 5
+    max_alloc = 4
+    num_vehicles = 20
+
+    run_statistics = {}
+    best_primary, best_secondary, objective_by_iteration = optimisation.optimise(
+        number_of_locations=67,
+        number_of_primary_vehicles=num_vehicles,
+        number_of_secondary_vehicles=num_vehicles,
+        max_primary=max_alloc,
+        max_secondary=max_alloc,
+        population_size=pop_size,
+        keep_size=keep_size,
+        number_of_iterations=num_iters,
+        mutation_function=optimisation.mutate_retain_vehicle_numbers,
+        initial_number_of_mutatation_repetitions=1,
+        cooling_rate=1,
+        demand_rates=demand_rates,
+        primary_survivals=primary_survivals,
+        secondary_survivals=secondary_survivals,
+        weights_single_vehicle=weights_single_vehicle,
+        weights_multiple_vehicles=weights_multiple_vehicles,
+        beta=beta,
+        R=R,
+        vehicle_station_utilisation_function=utilisation.given_utilisations,
+        seed=0,
+        num_workers=2,
+        surrogate_screening=True,
+        promotion_fraction=0.25,
+        screening_sample_size=screening_sample_size,
+        run_statistics=run_statistics,
+        given_utilisations_primary=given_utilisations_primary,
+        given_utilisations_secondary=given_utilisations_secondary,
+    )
+    best_over_time = objective_by_iteration.max(axis=1)
+
+    assert sum(best_primary) == num_vehicles
+    assert sum(best_secondary) == num_vehicles
+    assert objective_by_iteration.shape == (num_iters, pop_size)
+    assert np.all(best_over_time[:-1] <= best_over_time[1:])
+    assert (
+        run_statistics["screening_evaluations_saved"]
+        == [18 - screening_sample_size] * num_iters
+    )
+    correlations = np.array(run_statistics["screening_rank_correlation"])
+    assert len(correlations) == num_iters
+    assert np.all((correlations >= -1) & (correlations <= 1))
+    assert len(run_statistics["surrogate_rmse"]) == num_iters
+    assert np.all(np.array(run_statistics["surrogate_rmse"]) >= 0)
+
+
+def test_optimise_with_parent_utilisation_screening():
+    raw_travel_times = np.genfromtxt(
+        "./test_data/travel_times_matrix.csv", delimiter=","
+    )
+    primary_vehicle_travel_times = raw_travel_times / 0.75
+    secondary_vehicle_travel_times = raw_travel_times / 1.215
+    survival_functions = (
+        lambda t: 1 / (1 + np.exp(0.26 + 0.139 * t)),
+        lambda t: np.heaviside(15 - t, 1),
+        lambda t: np.heaviside(60 - t, 1),
+    )
+    primary_survivals, secondary_survivals = objective.get_survival_time_vectors(
+        survival_functions, primary_vehicle_travel_times, secondary_vehicle_travel_times
+    )
+    solved_allocations = []
+
+    def vehicle_station_utilisation_function(**kwargs):
+        solved_allocations.append(kwargs["allocation_primary"])
+        return utilisation.solve_utilisations(
+            root_finding_function=utilisation.solve_fixed_point, **kwargs
+        )
+
+    pop_size = 6
+    keep_size = 2
+    num_iters = 2
+    run_statistics: dict = {}
+    best_primary, best_secondary, objective_by_iteration = optimisation.optimise(
+        number_of_locations=67,
+        number_of_primary_vehicles=70,
+        number_of_secondary_vehicles=40,
+        max_primary=3,
+        max_secondary=3,
+        population_size=pop_size,
+        keep_size=keep_size,
+        number_of_iterations=num_iters,
+        mutation_function=optimisation.mutate_retain_vehicle_numbers,
+        initial_number_of_mutatation_repetitions=1,
+        cooling_rate=1,
+        demand_rates=np.genfromtxt("./test_data/demand.csv", delimiter=",") / 1440,
+        primary_survivals=primary_survivals,
+        secondary_survivals=secondary_survivals,
+        weights_single_vehicle=np.array([0, 0, 1]),
+        weights_multiple_vehicles=np.array([1, 1, 0]),
+        beta=objective.get_beta(travel_times=raw_travel_times),
+        R=objective.get_R(
+            primary_vehicle_travel_times=primary_vehicle_travel_times,
+            secondary_vehicle_travel_times=secondary_vehicle_travel_times,
+        ),
+        vehicle_station_utilisation_function=vehicle_station_utilisation_function,
+        seed=0,
+        num_workers=1,
+        parent_utilisation_screening=True,
+        promotion_fraction=0.5,
+        run_statistics=run_statistics,
+        service_rate_primary=1 / (4.5 * 60),
+        service_rate_secondary=1 / (3.5 * 60),
+    )
+
+    assert sum(best_primary) == 70
+    assert sum(best_secondary) == 40
+    assert objective_by_iteration.shape == (num_iters, pop_size)
+    assert run_statistics["screening_evaluations_saved"] == [4] * num_iters
+    correlations = np.array(run_statistics["screening_rank_correlation"])
+    assert len(correlations) == num_iters
+    assert np.all((correlations >= -1) & (correlations <= 1))
+    # Only the initial population and the promoted offspring are solved
+    assert len(solved_allocations) <= pop_size + num_iters * (pop_size - keep_size)
+
+
+def test_optimise_with_adaptive_operator_selection():
+    # Read in data
+    raw_travel_times = np.genfromtxt(
+        "./test_data/travel_times_matrix.csv", delimiter=","
+    )
+    beta = objective.get_beta(travel_times=raw_travel_times)
+    primary_vehicle_travel_times = raw_travel_times / 0.75
+    secondary_vehicle_travel_times = raw_travel_times / 1.215
+    R = objective.get_R(
+        primary_vehicle_travel_times=primary_vehicle_travel_times,
+        secondary_vehicle_travel_times=secondary_vehicle_travel_times,
+    )
+    survival_functions = (
+        lambda t: 1 / (1 + np.exp(0.26 + 0.139 * t)),
+        lambda t: np.heaviside(15 - t, 1),
+        lambda t: np.heaviside(60 - t, 1),
+    )
+    demand_rates = np.genfromtxt("./test_data/demand.csv", delimiter=",") / 1440
+
+    weights_single_vehicle = np.array([0, 0, 1])
+    weights_multiple_vehicles = np.array([1, 1, 0])
+
+    primary_survivals, secondary_survivals = objective.get_survival_time_vectors(
+        survival_functions, primary_vehicle_travel_times, secondary_vehicle_travel_times
+    )
+    given_utilisations_primary = np.genfromtxt(
+        "./test_data/primary_utilisations_61.csv", delimiter=","
+    )
+    given_utilisations_secondary = np.genfromtxt(
+        "./test_data/secondary_utilisations_61.csv", delimiter=","
+    )
+
+    run_statistics = {}
+    best_primary, best_secondary, objective_by_iteration = optimisation.optimise(
+        number_of_locations=67,
+        number_of_primary_vehicles=6,
+        number_of_secondary_vehicles=6,
+        max_primary=2,
+        max_secondary=2,
+        population_size=8,
+        keep_size=2,
+        number_of_iterations=3,
+        mutation_function=optimisation.mutate_full,
+        initial_number_of_mutatation_repetitions=1,
+        cooling_rate=1,
+        demand_rates=demand_rates,
+        primary_survivals=primary_survivals,
+        secondary_survivals=secondary_survivals,
+        weights_single_vehicle=weights_single_vehicle,
+        weights_multiple_vehicles=weights_multiple_vehicles,
+        beta=beta,
+        R=R,
+        vehicle_station_utilisation_function=utilisation.given_utilisations,
+        seed=0,
+        num_workers=2,
+        adaptive_operator_selection=True,
+        run_statistics=run_statistics,
+        given_utilisations_primary=given_utilisations_primary,
+        given_utilisations_secondary=given_utilisations_secondary,
+    )
+
+    assert objective_by_iteration.shape == (3, 8)
+    assert max(best_primary) <= 2
+    assert max(best_secondary) <= 2
+    assert len(run_statistics["operator_statistics"]) == 3
+    final_statistics = run_statistics["operator_statistics"][-1]
+    assert set(final_statistics) == set(optimisation.MUTATION_OPERATORS)
+    assert np.isclose(
+        sum(statistics["applications"] for statistics in final_statistics.values()),
+        3 * 6,
+    )
+    for statistics in final_statistics.values():
+        assert statistics["improvement"] >= 0
+        assert statistics["weight"] >= 0.1
+
+
+def test_evaluate_population_by_weights():
+    primary_travel_times = np.array(
+        [[0, 5, 10, 15, 20], [5, 0, 5, 10, 15], [10, 5, 0, 5, 10], [15, 10, 5, 0, 5]]
+    )
+    secondary_travel_times = 0.7 * primary_travel_times
+    beta = objective.get_beta(primary_travel_times)
+    R = objective.get_R(primary_travel_times, secondary_travel_times)
+    survival_functions = (
+        lambda t: 1 / (1 + np.exp(0.26 + 0.139 * t)),
+        lambda t: np.heaviside(15 - t, 1),
+        lambda t: np.heaviside(60 - t, 1),
+    )
+    primary_survivals, secondary_survivals = objective.get_survival_time_vectors(
+        survival_functions, primary_travel_times, secondary_travel_times
+    )
+    parameters = dict(
+        demand_rates=np.array(((2, 2, 3, 3, 7), (2, 0, 1, 2, 4), (1, 1, 1, 1, 1)))
+        / 100,
+        primary_survivals=primary_survivals,
+        secondary_survivals=secondary_survivals,
+        beta=beta,
+        R=R,
+        vehicle_station_utilisation_function=utilisation.solve_utilisations,
+        num_workers=2,
+        service_rate_primary=1 / 30,
+        service_rate_secondary=1 / 20,
+    )
+    population = np.array(
+        [
+            [[1, 0, 0, 1], [0, 2, 1, 0]],
+            [[2, 0, 0, 0], [0, 0, 1, 1]],
+            [[0, 1, 1, 0], [1, 0, 0, 1]],
+        ]
+    )
+    weights_single_vehicle = np.array([[0, 0, 1], [1, 0, 1]])
+    weights_multiple_vehicles = np.array([[1, 1, 0], [0, 2, 0]])
+
+    objectives = optimisation.evaluate_population_by_weights(
+        population=population,
+        weights_single_vehicle=weights_single_vehicle,
+        weights_multiple_vehicles=weights_multiple_vehicles,
+        **parameters,
+    )
+
+    assert objectives.shape == (3, 2)
+    for column, (single, multiple) in enumerate(
+        zip(weights_single_vehicle, weights_multiple_vehicles)
+    ):
+        assert np.allclose(
+            objectives[:, column],
+            optimisation.evaluate_population(
+                population=population,
+                weights_single_vehicle=single,
+                weights_multiple_vehicles=multiple,
+                **parameters,
+            ),
+        )
+
+
+def test_optimise_worst_case_over_scenarios():
+    primary_travel_times = np.array(
+        [[0, 5, 10, 15, 20], [5, 0, 5, 10, 15], [10, 5, 0, 5, 10], [15, 10, 5, 0, 5]]
+    )
+    secondary_travel_times = 0.7 * primary_travel_times
+    beta = objective.get_beta(primary_travel_times)
+    R = objective.get_R(primary_travel_times, secondary_travel_times)
+    survival_functions = (
+        lambda t: 1 / (1 + np.exp(0.26 + 0.139 * t)),
+        lambda t: np.heaviside(15 - t, 1),
+        lambda t: np.heaviside(60 - t, 1),
+    )
+    primary_survivals, secondary_survivals = objective.get_survival_time_vectors(
+        survival_functions, primary_travel_times, secondary_travel_times
+    )
+    demand_rates = (
+        np.array(
+            [
+                ((2, 2, 3, 3, 7), (2, 0, 1, 2, 4), (1, 1, 1, 1, 1)),
+                ((9, 4, 3, 0, 0), (8, 2, 1, 0, 0), (1, 0, 3, 1, 1)),
+            ]
+        )
+        / 1000
+    )
+    parameters = dict(
+        demand_rates=demand_rates,
+        primary_survivals=primary_survivals,
+        secondary_survivals=secondary_survivals,
+        weights_single_vehicle=np.array([0, 0, 1]),
+        weights_multiple_vehicles=np.array([1, 1, 0]),
+        beta=beta,
+        R=R,
+        vehicle_station_utilisation_function=utilisation.solve_utilisations_scenarios,
+        service_rate_primary=1 / 30,
+        service_rate_secondary=1 / 20,
+    )
+    worst_case = functools.partial(
+        objective.get_aggregated_scenario_objective, aggregation=np.min
+    )
+
+    run_statistics: dict = {}
+    best_primary, best_secondary, objective_by_iteration = optimisation.optimise(
+        number_of_locations=4,
+        number_of_primary_vehicles=3,
+        number_of_secondary_vehicles=2,
+        max_primary=2,
+        max_secondary=2,
+        population_size=6,
+        keep_size=2,
+        number_of_iterations=3,
+        mutation_function=optimisation.mutate_retain_vehicle_numbers,
+        initial_number_of_mutatation_repetitions=1,
+        cooling_rate=1,
+        seed=0,
+        num_workers=2,
+        objective_function=worst_case,
+        run_statistics=run_statistics,
+        solver_diagnostics=True,
+        **parameters,
+    )
+
+    assert sum(best_primary) == 3
+    assert sum(best_secondary) == 2
+    summaries = run_statistics["solver_diagnostics"]
+    assert len(summaries) == 4
+    # Two scenarios for each type of vehicle for each new allocation
+    assert 0 < summaries[0]["solves"] <= 6 * 2 * 2
+    for summary in summaries:
+        assert summary["solves"] % 4 == 0
+        assert summary["not_converged"] == 0
+    scenario_objectives = objective.get_scenario_objectives(
+        allocation_primary=best_primary,
+        allocation_secondary=best_secondary,
+        **parameters,
+    )
+    assert scenario_objectives.shape == (2,)
+    assert np.isclose(scenario_objectives.min(), objective_by_iteration.max())
+
+
+def test_optimise_conditional_value_at_risk_over_samples():
+    primary_travel_times = np.array(
+        [[0, 5, 10, 15, 20], [5, 0, 5, 10, 15], [10, 5, 0, 5, 10], [15, 10, 5, 0, 5]]
+    )
+    secondary_travel_times = 0.7 * primary_travel_times
+    beta = objective.get_beta(primary_travel_times)
+    R = objective.get_R(primary_travel_times, secondary_travel_times)
+    survival_functions = (
+        lambda t: 1 / (1 + np.exp(0.26 + 0.139 * t)),
+        lambda t: np.heaviside(15 - t, 1),
+        lambda t: np.heaviside(60 - t, 1),
+    )
+    primary_survivals, secondary_survivals = objective.get_survival_time_vectors(
+        survival_functions, primary_travel_times, secondary_travel_times
+    )
+    demand_rates = np.array(((2, 2, 3, 3, 7), (2, 0, 1, 2, 4), (1, 1, 1, 1, 1))) / 1000
+    parameters = dict(
+        demand_rates=objective.get_poisson_demand_samples(
+            demand_rates, number_of_samples=8, observation_period=1440, seed=0
+        ),
+        primary_survivals=primary_survivals,
+        secondary_survivals=secondary_survivals,
+        weights_single_vehicle=np.array([0, 0, 1]),
+        weights_multiple_vehicles=np.array([1, 1, 0]),
+        beta=beta,
+        R=R,
+        vehicle_station_utilisation_function=utilisation.solve_utilisations_scenarios,
+        service_rate_primary=1 / 30,
+        service_rate_secondary=1 / 20,
+    )
+    conditional_value_at_risk = functools.partial(
+        objective.get_aggregated_scenario_objective,
+        aggregation=functools.partial(
+            objective.get_conditional_value_at_risk, alpha=0.25
+        ),
+    )
+
+    best_primary, best_secondary, objective_by_iteration = optimisation.optimise(
+        number_of_locations=4,
+        number_of_primary_vehicles=3,
+        number_of_secondary_vehicles=2,
+        max_primary=2,
+        max_secondary=2,
+        population_size=6,
+        keep_size=2,
+        number_of_iterations=3,
+        mutation_function=optimisation.mutate_retain_vehicle_numbers,
+        initial_number_of_mutatation_repetitions=1,
+        cooling_rate=1,
+        seed=0,
+        num_workers=2,
+        objective_function=conditional_value_at_risk,
+        **parameters,
+    )
+
+    sample_objectives = objective.get_scenario_objectives(
+        allocation_primary=best_primary,
+        allocation_secondary=best_secondary,
+        **parameters,
+    )
+    assert sample_objectives.shape == (8,)
+    assert np.isclose(
+        np.sort(sample_objectives)[:2].mean(), objective_by_iteration.max()
+    )
+
+
+def test_optimise_coarse_to_fine():
+    raw_travel_times = np.genfromtxt(
+        "./test_data/travel_times_matrix.csv", delimiter=","
+    )
+    beta = objective.get_beta(travel_times=raw_travel_times)
+    primary_vehicle_travel_times = raw_travel_times / 0.75
+    secondary_vehicle_travel_times = raw_travel_times / 1.215
+    R = objective.get_R(
+        primary_vehicle_travel_times=primary_vehicle_travel_times,
+        secondary_vehicle_travel_times=secondary_vehicle_travel_times,
+    )
+    survival_functions = (
+        lambda t: 1 / (1 + np.exp(0.26 + 0.139 * t)),
+        lambda t: np.heaviside(15 - t, 1),
+        lambda t: np.heaviside(60 - t, 1),
+    )
+    demand_rates = np.genfromtxt("./test_data/demand.csv", delimiter=",") / 1440
+    primary_survivals, secondary_survivals = objective.get_survival_time_vectors(
+        survival_functions, primary_vehicle_travel_times, secondary_vehicle_travel_times
+    )
+    pickup_clusters = objective.get_pickup_clusters(
+        raw_travel_times, demand_rates, number_of_clusters=40, seed=0
+    )
+    parameters = dict(
+        number_of_locations=67,
+        number_of_primary_vehicles=6,
+        number_of_secondary_vehicles=3,
+        max_primary=2,
+        max_secondary=2,
+        population_size=6,
+        keep_size=2,
+        number_of_iterations=2,
+        mutation_function=optimisation.mutate_retain_vehicle_numbers,
+        initial_number_of_mutatation_repetitions=1,
+        cooling_rate=1,
+        weights_single_vehicle=np.array([0, 0, 1]),
+        weights_multiple_vehicles=np.array([1, 1, 0]),
+        vehicle_station_utilisation_function=utilisation.constant_utilisation,
+        seed=0,
+        num_workers=1,
+        utilisation_rate_primary=0.5,
+        utilisation_rate_secondary=0.4,
+    )
+    (
+        coarse_demand_rates,
+        coarse_primary_survivals,
+        coarse_secondary_survivals,
+        coarse_beta,
+        coarse_R,
+    ) = objective.get_clustered_problem(
+        demand_rates, primary_survivals, secondary_survivals, beta, R, pickup_clusters
+    )
+    coarse_primary, coarse_secondary, _ = optimisation.optimise(
+        demand_rates=coarse_demand_rates,
+        primary_survivals=coarse_primary_survivals,
+        secondary_survivals=coarse_secondary_survivals,
+        beta=coarse_beta,
+        R=coarse_R,
+        **{**parameters, "number_of_iterations": 3},
+    )
+    coarse_objective = objective.get_objective(
+        demand_rates=demand_rates,
+        primary_survivals=primary_survivals,
+        secondary_survivals=secondary_survivals,
+        weights_single_vehicle=parameters["weights_single_vehicle"],
+        weights_multiple_vehicles=parameters["weights_multiple_vehicles"],
+        beta=beta,
+        R=R,
+        vehicle_station_utilisation_function=utilisation.constant_utilisation,
+        allocation_primary=coarse_primary,
+        allocation_secondary=coarse_secondary,
+        utilisation_rate_primary=0.5,
+        utilisation_rate_secondary=0.4,
+    )
+
+    run_statistics = {}
+    _, _, objective_by_iteration = optimisation.optimise(
+        demand_rates=demand_rates,
+        primary_survivals=primary_survivals,
+        secondary_survivals=secondary_survivals,
+        beta=beta,
+        R=R,
+        pickup_clusters=pickup_clusters,
+        coarse_number_of_iterations=3,
+        run_statistics=run_statistics,
+        **parameters,
+    )
+
+    assert len(run_statistics["coarse_objective_by_iteration"]) == 3
+    assert np.any(np.isclose(objective_by_iteration[0], coarse_objective))
+    assert np.max(objective_by_iteration[-1]) >= coarse_objective
+
+
+def test_get_regional_allocation():
+    station_regions = np.array([0, 1, 0, 0, 1, 2])
+    allocation = optimisation.get_regional_allocation(
+        region_allocation=np.array([3, 1, 0]),
+        station_regions=station_regions,
+        representatives=np.array([2, 4, 5]),
+        max_allocation=2,
+    )
+    assert np.array_equal(allocation, np.array([1, 0, 2, 0, 1, 0]))
+
+
+def test_optimise_hierarchically():
+    raw_travel_times = np.genfromtxt(
+        "./test_data/travel_times_matrix.csv", delimiter=","
+    )
+    beta = objective.get_beta(travel_times=raw_travel_times)
+    primary_vehicle_travel_times = raw_travel_times / 0.75
+    secondary_vehicle_travel_times = raw_travel_times / 1.215
+    R = objective.get_R(
+        primary_vehicle_travel_times=primary_vehicle_travel_times,
+        secondary_vehicle_travel_times=secondary_vehicle_travel_times,
+    )
+    survival_functions = (
+        lambda t: 1 / (1 + np.exp(0.26 + 0.139 * t)),
+        lambda t: np.heaviside(15 - t, 1),
+        lambda t: np.heaviside(60 - t, 1),
+    )
+    demand_rates = np.genfromtxt("./test_data/demand.csv", delimiter=",") / 1440
+    primary_survivals, secondary_survivals = objective.get_survival_time_vectors(
+        survival_functions, primary_vehicle_travel_times, secondary_vehicle_travel_times
+    )
+    station_regions = objective.get_station_regions(
+        raw_travel_times, number_of_regions=6, seed=0
+    )
+
+    run_statistics = {}
+    (
+        best_primary,
+        best_secondary,
+        objective_by_stage,
+    ) = optimisation.optimise_hierarchically(
+        station_regions=station_regions,
+        number_of_primary_vehicles=8,
+        number_of_secondary_vehicles=3,
+        max_primary=2,
+        max_secondary=1,
+        population_size=6,
+        keep_size=2,
+        regional_number_of_iterations=3,
+        number_of_iterations=2,
+        initial_number_of_mutatation_repetitions=1,
+        cooling_rate=1,
+        demand_rates=demand_rates,
+        primary_survivals=primary_survivals,
+        secondary_survivals=secondary_survivals,
+        weights_single_vehicle=np.array([0, 0, 1]),
+        weights_multiple_vehicles=np.array([1, 1, 0]),
+        beta=beta,
+        R=R,
+        vehicle_station_utilisation_function=utilisation.constant_utilisation,
+        seed=0,
+        num_workers=1,
+        run_statistics=run_statistics,
+        utilisation_rate_primary=0.5,
+        utilisation_rate_secondary=0.4,
+    )
+
+    assert best_primary.sum() == 8
+    assert best_secondary.sum() == 3
+    assert best_primary.max() <= 2
+    assert best_secondary.max() <= 1
+    assert len(objective_by_stage) == 7
+    assert np.all(np.diff(objective_by_stage) >= 0)
+    assert len(run_statistics["regional_objective_by_iteration"]) == 3
+    assert np.isclose(
+        objective_by_stage[-1],
+        objective.get_objective(
+            demand_rates=demand_rates,
+            primary_survivals=primary_survivals,
+            secondary_survivals=secondary_survivals,
+            weights_single_vehicle=np.array([0, 0, 1]),
+            weights_multiple_vehicles=np.array([1, 1, 0]),
+            beta=beta,
+            R=R,
+            vehicle_station_utilisation_function=utilisation.constant_utilisation,
+            allocation_primary=best_primary,
+            allocation_secondary=best_secondary,
+            utilisation_rate_primary=0.5,
+            utilisation_rate_secondary=0.4,
+        ),
+    )
+
+
+def test_rank_population_into_buffer():
+    raw_travel_times = np.genfromtxt(
+        "./test_data/travel_times_matrix.csv", delimiter=","
+    )
+    primary_vehicle_travel_times = raw_travel_times / 0.75
+    secondary_vehicle_travel_times = raw_travel_times / 1.215
+    survival_functions = (
+        lambda t: 1 / (1 + np.exp(0.26 + 0.139 * t)),
+        lambda t: np.heaviside(15 - t, 1),
+        lambda t: np.heaviside(60 - t, 1),
+    )
+    primary_survivals, secondary_survivals = objective.get_survival_time_vectors(
+        survival_functions, primary_vehicle_travel_times, secondary_vehicle_travel_times
+    )
+    parameters = dict(
+        demand_rates=np.genfromtxt("./test_data/demand.csv", delimiter=",") / 1440,
+        primary_survivals=primary_survivals,
+        secondary_survivals=secondary_survivals,
+        weights_single_vehicle=np.array([0, 0, 1]),
+        weights_multiple_vehicles=np.array([1, 1, 0]),
+        beta=objective.get_beta(travel_times=raw_travel_times),
+        R=objective.get_R(
+            primary_vehicle_travel_times=primary_vehicle_travel_times,
+            secondary_vehicle_travel_times=secondary_vehicle_travel_times,
+        ),
+        vehicle_station_utilisation_function=utilisation.constant_utilisation,
+        num_workers=1,
+        utilisation_rate_primary=0.5,
+        utilisation_rate_secondary=0.4,
+    )
+    np.random.seed(0)
+    population = optimisation.create_initial_population(
+        number_of_locations=67,
+        number_of_primary_vehicles=20,
+        number_of_secondary_vehicles=10,
+        max_primary=3,
+        max_secondary=3,
+        population_size=6,
+    ).astype(optimisation.POPULATION_DTYPE)
+    ranked_population, objective_values = optimisation.rank_population(
+        population=population, **parameters
+    )
+
+    out = np.zeros_like(population)
+    ranked_into_buffer, buffer_objective_values = optimisation.rank_population(
+        population=population, out=out, **parameters
+    )
+
+    assert ranked_into_buffer is out
+    assert out.dtype == optimisation.POPULATION_DTYPE
+    assert np.array_equal(out, ranked_population)
+    assert np.array_equal(buffer_objective_values, objective_values)
+
+
+def test_evaluate_population_with_population_utilisation_function():
+    raw_travel_times = np.genfromtxt(
+        "./test_data/travel_times_matrix.csv", delimiter=","
+    )
+    primary_vehicle_travel_times = raw_travel_times / 0.75
+    secondary_vehicle_travel_times = raw_travel_times / 1.215
+    survival_functions = (
+        lambda t: 1 / (1 + np.exp(0.26 + 0.139 * t)),
+        lambda t: np.heaviside(15 - t, 1),
+        lambda t: np.heaviside(60 - t, 1),
+    )
+    primary_survivals, secondary_survivals = objective.get_survival_time_vectors(
+        survival_functions, primary_vehicle_travel_times, secondary_vehicle_travel_times
+    )
+    parameters = dict(
+        demand_rates=np.genfromtxt("./test_data/demand.csv", delimiter=",") / 1440,
+        primary_survivals=primary_survivals,
+        secondary_survivals=secondary_survivals,
+        weights_single_vehicle=np.array([0, 0, 1]),
+        weights_multiple_vehicles=np.array([1, 1, 0]),
+        beta=objective.get_beta(travel_times=raw_travel_times),
+        R=objective.get_R(
+            primary_vehicle_travel_times=primary_vehicle_travel_times,
+            secondary_vehicle_travel_times=secondary_vehicle_travel_times,
+        ),
+        vehicle_station_utilisation_function=utilisation.solve_utilisations,
+        num_workers=1,
+        service_rate_primary=1 / (4.5 * 60),
+        service_rate_secondary=1 / (3.5 * 60),
+    )
+    np.random.seed(0)
+    population = optimisation.create_initial_population(
+        number_of_locations=67,
+        number_of_primary_vehicles=70,
+        number_of_secondary_vehicles=40,
+        max_primary=3,
+        max_secondary=3,
+        population_size=3,
+    )
+    expected_values = optimisation.evaluate_population(
+        population=population,
+        root_finding_function=utilisation.solve_fixed_point,
+        **parameters,
+    )
+
+    solved_populations = []
+
+    def population_utilisation_function(population, **kwargs):
+        solved_populations.append(population)
+        return utilisation.solve_population_utilisations(population, **kwargs)
+
+    cache = {}
+    values, times = optimisation.evaluate_population(
+        population=population,
+        cache=cache,
+        return_times=True,
+        population_utilisation_function=population_utilisation_function,
+        **parameters,
+    )
+    assert np.allclose(values, expected_values, rtol=1e-6)
+    assert np.all(times > 0)
+    assert len(solved_populations) == 1
+    assert np.array_equal(solved_populations[0], population)
+
+    values = optimisation.evaluate_population(
+        population=population[::-1],
+        cache=cache,
+        population_utilisation_function=population_utilisation_function,
+        **parameters,
+    )
+    assert np.allclose(values, expected_values[::-1], rtol=1e-6)
+    assert len(solved_populations) == 1
+
+
+def test_optimise_with_solver_diagnostics():
+    raw_travel_times = np.genfromtxt(
+        "./test_data/travel_times_matrix.csv", delimiter=","
+    )
+    primary_vehicle_travel_times = raw_travel_times / 0.75
+    secondary_vehicle_travel_times = raw_travel_times / 1.215
+    survival_functions = (
+        lambda t: 1 / (1 + np.exp(0.26 + 0.139 * t)),
+        lambda t: np.heaviside(15 - t, 1),
+        lambda t: np.heaviside(60 - t, 1),
+    )
+    primary_survivals, secondary_survivals = objective.get_survival_time_vectors(
+        survival_functions, primary_vehicle_travel_times, secondary_vehicle_travel_times
+    )
+    run_statistics: dict = {}
+    optimisation.optimise(
+        number_of_locations=67,
+        number_of_primary_vehicles=70,
+        number_of_secondary_vehicles=40,
+        max_primary=3,
+        max_secondary=3,
+        population_size=6,
+        keep_size=2,
+        number_of_iterations=2,
+        mutation_function=optimisation.mutate_retain_vehicle_numbers,
+        initial_number_of_mutatation_repetitions=1,
+        cooling_rate=1,
+        demand_rates=np.genfromtxt("./test_data/demand.csv", delimiter=",") / 1440,
+        primary_survivals=primary_survivals,
+        secondary_survivals=secondary_survivals,
+        weights_single_vehicle=np.array([0, 0, 1]),
+        weights_multiple_vehicles=np.array([1, 1, 0]),
+        beta=objective.get_beta(travel_times=raw_travel_times),
+        R=objective.get_R(
+            primary_vehicle_travel_times=primary_vehicle_travel_times,
+            secondary_vehicle_travel_times=secondary_vehicle_travel_times,
+        ),
+        vehicle_station_utilisation_function=utilisation.solve_utilisations,
+        seed=0,
+        num_workers=1,
+        run_statistics=run_statistics,
+        solver_diagnostics=True,
+        population_utilisation_function=utilisation.solve_population_utilisations,
+        service_rate_primary=1 / (4.5 * 60),
+        service_rate_secondary=1 / (3.5 * 60),
+    )
+
+    summaries = run_statistics["solver_diagnostics"]
+    assert len(summaries) == 3
+    assert summaries[0]["solves"] == 12
+    for summary in summaries:
+        assert summary["solves"] <= 12
+        assert summary["not_converged"] == 0
+        assert summary["residual_evaluations"] >= summary["iterations"]
+        assert summary["max_residual_norm"] < 1e-6
+
+
+def test_evaluate_population_shares_one_pickup_pool(monkeypatch):
+    executors = []
+
+    class RecordedThreadPoolExecutor(concurrent.futures.ThreadPoolExecutor):
+        def __init__(self, *args, **kwargs):
+            super().__init__(*args, **kwargs)
+            executors.append(self)
+
+    monkeypatch.setattr(
+        concurrent.futures, "ThreadPoolExecutor", RecordedThreadPoolExecutor
+    )
+    raw_travel_times = np.genfromtxt(
+        "./test_data/travel_times_matrix.csv", delimiter=","
+    )
+    primary_vehicle_travel_times = raw_travel_times / 0.75
+    secondary_vehicle_travel_times = raw_travel_times / 1.215
+    survival_functions = (
+        lambda t: 1 / (1 + np.exp(0.26 + 0.139 * t)),
+        lambda t: np.heaviside(15 - t, 1),
+        lambda t: np.heaviside(60 - t, 1),
+    )
+    primary_survivals, secondary_survivals = objective.get_survival_time_vectors(
+        survival_functions, primary_vehicle_travel_times, secondary_vehicle_travel_times
+    )
+    np.random.seed(0)
+    population = optimisation.create_initial_population(
+        number_of_locations=67,
+        number_of_primary_vehicles=20,
+        number_of_secondary_vehicles=20,
+        max_primary=3,
+        max_secondary=3,
+        population_size=3,
+    )
+    parameters = dict(
+        population=population,
+        demand_rates=np.genfromtxt("./test_data/demand.csv", delimiter=",") / 1440,
+        primary_survivals=primary_survivals,
+        secondary_survivals=secondary_survivals,
+        weights_single_vehicle=np.array([0, 0, 1]),
+        weights_multiple_vehicles=np.array([1, 1, 0]),
+        beta=objective.get_beta(travel_times=raw_travel_times),
+        R=objective.get_R(
+            primary_vehicle_travel_times=primary_vehicle_travel_times,
+            secondary_vehicle_travel_times=secondary_vehicle_travel_times,
+        ),
+        vehicle_station_utilisation_function=utilisation.constant_utilisation,
+        num_workers=1,
+        utilisation_rate_primary=0.7,
+        utilisation_rate_secondary=0.4,
+    )
+    expected_values = optimisation.evaluate_population(**parameters)
+
+    values = optimisation.evaluate_population(pickup_num_workers=2, **parameters)
+
+    assert np.allclose(values, expected_values)
+    assert len(executors) == 1
+    with pytest.raises(RuntimeError):
+        executors[0].submit(print)
@@ -1,5 +1,7 @@
 import types
+import pytest
 import numpy as np
+import scipy.optimize  # type: ignore
 import objective
 import utilisation
 
@@ -319,3 +321,96 @@ def test_A1_survivals():
     )
     survival_in_days = expected_A1_survivals * 1440
     assert np.isclose(survival_in_days, 0.23000257753819806)
+
+
+def get_objective_of_resource_level(resource_level, low_precision=False):
+    problem = (demand_rates, primary_survivals, secondary_survivals, beta, R)
+    if low_precision:
+        problem = objective.get_low_precision_problem(*problem)
+    allocation = globals()[f"allocation_{resource_level}"]
+    return objective.get_objective(
+        demand_rates=problem[0],
+        primary_survivals=problem[1],
+        secondary_survivals=problem[2],
+        weights_single_vehicle=weights_single_vehicle,
+        weights_multiple_vehicles=weights_multiple_vehicles,
+        beta=problem[3],
+        R=problem[4],
+        vehicle_station_utilisation_function=utilisation.given_utilisations,
+        allocation_primary=allocation[:67],
+        allocation_secondary=allocation[67:],
+        given_utilisations_primary=globals()[
+            f"given_utilisations_primary_{resource_level}"
+        ],
+        given_utilisations_secondary=globals()[
+            f"given_utilisations_secondary_{resource_level}"
+        ],
+    )
+
+
+@pytest.mark.parametrize("resource_level", [61, 68, 75, 82, 89, 96])
+def test_objective_function_in_low_precision(resource_level):
+    """
+    Tests that the objective function computed in single precision is within a
+    relative error of 1e-6 of that computed in double precision. The measured
+    relative errors are between 1.2e-9 and 5.9e-9.
+    """
+    g = get_objective_of_resource_level(resource_level)
+    low_precision_g = get_objective_of_resource_level(
+        resource_level, low_precision=True
+    )
+    assert np.isclose(low_precision_g, g, rtol=1e-6, atol=0)
+
+
+@pytest.mark.parametrize("low_precision", [False, True])
+def test_benchmark_objective_function_precision(benchmark, low_precision):
+    g = benchmark(get_objective_of_resource_level, 61, low_precision)
+    assert np.isclose(g * 1440, 232.2921043699148)
+
+
+@pytest.mark.parametrize(
+    "root_finding_function",
+    [scipy.optimize.fsolve, utilisation.solve_fixed_point],
+    ids=["hybrd", "anderson"],
+)
+def test_benchmark_root_finding_function(benchmark, root_finding_function):
+    residual_evaluations = []
+
+    def counted_root_finding_function(func, x0, args=(), **kwargs):
+        def counted_func(x, *args):
+            residual_evaluations[-1] += 1
+            return func(x, *args)
+
+        residual_evaluations.append(0)
+        return root_finding_function(counted_func, x0, args=args, **kwargs)
+
+    def solve_all_allocations():
+        return [
+            utilisation.solve_utilisations(
+                allocation_primary=allocation[:67],
+                allocation_secondary=allocation[67:],
+                beta=beta,
+                R=R,
+                demand_rates=demand_rates,
+                service_rate_primary=1 / (4.5 * 60),
+                service_rate_secondary=1 / (3.5 * 60),
+                root_finding_function=counted_root_finding_function,
+            )
+            for allocation in (
+                allocation_61,
+                allocation_68,
+                allocation_75,
+                allocation_82,
+                allocation_89,
+                allocation_96,
+            )
+        ]
+
+    utilisations = benchmark.pedantic(solve_all_allocations, rounds=1)
+    benchmark.extra_info["residual_evaluations"] = sum(residual_evaluations)
+    assert len(utilisations) == 6
+    assert all(
+        0 <= np.min(u) and np.max(u) <= 1
+        for primary_and_secondary in utilisations
+        for u in primary_and_secondary
+    )
@@ -0,0 +1,176 @@
+import numpy as np
+import objective
+import relaxation
+import utilisation
+
+primary_travel_times = np.array(
+    [[0, 5, 10, 15, 20], [5, 0, 5, 10, 15], [10, 5, 0, 5, 10], [15, 10, 5, 0, 5]]
+)
+secondary_travel_times = 0.7 * primary_travel_times
+beta = objective.get_beta(primary_travel_times)
+R = objective.get_R(primary_travel_times, secondary_travel_times)
+survival_functions = (
+    lambda t: 1 / (1 + np.exp(0.26 + 0.139 * t)),
+    lambda t: np.heaviside(15 - t, 1),
+    lambda t: np.heaviside(60 - t, 1),
+)
+primary_survivals, secondary_survivals = objective.get_survival_time_vectors(
+    survival_functions, primary_travel_times, secondary_travel_times
+)
+demand_rates = np.array(((2, 2, 3, 3, 7), (2, 0, 1, 2, 4), (1, 1, 1, 1, 1))) / 1000
+weights_single_vehicle = np.array([0, 0, 1])
+weights_multiple_vehicles = np.array([1, 1, 0])
+service_rate_primary = 1 / 30
+service_rate_secondary = 1 / 20
+
+
+def get_solved_objective(allocation_primary, allocation_secondary):
+    return objective.get_objective(
+        demand_rates=demand_rates,
+        primary_survivals=primary_survivals,
+        secondary_survivals=secondary_survivals,
+        weights_single_vehicle=weights_single_vehicle,
+        weights_multiple_vehicles=weights_multiple_vehicles,
+        beta=beta,
+        R=R,
+        vehicle_station_utilisation_function=utilisation.solve_utilisations,
+        allocation_primary=allocation_primary,
+        allocation_secondary=allocation_secondary,
+        service_rate_primary=service_rate_primary,
+        service_rate_secondary=service_rate_secondary,
+    )
+
+
+def test_solve_relaxed_utilisations():
+    allocation_primary = np.array([1.3, 0.7, 2.1, 0.9])
+    allocation_secondary = np.array([0.5, 1.5, 1.2, 0.8])
+
+    (
+        utilisations_primary,
+        utilisations_secondary,
+        is_fixed_primary,
+        is_fixed_secondary,
+    ) = relaxation.solve_relaxed_utilisations(
+        allocation_primary=allocation_primary,
+        allocation_secondary=allocation_secondary,
+        beta=beta,
+        R=R,
+        demand_rates=demand_rates,
+        service_rate_primary=service_rate_primary,
+        service_rate_secondary=service_rate_secondary,
+    )
+    expected_primary, expected_secondary = utilisation.solve_utilisations(
+        allocation_primary=allocation_primary,
+        allocation_secondary=allocation_secondary,
+        beta=beta,
+        R=R,
+        demand_rates=demand_rates,
+        service_rate_primary=service_rate_primary,
+        service_rate_secondary=service_rate_secondary,
+    )
+
+    assert not is_fixed_primary
+    assert not is_fixed_secondary
+    assert np.allclose(utilisations_primary, expected_primary)
+    assert np.allclose(utilisations_secondary, expected_secondary)
+
+
+def test_get_relaxed_objective_gradient():
+    """
+    Compares the analytic gradient to central differences of the objective
+    with the utilisations solved by `utilisation.solve_utilisations`.
+    """
+    allocation_primary = np.array([1.3, 0.7, 2.1, 0.9])
+    allocation_secondary = np.array([0.5, 1.5, 1.2, 0.8])
+    step = 1e-5
+
+    g, gradient_primary, gradient_secondary = relaxation.get_relaxed_objective_gradient(
+        demand_rates=demand_rates,
+        primary_survivals=primary_survivals,
+        secondary_survivals=secondary_survivals,
+        weights_single_vehicle=weights_single_vehicle,
+        weights_multiple_vehicles=weights_multiple_vehicles,
+        beta=beta,
+        R=R,
+        allocation_primary=allocation_primary,
+        allocation_secondary=allocation_secondary,
+        service_rate_primary=service_rate_primary,
+        service_rate_secondary=service_rate_secondary,
+    )
+
+    assert np.isclose(g, get_solved_objective(allocation_primary, allocation_secondary))
+    for station, unit in enumerate(np.eye(4)):
+        difference_primary = (
+            get_solved_objective(allocation_primary + step * unit, allocation_secondary)
+            - get_solved_objective(
+                allocation_primary - step * unit, allocation_secondary
+            )
+        ) / (2 * step)
+        difference_secondary = (
+            get_solved_objective(allocation_primary, allocation_secondary + step * unit)
+            - get_solved_objective(
+                allocation_primary, allocation_secondary - step * unit
+            )
+        ) / (2 * step)
+        assert np.isclose(gradient_primary[station], difference_primary, rtol=1e-5)
+        assert np.isclose(gradient_secondary[station], difference_secondary, rtol=1e-5)
+
+
+def test_project_allocation():
+    allocation = np.array([3.0, -1.0, 0.5, 2.5])
+
+    projected = relaxation.project_allocation(
+        allocation, total=4, max_allocation=2, min_allocation=0.1
+    )
+
+    assert np.isclose(projected.sum(), 4)
+    assert np.allclose(projected, np.array([2.0, 0.1, 0.1, 1.8]))
+    assert np.allclose(
+        relaxation.project_allocation(allocation, total=0, max_allocation=2),
+        np.zeros(4),
+    )
+
+
+def test_round_allocation():
+    allocation = np.array([1.5, 0.2, 2.0, 0.3])
+
+    rounded = relaxation.round_allocation(allocation, total=4, max_allocation=2)
+
+    assert np.array_equal(rounded, np.array([2, 0, 2, 0]))
+    assert rounded.dtype.type is np.int64
+    rounded = relaxation.round_allocation(allocation, total=5, max_allocation=2)
+    assert np.array_equal(rounded, np.array([2, 0, 2, 1]))
+
+
+def test_optimise_relaxation():
+    (
+        best_primary,
+        best_secondary,
+        objective_by_iteration,
+    ) = relaxation.optimise_relaxation(
+        number_of_primary_vehicles=4,
+        number_of_secondary_vehicles=3,
+        max_primary=2,
+        max_secondary=2,
+        number_of_iterations=20,
+        demand_rates=demand_rates,
+        primary_survivals=primary_survivals,
+        secondary_survivals=secondary_survivals,
+        weights_single_vehicle=weights_single_vehicle,
+        weights_multiple_vehicles=weights_multiple_vehicles,
+        beta=beta,
+        R=R,
+        service_rate_primary=service_rate_primary,
+        service_rate_secondary=service_rate_secondary,
+    )
+
+    assert best_primary.sum() == 4
+    assert best_secondary.sum() == 3
+    assert best_primary.max() <= 2
+    assert best_secondary.max() <= 2
+    assert objective_by_iteration.shape == (20,)
+    assert objective_by_iteration.max() > objective_by_iteration[0]
+    uniform_objective = get_solved_objective(
+        np.array([1, 1, 1, 1]), np.array([1, 1, 1, 0])
+    )
+    assert get_solved_objective(best_primary, best_secondary) >= uniform_objective
@@ -1,6 +1,7 @@
 import utilisation
 import objective
 import numpy as np
+import scipy.optimize  # type: ignore
 
 
 def test_constant_utilisation():
@@ -191,3 +192,441 @@ def test_solve_utilisations_when_flooding():
     )
     assert np.allclose(primary_utilisations, np.array([0.99 for _ in range(67)]))
     assert np.allclose(secondary_utilisations, np.array([0.99 for _ in range(67)]))
+
+
+def test_solve_utilisations_scenarios():
+    primary_travel_times = np.array(
+        [[0, 5, 10, 15, 20], [5, 0, 5, 10, 15], [10, 5, 0, 5, 10], [15, 10, 5, 0, 5]]
+    )
+    secondary_travel_times = 0.7 * primary_travel_times
+    beta = objective.get_beta(primary_travel_times)
+    R = objective.get_R(primary_travel_times, secondary_travel_times)
+    demand_rates = np.array(
+        [
+            ((2, 2, 3, 3, 7), (2, 0, 1, 2, 4), (1, 1, 1, 1, 1)),
+            ((1, 4, 3, 0, 2), (2, 2, 1, 0, 4), (1, 0, 3, 1, 1)),
+            ((50, 50, 50, 50, 50), (50, 50, 50, 50, 50), (1, 1, 1, 1, 1)),
+        ]
+    ) / np.array([[[1000]], [[1000]], [[100]]])
+    parameters = dict(
+        allocation_primary=np.array([1, 0, 2, 1]),
+        allocation_secondary=np.array([0, 2, 1, 0]),
+        beta=beta,
+        R=R,
+        service_rate_primary=1 / 30,
+        service_rate_secondary=1 / 20,
+    )
+
+    diagnostics: list = []
+    (
+        primary_utilisations,
+        secondary_utilisations,
+    ) = utilisation.solve_utilisations_scenarios(
+        demand_rates=demand_rates, diagnostics=diagnostics, **parameters
+    )
+
+    assert [entry["saturated"] for entry in diagnostics] == [False, False, True] * 2
+    for entry in diagnostics:
+        assert entry["converged"]
+    for entry in diagnostics[:2] + diagnostics[3:5]:
+        assert entry["residual_evaluations"] > 0
+        assert entry["residual_norm"] < 1e-6
+    assert primary_utilisations.shape == (3, 4)
+    assert secondary_utilisations.shape == (3, 4)
+    for scenario, scenario_demand_rates in enumerate(demand_rates):
+        expected_primary, expected_secondary = utilisation.solve_utilisations(
+            demand_rates=scenario_demand_rates, **parameters
+        )
+        assert np.allclose(primary_utilisations[scenario], expected_primary)
+        assert np.allclose(secondary_utilisations[scenario], expected_secondary)
+    # The final scenario floods the vehicles
+    assert np.allclose(primary_utilisations[2], 0.99)
+    assert np.allclose(secondary_utilisations[2], 0.99)
+
+
+def test_solve_utilisations_in_low_precision():
+    raw_travel_times = np.genfromtxt(
+        "./test_data/travel_times_matrix.csv", delimiter=","
+    )
+    beta = objective.get_beta(travel_times=raw_travel_times)
+    R = objective.get_R(
+        primary_vehicle_travel_times=raw_travel_times / 0.75,
+        secondary_vehicle_travel_times=raw_travel_times / 1.215,
+    )
+    demand_rates = np.genfromtxt("./test_data/demand.csv", delimiter=",") / 1440
+    parameters = dict(
+        allocation_primary=np.ones(67),
+        allocation_secondary=np.ones(67),
+        service_rate_primary=1 / (4.5 * 60),
+        service_rate_secondary=1 / (3.5 * 60),
+    )
+    primary_utilisations, secondary_utilisations = utilisation.solve_utilisations(
+        beta=beta, R=R, demand_rates=demand_rates, **parameters
+    )
+    (
+        low_precision_primary_utilisations,
+        low_precision_secondary_utilisations,
+    ) = utilisation.solve_utilisations(
+        beta=beta.astype(bool),
+        R=R.astype(bool),
+        demand_rates=demand_rates.astype(np.float32),
+        **parameters,
+    )
+
+    assert low_precision_primary_utilisations.dtype == np.float64
+    assert np.allclose(
+        low_precision_primary_utilisations, primary_utilisations, atol=1e-5
+    )
+    assert np.allclose(
+        low_precision_secondary_utilisations, secondary_utilisations, atol=1e-5
+    )
+
+
+def test_solve_utilisations_with_workspace():
+    raw_travel_times = np.genfromtxt(
+        "./test_data/travel_times_matrix.csv", delimiter=","
+    )
+    parameters = dict(
+        allocation_primary=np.ones(67),
+        allocation_secondary=np.ones(67),
+        beta=objective.get_beta(travel_times=raw_travel_times),
+        R=objective.get_R(
+            primary_vehicle_travel_times=raw_travel_times / 0.75,
+            secondary_vehicle_travel_times=raw_travel_times / 1.215,
+        ),
+        demand_rates=np.genfromtxt("./test_data/demand.csv", delimiter=",") / 1440,
+        service_rate_primary=1 / (4.5 * 60),
+        service_rate_secondary=1 / (3.5 * 60),
+    )
+    primary_utilisations, secondary_utilisations = utilisation.solve_utilisations(
+        **parameters
+    )
+    workspace = {}
+    (
+        workspace_primary_utilisations,
+        workspace_secondary_utilisations,
+    ) = utilisation.solve_utilisations(workspace=workspace, **parameters)
+
+    assert len(workspace) == 1
+    assert np.array_equal(workspace_primary_utilisations, primary_utilisations)
+    assert np.array_equal(workspace_secondary_utilisations, secondary_utilisations)
+
+
+def test_solve_utilisations_with_pickup_demand_rates():
+    raw_travel_times = np.genfromtxt(
+        "./test_data/travel_times_matrix.csv", delimiter=","
+    )
+    demand_rates = np.genfromtxt("./test_data/demand.csv", delimiter=",") / 1440
+    parameters = dict(
+        allocation_primary=np.ones(67),
+        allocation_secondary=np.ones(67),
+        beta=objective.get_beta(travel_times=raw_travel_times),
+        R=objective.get_R(
+            primary_vehicle_travel_times=raw_travel_times / 0.75,
+            secondary_vehicle_travel_times=raw_travel_times / 1.215,
+        ),
+        demand_rates=demand_rates,
+        service_rate_primary=1 / (4.5 * 60),
+        service_rate_secondary=1 / (3.5 * 60),
+    )
+    primary_utilisations, secondary_utilisations = utilisation.solve_utilisations(
+        **parameters
+    )
+    (
+        precomputed_primary_utilisations,
+        precomputed_secondary_utilisations,
+    ) = utilisation.solve_utilisations(
+        pickup_demand_rates=demand_rates.sum(axis=0),
+        multiple_pickup_demand_rates=demand_rates[:-1].sum(axis=0),
+        **parameters,
+    )
+
+    assert np.array_equal(precomputed_primary_utilisations, primary_utilisations)
+    assert np.array_equal(precomputed_secondary_utilisations, secondary_utilisations)
+
+
+def test_solve_fixed_point():
+    def func(x, scale):
+        return np.cos(x) / scale - x
+
+    root = utilisation.solve_fixed_point(func, np.zeros(3), args=(np.arange(1, 4),))
+    assert np.allclose(func(root, np.arange(1, 4)), 0, atol=1e-7)
+    assert np.allclose(
+        root, scipy.optimize.fsolve(func, np.zeros(3), args=(np.arange(1, 4),))
+    )
+
+    evaluations = []
+
+    def diverging_func(x):
+        evaluations.append(x)
+        return np.exp(x) - 2
+
+    root = utilisation.solve_fixed_point(
+        diverging_func, np.zeros(1), damping=10, memory=1, maxfev=3
+    )
+    assert np.isclose(root[0], np.log(2))
+    assert len(evaluations) > 3
+
+
+def test_solve_utilisations_with_fixed_point():
+    raw_travel_times = np.genfromtxt(
+        "./test_data/travel_times_matrix.csv", delimiter=","
+    )
+    allocation = np.genfromtxt("./test_data/allocation_96.csv", delimiter=",")
+    parameters = dict(
+        allocation_primary=allocation[:67],
+        allocation_secondary=allocation[67:],
+        beta=objective.get_beta(travel_times=raw_travel_times),
+        R=objective.get_R(
+            primary_vehicle_travel_times=raw_travel_times / 0.75,
+            secondary_vehicle_travel_times=raw_travel_times / 1.215,
+        ),
+        demand_rates=np.genfromtxt("./test_data/demand.csv", delimiter=",") / 1440,
+        service_rate_primary=1 / (4.5 * 60),
+        service_rate_secondary=1 / (3.5 * 60),
+    )
+    primary_utilisations, secondary_utilisations = utilisation.solve_utilisations(
+        **parameters
+    )
+    (
+        fixed_point_primary_utilisations,
+        fixed_point_secondary_utilisations,
+    ) = utilisation.solve_utilisations(
+        root_finding_function=utilisation.solve_fixed_point, **parameters
+    )
+
+    assert np.allclose(
+        fixed_point_primary_utilisations, primary_utilisations, rtol=0, atol=1e-6
+    )
+    assert np.allclose(
+        fixed_point_secondary_utilisations, secondary_utilisations, rtol=0, atol=1e-6
+    )
+
+
+def test_solve_population_utilisations():
+    raw_travel_times = np.genfromtxt(
+        "./test_data/travel_times_matrix.csv", delimiter=","
+    )
+    parameters = dict(
+        beta=objective.get_beta(travel_times=raw_travel_times),
+        R=objective.get_R(
+            primary_vehicle_travel_times=raw_travel_times / 0.75,
+            secondary_vehicle_travel_times=raw_travel_times / 1.215,
+        ),
+        demand_rates=np.genfromtxt("./test_data/demand.csv", delimiter=",") / 1440,
+        service_rate_primary=1 / (4.5 * 60),
+        service_rate_secondary=1 / (3.5 * 60),
+    )
+    few_vehicles = np.zeros((2, 67))
+    few_vehicles[:, :3] = 1
+    population = np.array(
+        [
+            np.genfromtxt("./test_data/allocation_61.csv", delimiter=",").reshape(
+                2, 67
+            ),
+            np.genfromtxt("./test_data/allocation_96.csv", delimiter=",").reshape(
+                2, 67
+            ),
+            few_vehicles,
+        ]
+    )
+    (
+        primary_utilisations,
+        secondary_utilisations,
+    ) = utilisation.solve_population_utilisations(population, **parameters)
+
+    assert primary_utilisations.shape == (3, 67)
+    assert secondary_utilisations.shape == (3, 67)
+    assert np.all(primary_utilisations[2] == 0.99)
+    for allocation, primary, secondary in zip(
+        population, primary_utilisations, secondary_utilisations
+    ):
+        expected_primary, expected_secondary = utilisation.solve_utilisations(
+            allocation_primary=allocation[0],
+            allocation_secondary=allocation[1],
+            **parameters,
+        )
+        assert np.allclose(primary, expected_primary, rtol=0, atol=1e-6)
+        assert np.allclose(secondary, expected_secondary, rtol=0, atol=1e-6)
+
+    (
+        fallback_primary_utilisations,
+        fallback_secondary_utilisations,
+    ) = utilisation.solve_population_utilisations(
+        population[1:2], maxiter=1, **parameters
+    )
+    expected_primary, expected_secondary = utilisation.solve_utilisations(
+        allocation_primary=population[1, 0],
+        allocation_secondary=population[1, 1],
+        **parameters,
+    )
+    assert np.array_equal(fallback_primary_utilisations[0], expected_primary)
+    assert np.array_equal(fallback_secondary_utilisations[0], expected_secondary)
+
+
+def test_solve_utilisations_diagnostics():
+    raw_travel_times = np.genfromtxt(
+        "./test_data/travel_times_matrix.csv", delimiter=","
+    )
+    allocation = np.genfromtxt("./test_data/allocation_96.csv", delimiter=",")
+    parameters = dict(
+        beta=objective.get_beta(travel_times=raw_travel_times),
+        R=objective.get_R(
+            primary_vehicle_travel_times=raw_travel_times / 0.75,
+            secondary_vehicle_travel_times=raw_travel_times / 1.215,
+        ),
+        demand_rates=np.genfromtxt("./test_data/demand.csv", delimiter=",") / 1440,
+        service_rate_primary=1 / (4.5 * 60),
+        service_rate_secondary=1 / (3.5 * 60),
+    )
+    few_vehicles = np.zeros(67)
+    few_vehicles[:3] = 1
+    diagnostics: list = []
+    utilisation.solve_utilisations(
+        allocation_primary=allocation[:67],
+        allocation_secondary=allocation[67:],
+        diagnostics=diagnostics,
+        **parameters,
+    )
+    utilisation.solve_utilisations(
+        allocation_primary=allocation[:67],
+        allocation_secondary=allocation[67:],
+        root_finding_function=utilisation.solve_fixed_point,
+        diagnostics=diagnostics,
+        **parameters,
+    )
+    utilisation.solve_utilisations(
+        allocation_primary=few_vehicles,
+        allocation_secondary=few_vehicles,
+        diagnostics=diagnostics,
+        **parameters,
+    )
+
+    assert [entry["vehicle_type"] for entry in diagnostics] == [
+        "primary",
+        "secondary",
+    ] * 3
+    for entry in diagnostics[:4]:
+        assert not entry["saturated"]
+        assert entry["converged"]
+        assert entry["residual_evaluations"] > 0
+        assert entry["residual_norm"] < 1e-6
+    assert diagnostics[0]["iterations"] is None
+    assert diagnostics[2]["iterations"] > 0
+    for entry in diagnostics[4:]:
+        assert entry["saturated"]
+        assert entry["residual_evaluations"] == 0
+        assert entry["residual_norm"] is None
+
+    summary = utilisation.get_diagnostics_summary(diagnostics)
+    assert summary["solves"] == 6
+    assert summary["saturated"] == 2
+    assert summary["not_converged"] == 0
+    assert summary["residual_evaluations"] == sum(
+        entry["residual_evaluations"] for entry in diagnostics
+    )
+    assert summary["max_residual_norm"] < 1e-6
+
+
+def test_solve_population_utilisations_diagnostics():
+    raw_travel_times = np.genfromtxt(
+        "./test_data/travel_times_matrix.csv", delimiter=","
+    )
+    few_vehicles = np.zeros((2, 67))
+    few_vehicles[:, :3] = 1
+    population = np.array(
+        [
+            np.genfromtxt("./test_data/allocation_96.csv", delimiter=",").reshape(
+                2, 67
+            ),
+            few_vehicles,
+        ]
+    )
+    diagnostics: list = []
+    utilisation.solve_population_utilisations(
+        population,
+        beta=objective.get_beta(travel_times=raw_travel_times),
+        R=objective.get_R(
+            primary_vehicle_travel_times=raw_travel_times / 0.75,
+            secondary_vehicle_travel_times=raw_travel_times / 1.215,
+        ),
+        demand_rates=np.genfromtxt("./test_data/demand.csv", delimiter=",") / 1440,
+        service_rate_primary=1 / (4.5 * 60),
+        service_rate_secondary=1 / (3.5 * 60),
+        diagnostics=diagnostics,
+    )
+
+    assert len(diagnostics) == 4
+    assert sum(entry["saturated"] for entry in diagnostics) == 2
+    for entry in diagnostics:
+        assert entry["converged"]
+        if not entry["saturated"]:
+            assert entry["iterations"] > 0
+            assert entry["residual_norm"] < 1e-6
+
+
+def test_solve_relationships_in_lock_step_with_a_singular_jacobian():
+    targets = np.array([[0.2, 0.3], [0.4, 0.5], [0.6, 0.7]])
+
+    def relationship(index, utilisations):
+        jacobian = np.eye(2) * (index != 1)
+        return utilisations - targets[index], jacobian
+
+    (
+        utilisations,
+        is_converged,
+        number_of_iterations,
+        _,
+    ) = utilisation.solve_relationships_in_lock_step(
+        relationship, np.full((3, 2), 0.5), np.ones((3, 2))
+    )
+
+    assert list(is_converged) == [True, False, True]
+    assert np.allclose(utilisations[[0, 2]], targets[[0, 2]])
+    assert number_of_iterations[1] == 1
+
+
+def test_solve_population_utilisations_forwards_kwargs_to_fallback():
+    raw_travel_times = np.genfromtxt(
+        "./test_data/travel_times_matrix.csv", delimiter=","
+    )
+    parameters = dict(
+        beta=objective.get_beta(travel_times=raw_travel_times),
+        R=objective.get_R(
+            primary_vehicle_travel_times=raw_travel_times / 0.75,
+            secondary_vehicle_travel_times=raw_travel_times / 1.215,
+        ),
+        demand_rates=np.genfromtxt("./test_data/demand.csv", delimiter=",") / 1440,
+        service_rate_primary=1 / (4.5 * 60),
+        service_rate_secondary=1 / (3.5 * 60),
+    )
+    population = np.genfromtxt("./test_data/allocation_96.csv", delimiter=",").reshape(
+        1, 2, 67
+    )
+    root_finding_calls = []
+
+    def root_finding_function(*args, **kwargs):
+        root_finding_calls.append(args[0])
+        return utilisation.solve_fixed_point(*args, **kwargs)
+
+    (
+        primary_utilisations,
+        secondary_utilisations,
+    ) = utilisation.solve_population_utilisations(
+        population,
+        maxiter=0,
+        root_finding_function=root_finding_function,
+        **parameters,
+    )
+
+    assert root_finding_calls == [
+        utilisation.get_lambda_differences_primary,
+        utilisation.get_lambda_differences_secondary,
+    ]
+    expected_primary, expected_secondary = utilisation.solve_utilisations(
+        allocation_primary=population[0, 0],
+        allocation_secondary=population[0, 1],
+        **parameters,
+    )
+    assert np.allclose(primary_utilisations[0], expected_primary, atol=1e-6)
+    assert np.allclose(secondary_utilisations[0], expected_secondary, atol=1e-6)
@@ -1,9 +1,8 @@
+import time
 import numpy as np
 import objective
+import relaxation
 import scipy.optimize  # type: ignore
-import warnings
-
-warnings.simplefilter("ignore")
 
 
 def constant_utilisation(
@@ -74,8 +73,195 @@ def given_utilisations(
     return primary_utilisations, secondary_utilisations
 
 
+def solve_fixed_point(
+    func,
+    x0,
+    args=(),
+    damping=0.1,
+    memory=10,
+    xtol=1.49012e-08,
+    maxfev=100,
+    full_output=False,
+    **kwargs
+):
+    """
+    Finds a root of `func` by a damped fixed point iteration of
+    x = x + damping * func(x), accelerated by Anderson mixing of the last
+    `memory` iterates. Each iteration is one evaluation of `func`, with no
+    Jacobian. It is called like `scipy.optimize.fsolve`, which it falls back
+    to (from `x0`, with the remaining keyword arguments) if the iteration has
+    not converged after `maxfev` evaluations or leaves the finite numbers.
+
+    Parameters
+    ----------
+    func : callable
+        The function to find the root of, called as `func(x, *args)`.
+    x0 : np.array
+        The starting estimate of the root.
+    args : tuple
+        The extra arguments of `func`.
+    damping : float
+        The fraction of the residual taken as a step.
+    memory : int
+        The number of previous iterates used by the Anderson mixing.
+    xtol : float
+        The iteration has converged when the norm of the residual is at most
+        `xtol` times the norm of the iterate.
+    maxfev : int
+        The maximum number of evaluations of `func` before falling back.
+    full_output : bool
+        Whether to also return the information of `scipy.optimize.fsolve`.
+        Its dictionary also has the number of fixed point iterations ("nit")
+        and whether it fell back ("fallback"), and its number of evaluations
+        ("nfev") includes those of the fixed point iteration.
+    **kwargs : keyword arguments
+        The keyword arguments of `scipy.optimize.fsolve` for the fall back.
+
+    Returns
+    -------
+    np.array
+        The root, and if `full_output` the dictionary of information, an
+        integer flag that is 1 if a root was found and a message.
+    """
+    x = np.array(x0, dtype=float)
+    residual = func(x, *args)
+    number_of_evaluations = 1
+    step_differences = []
+    residual_differences = []
+    is_converged = False
+    while np.all(np.isfinite(residual)):
+        if np.linalg.norm(residual) <= xtol * np.linalg.norm(x):
+            is_converged = True
+            break
+        if number_of_evaluations >= maxfev:
+            break
+        step = damping * residual
+        if len(step_differences) > 0:
+            mixing = np.linalg.lstsq(
+                np.transpose(residual_differences), residual, rcond=None
+            )[0]
+            step -= (
+                np.transpose(step_differences)
+                + damping * np.transpose(residual_differences)
+            ) @ mixing
+        next_x = x + step
+        next_residual = func(next_x, *args)
+        number_of_evaluations += 1
+        step_differences = (step_differences + [next_x - x])[-memory:]
+        residual_differences = (residual_differences + [next_residual - residual])[
+            -memory:
+        ]
+        x, residual = next_x, next_residual
+    if is_converged:
+        root, infodict, ier, mesg = x, {"nfev": 0, "fvec": residual}, 1, ""
+    else:
+        root, infodict, ier, mesg = scipy.optimize.fsolve(
+            func, x0, args=args, xtol=xtol, full_output=True, **kwargs
+        )
+    infodict["nfev"] += number_of_evaluations
+    infodict["nit"] = number_of_evaluations - 1
+    infodict["fallback"] = not is_converged
+    if full_output:
+        return root, infodict, ier, mesg
+    return root
+
+
+def get_solver_diagnostics(vehicle_type, solve_time, infodict=None, ier=1):
+    """
+    Returns the diagnostics of a solve of the utilisations of one type of
+    vehicle.
+
+    Parameters
+    ----------
+    vehicle_type : str
+        Either "primary" or "secondary".
+    solve_time : float
+        The time taken by the solve in seconds.
+    infodict : dict
+        The dictionary of information returned by the root finding function
+        with `full_output` (as by `scipy.optimize.fsolve`). If None the
+        utilisations were saturated: set to the overall utilisation limit
+        without finding a root.
+    ier : int
+        The flag returned by the root finding function, 1 if a root was found.
+
+    Returns
+    -------
+    dict
+        The vehicle type, whether the utilisations were saturated, whether a
+        root was found, the number of iterations (None if the root finding
+        function does not report it, as MINPACK's hybrd does not), the number
+        of evaluations of the residual, the norm of the final residual (None
+        if saturated), whether the root finding function fell back to another
+        and the time taken.
+    """
+    if infodict is None:
+        infodict = {"nit": 0, "nfev": 0}
+    return {
+        "vehicle_type": vehicle_type,
+        "saturated": "fvec" not in infodict,
+        "converged": ier == 1,
+        "iterations": infodict.get("nit"),
+        "residual_evaluations": infodict["nfev"],
+        "residual_norm": np.linalg.norm(infodict["fvec"])
+        if "fvec" in infodict
+        else None,
+        "fallback": infodict.get("fallback", False),
+        "time": solve_time,
+    }
+
+
+def get_diagnostics_summary(diagnostics):
+    """
+    Aggregates the diagnostics of a number of solves (see
+    `get_solver_diagnostics`).
+
+    Parameters
+    ----------
+    diagnostics : list
+        The diagnostics of every solve.
+
+    Returns
+    -------
+    dict
+        The number of solves, of saturated solves, of solves that did not
+        find a root and of solves that fell back, the total numbers of
+        iterations and of residual evaluations, the largest final residual
+        norm and the total time taken.
+    """
+    residual_norms = [
+        entry["residual_norm"]
+        for entry in diagnostics
+        if entry["residual_norm"] is not None
+    ]
+    return {
+        "solves": len(diagnostics),
+        "saturated": sum(entry["saturated"] for entry in diagnostics),
+        "not_converged": sum(not entry["converged"] for entry in diagnostics),
+        "fallbacks": sum(entry["fallback"] for entry in diagnostics),
+        "iterations": sum(
+            entry["iterations"]
+            for entry in diagnostics
+            if entry["iterations"] is not None
+        ),
+        "residual_evaluations": sum(
+            entry["residual_evaluations"] for entry in diagnostics
+        ),
+        "max_residual_norm": max(residual_norms, default=0.0),
+        "time": sum(entry["time"] for entry in diagnostics),
+    }
+
+
 def get_lambda_differences_primary(
-    lhs, service_rate_primary, allocation_primary, beta, demand_rates
+    lhs,
+    service_rate_primary,
+    allocation_primary,
+    beta,
+    demand_rates,
+    pickup_chunk_size=None,
+    pickup_num_workers=None,
+    workspace=None,
+    pickup_demand_rates=None,
 ):
     """
     Returns the difference between the LHS and RHS of the primary demand rates
@@ -93,22 +279,44 @@ def get_lambda_differences_primary(
         A three dimensional array denoting which vehicles are preferred.
     demand_rates : np.array
         The demand rates of given patient classes from given pickup locations.
+    pickup_chunk_size : int
+        The number of pickup locations to process at once. If None all pickup
+        locations are processed at once.
+    pickup_num_workers : int
+        The number of threads processing chunks of pickup locations at once.
+        If None the chunks are processed in turn.
+    workspace : dict
+        Buffers for the largest temporary arrays, filled in place and reused
+        by later calls (see `get_workspace_buffer`). If None the temporary
+        arrays are allocated on every call.
+    pickup_demand_rates : np.array
+        The demand rates from every pickup location summed over the patient
+        classes. If None they are computed from the demand rates.
 
     Returns
     -------
     np.array
     """
+    precision = objective.get_precision(demand_rates)
     utilisations = np.divide(
         lhs / service_rate_primary,
         allocation_primary,
         out=np.zeros_like(lhs),
         where=allocation_primary != 0,
-    )
+    ).astype(precision)
+    allocation_primary = np.asarray(allocation_primary, dtype=precision)
     all_closer = objective.get_all_same_closer_busy_vector(
-        utilisations, allocation_primary, beta
+        utilisations,
+        allocation_primary,
+        beta,
+        pickup_chunk_size,
+        pickup_num_workers,
+        workspace,
     )
     not_busy = objective.get_is_not_busy_vector(utilisations, allocation_primary)
-    rhs = (demand_rates.sum(axis=0) * (not_busy * all_closer.T).T).sum(axis=1)
+    if pickup_demand_rates is None:
+        pickup_demand_rates = demand_rates.sum(axis=0)
+    rhs = (pickup_demand_rates * (not_busy * all_closer.T).T).sum(axis=1)
     return rhs - lhs
 
 
@@ -121,6 +329,10 @@ def get_lambda_differences_secondary(
     beta,
     R,
     demand_rates,
+    pickup_chunk_size=None,
+    pickup_num_workers=None,
+    workspace=None,
+    multiple_pickup_demand_rates=None,
 ):
     """
     Returns the difference between the LHS and RHS of the secondary demand rates relationship equation
@@ -143,26 +355,56 @@ def get_lambda_differences_secondary(
         A three dimensional array denoting which primary vehicles are preferred.
     demand_rates : np.array
         The demand rates of given patient classes from given pickup locations.
+    pickup_chunk_size : int
+        The number of pickup locations to process at once. If None all pickup
+        locations are processed at once.
+    pickup_num_workers : int
+        The number of threads processing chunks of pickup locations at once.
+        If None the chunks are processed in turn.
+    workspace : dict
+        Buffers for the largest temporary arrays, filled in place and reused
+        by later calls (see `get_workspace_buffer`). If None the temporary
+        arrays are allocated on every call.
+    multiple_pickup_demand_rates : np.array
+        The demand rates from every pickup location summed over the multiple
+        vehicle patient classes. If None they are computed from the demand
+        rates.
 
     Returns
     -------
     np.array
     """
+    precision = objective.get_precision(demand_rates)
     utilisations = np.divide(
         lhs / service_rate_secondary,
         allocation_secondary,
         out=np.zeros_like(lhs),
         where=allocation_secondary != 0,
-    )
+    ).astype(precision)
+    allocation_secondary = np.asarray(allocation_secondary, dtype=precision)
+    allocation_primary = np.asarray(allocation_primary, dtype=precision)
+    utilisations_primary = np.asarray(utilisations_primary, dtype=precision)
     all_closer = objective.get_all_same_closer_busy_vector(
-        utilisations, allocation_secondary, beta
+        utilisations,
+        allocation_secondary,
+        beta,
+        pickup_chunk_size,
+        pickup_num_workers,
+        workspace,
     )
     not_busy = objective.get_is_not_busy_vector(utilisations, allocation_secondary)
     all_primary_closer = objective.get_all_primary_closer_busy_vector(
-        utilisations_primary, allocation_primary, R
+        utilisations_primary,
+        allocation_primary,
+        R,
+        pickup_chunk_size,
+        pickup_num_workers,
+        workspace,
     )
+    if multiple_pickup_demand_rates is None:
+        multiple_pickup_demand_rates = demand_rates[:-1].sum(axis=0)
     rhs = (
-        demand_rates[:-1].sum(axis=0) * (not_busy * all_closer.T * all_primary_closer).T
+        multiple_pickup_demand_rates * (not_busy * all_closer.T * all_primary_closer).T
     ).sum(axis=1)
     return rhs - lhs
 
@@ -173,6 +415,12 @@ def solve_utilisations_primary(
     demand_rates,
     service_rate_primary,
     overall_utilisation_limit=0.99,
+    pickup_chunk_size=None,
+    pickup_num_workers=None,
+    workspace=None,
+    pickup_demand_rates=None,
+    root_finding_function=scipy.optimize.fsolve,
+    diagnostics=None,
     **kwargs
 ):
     """
@@ -191,6 +439,26 @@ def solve_utilisations_primary(
     overall_utilisation_limit : float
         A default limit for the utilisation which is used if the theoretic
         utilisation is above 1.
+    pickup_chunk_size : int
+        The number of pickup locations to process at once. If None all pickup
+        locations are processed at once.
+    pickup_num_workers : int
+        The number of threads processing chunks of pickup locations at once.
+        If None the chunks are processed in turn.
+    workspace : dict
+        Buffers for the largest temporary arrays, filled in place and reused
+        by later calls (see `get_workspace_buffer`). If None the temporary
+        arrays are allocated on every call.
+    pickup_demand_rates : np.array
+        The demand rates from every pickup location summed over the patient
+        classes. If None they are computed from the demand rates.
+    root_finding_function : callable
+        The function finding the root of the relationship, called like
+        `scipy.optimize.fsolve` with `full_output` (for example
+        `solve_fixed_point`).
+    diagnostics : list
+        If a list, the diagnostics of every solve (see
+        `get_solver_diagnostics`) are appended to it.
     **kwargs : keyword arguments
         remaining keyword arguments that could be passed to this function from
         the optimisation algorithm
@@ -199,21 +467,52 @@ def solve_utilisations_primary(
     -------
     np.array
     """
+    if pickup_demand_rates is None:
+        pickup_demand_rates = demand_rates.sum(axis=0)
+    start_time = time.perf_counter()
     total_demand = demand_rates.sum()
-    if (
-        total_demand / (service_rate_primary * sum(allocation_primary))
-        > overall_utilisation_limit
-    ):
+    with np.errstate(divide="ignore"):
+        is_saturated = (
+            total_demand / (service_rate_primary * sum(allocation_primary))
+            > overall_utilisation_limit
+        )
+    if is_saturated:
+        if diagnostics is not None:
+            diagnostics.append(
+                get_solver_diagnostics("primary", time.perf_counter() - start_time)
+            )
         return np.array([overall_utilisation_limit for _ in allocation_primary])
 
     starting_lambdas = np.array(
         [total_demand / len(allocation_primary) for _ in allocation_primary]
     )
-    final_lambdas = scipy.optimize.fsolve(
-        get_lambda_differences_primary,
-        starting_lambdas,
-        args=(service_rate_primary, allocation_primary, beta, demand_rates),
-    )
+    # The residuals overflow or divide by zero for utilisations far from the
+    # root, which shows in the diagnostics if no root is found.
+    with np.errstate(
+        divide="ignore", invalid="ignore", over="ignore"
+    ), objective.pickup_workspace(workspace, pickup_num_workers) as workspace:
+        final_lambdas, infodict, ier, _ = root_finding_function(
+            get_lambda_differences_primary,
+            starting_lambdas,
+            args=(
+                service_rate_primary,
+                allocation_primary,
+                beta,
+                demand_rates,
+                pickup_chunk_size,
+                pickup_num_workers,
+                workspace,
+                pickup_demand_rates,
+            ),
+            epsfcn=np.finfo(objective.get_precision(demand_rates)).eps,
+            full_output=True,
+        )
+    if diagnostics is not None:
+        diagnostics.append(
+            get_solver_diagnostics(
+                "primary", time.perf_counter() - start_time, infodict, ier
+            )
+        )
     utilisations = np.divide(
         final_lambdas,
         allocation_primary * service_rate_primary,
@@ -232,6 +531,12 @@ def solve_utilisations_secondary(
     demand_rates,
     service_rate_secondary,
     overall_utilisation_limit=0.99,
+    pickup_chunk_size=None,
+    pickup_num_workers=None,
+    workspace=None,
+    multiple_pickup_demand_rates=None,
+    root_finding_function=scipy.optimize.fsolve,
+    diagnostics=None,
     **kwargs
 ):
     """
@@ -256,6 +561,27 @@ def solve_utilisations_secondary(
     overall_utilisation_limit : float
         A default limit for the utilisation which is used if the theoretic
         utilisation is above 1.
+    pickup_chunk_size : int
+        The number of pickup locations to process at once. If None all pickup
+        locations are processed at once.
+    pickup_num_workers : int
+        The number of threads processing chunks of pickup locations at once.
+        If None the chunks are processed in turn.
+    workspace : dict
+        Buffers for the largest temporary arrays, filled in place and reused
+        by later calls (see `get_workspace_buffer`). If None the temporary
+        arrays are allocated on every call.
+    multiple_pickup_demand_rates : np.array
+        The demand rates from every pickup location summed over the multiple
+        vehicle patient classes. If None they are computed from the demand
+        rates.
+    root_finding_function : callable
+        The function finding the root of the relationship, called like
+        `scipy.optimize.fsolve` with `full_output` (for example
+        `solve_fixed_point`).
+    diagnostics : list
+        If a list, the diagnostics of every solve (see
+        `get_solver_diagnostics`) are appended to it.
     **kwargs : keyword arguments
         remaining keyword arguments that could be passed to this function from
         the optimisation algorithm
@@ -264,29 +590,53 @@ def solve_utilisations_secondary(
     -------
     np.array
     """
+    if multiple_pickup_demand_rates is None:
+        multiple_pickup_demand_rates = demand_rates[:-1].sum(axis=0)
+    start_time = time.perf_counter()
     total_demand = demand_rates[:-1].sum()
-    if (
-        total_demand / (service_rate_secondary * sum(allocation_secondary))
-        > overall_utilisation_limit
-    ):
+    with np.errstate(divide="ignore"):
+        is_saturated = (
+            total_demand / (service_rate_secondary * sum(allocation_secondary))
+            > overall_utilisation_limit
+        )
+    if is_saturated:
+        if diagnostics is not None:
+            diagnostics.append(
+                get_solver_diagnostics("secondary", time.perf_counter() - start_time)
+            )
         return np.array([overall_utilisation_limit for _ in allocation_primary])
 
     starting_lambdas = np.array(
         [total_demand / len(allocation_secondary) for _ in allocation_secondary]
     )
-    final_lambdas = scipy.optimize.fsolve(
-        get_lambda_differences_secondary,
-        starting_lambdas,
-        args=(
-            service_rate_secondary,
-            allocation_secondary,
-            allocation_primary,
-            utilisations_primary,
-            beta,
-            R,
-            demand_rates,
-        ),
-    )
+    with np.errstate(
+        divide="ignore", invalid="ignore", over="ignore"
+    ), objective.pickup_workspace(workspace, pickup_num_workers) as workspace:
+        final_lambdas, infodict, ier, _ = root_finding_function(
+            get_lambda_differences_secondary,
+            starting_lambdas,
+            args=(
+                service_rate_secondary,
+                allocation_secondary,
+                allocation_primary,
+                utilisations_primary,
+                beta,
+                R,
+                demand_rates,
+                pickup_chunk_size,
+                pickup_num_workers,
+                workspace,
+                multiple_pickup_demand_rates,
+            ),
+            epsfcn=np.finfo(objective.get_precision(demand_rates)).eps,
+            full_output=True,
+        )
+    if diagnostics is not None:
+        diagnostics.append(
+            get_solver_diagnostics(
+                "secondary", time.perf_counter() - start_time, infodict, ier
+            )
+        )
     utilisations = np.divide(
         final_lambdas,
         allocation_secondary * service_rate_secondary,
@@ -305,6 +655,13 @@ def solve_utilisations(
     service_rate_primary,
     service_rate_secondary,
     overall_utilisation_limit=0.99,
+    pickup_chunk_size=None,
+    pickup_num_workers=None,
+    workspace=None,
+    pickup_demand_rates=None,
+    multiple_pickup_demand_rates=None,
+    root_finding_function=scipy.optimize.fsolve,
+    diagnostics=None,
     **kwargs
 ):
     """
@@ -331,6 +688,30 @@ def solve_utilisations(
     overall_utilisation_limit : float
         A default limit for the utilisation which is used if the theoretic
         utilisation is above 1.
+    pickup_chunk_size : int
+        The number of pickup locations to process at once. If None all pickup
+        locations are processed at once.
+    pickup_num_workers : int
+        The number of threads processing chunks of pickup locations at once.
+        If None the chunks are processed in turn.
+    workspace : dict
+        Buffers for the largest temporary arrays, filled in place and reused
+        by later calls (see `get_workspace_buffer`). If None the temporary
+        arrays are allocated on every call.
+    pickup_demand_rates : np.array
+        The demand rates from every pickup location summed over the patient
+        classes. If None they are computed from the demand rates.
+    multiple_pickup_demand_rates : np.array
+        The demand rates from every pickup location summed over the multiple
+        vehicle patient classes. If None they are computed from the demand
+        rates.
+    root_finding_function : callable
+        The function finding the root of the relationship, called like
+        `scipy.optimize.fsolve` with `full_output` (for example
+        `solve_fixed_point`).
+    diagnostics : list
+        If a list, the diagnostics of every solve (see
+        `get_solver_diagnostics`) are appended to it.
     **kwargs : keyword arguments
         remaining keyword arguments that could be passed to this function from
         the optimisation algorithm
@@ -348,7 +729,13 @@ def solve_utilisations(
         demand_rates=demand_rates,
         service_rate_primary=service_rate_primary,
         overall_utilisation_limit=overall_utilisation_limit,
-        **kwargs
+        pickup_chunk_size=pickup_chunk_size,
+        pickup_num_workers=pickup_num_workers,
+        workspace=workspace,
+        pickup_demand_rates=pickup_demand_rates,
+        root_finding_function=root_finding_function,
+        diagnostics=diagnostics,
+        **kwargs,
     )
     secondary_utilisations = solve_utilisations_secondary(
         allocation_secondary=allocation_secondary,
@@ -359,6 +746,450 @@ def solve_utilisations(
         demand_rates=demand_rates,
         service_rate_secondary=service_rate_secondary,
         overall_utilisation_limit=overall_utilisation_limit,
-        **kwargs
+        pickup_chunk_size=pickup_chunk_size,
+        pickup_num_workers=pickup_num_workers,
+        workspace=workspace,
+        multiple_pickup_demand_rates=multiple_pickup_demand_rates,
+        root_finding_function=root_finding_function,
+        diagnostics=diagnostics,
+        **kwargs,
+    )
+    return primary_utilisations, secondary_utilisations
+
+
+def solve_relationships_in_lock_step(
+    relationship,
+    starting_utilisations,
+    allocations,
+    xtol=1.49012e-08,
+    maxiter=50,
+    minimum_utilisation=1e-12,
+):
+    """
+    Finds the roots of the demand-utilisation relationships of a number of
+    allocations at once by Newton's method, using their analytic Jacobians.
+    The allocations are iterated in lock step: every iteration solves one
+    stacked batch of linear systems, and allocations drop out of the batch
+    once the relative size of their step is at most `xtol`. If the batch has a
+    singular Jacobian its systems are solved one at a time and only the
+    allocations with a singular Jacobian drop out, without converging.
+    Stations without vehicles keep their starting utilisations.
+
+    Parameters
+    ----------
+    relationship : callable
+        Maps the index of an allocation and its utilisations to the residual
+        of its relationship and the Jacobian with respect to the utilisations
+        (as `relaxation.get_primary_relationship` does).
+    starting_utilisations : np.array
+        The starting utilisations, with a row for every allocation.
+    allocations : np.array
+        The number of vehicles at every station, with a row for every
+        allocation.
+    xtol : float
+        The relative size of the step at which an allocation has converged.
+    maxiter : int
+        The maximum number of iterations.
+    minimum_utilisation : float
+        A lower bound on the utilisations so that their logarithms exist.
+
+    Returns
+    -------
+    tuple
+        Returns the utilisations, and for every allocation a boolean
+        indicating whether it has converged, its number of iterations and its
+        last residual.
+    """
+    utilisations = np.array(starting_utilisations, dtype=float)
+    is_converged = np.zeros(len(utilisations), dtype=bool)
+    is_singular = np.zeros(len(utilisations), dtype=bool)
+    number_of_iterations = np.zeros(len(utilisations), dtype=int)
+    last_residuals = np.full(utilisations.shape, np.nan)
+    for _ in range(maxiter):
+        indices = np.flatnonzero(~is_converged & ~is_singular)
+        if len(indices) == 0:
+            break
+        residuals = np.empty((len(indices), utilisations.shape[1]))
+        jacobians = np.empty(
+            (len(indices), utilisations.shape[1], utilisations.shape[1])
+        )
+        for row, index in enumerate(indices):
+            residuals[row], jacobians[row] = relationship(index, utilisations[index])[
+                :2
+            ]
+        rows, empty_stations = np.nonzero(allocations[indices] == 0)
+        residuals[rows, empty_stations] = 0
+        jacobians[rows, empty_stations, :] = 0
+        jacobians[rows, empty_stations, empty_stations] = 1
+        number_of_iterations[indices] += 1
+        last_residuals[indices] = residuals
+        try:
+            steps = np.linalg.solve(jacobians, residuals[:, :, np.newaxis])[:, :, 0]
+        except np.linalg.LinAlgError:
+            steps = np.zeros_like(residuals)
+            for row, index in enumerate(indices):
+                try:
+                    steps[row] = np.linalg.solve(jacobians[row], residuals[row])
+                except np.linalg.LinAlgError:
+                    is_singular[index] = True
+            is_solved = ~is_singular[indices]
+            indices, steps = indices[is_solved], steps[is_solved]
+        next_utilisations = np.clip(
+            utilisations[indices] - steps, minimum_utilisation, 1
+        )
+        is_converged[indices] = np.linalg.norm(
+            next_utilisations - utilisations[indices], axis=1
+        ) <= xtol * np.linalg.norm(next_utilisations, axis=1)
+        utilisations[indices] = next_utilisations
+    return utilisations, is_converged, number_of_iterations, last_residuals
+
+
+def solve_population_utilisations(
+    population,
+    beta,
+    R,
+    demand_rates,
+    service_rate_primary,
+    service_rate_secondary,
+    overall_utilisation_limit=0.99,
+    xtol=1.49012e-08,
+    maxiter=50,
+    minimum_utilisation=1e-12,
+    diagnostics=None,
+    **kwargs
+):
+    """
+    Finds the utilisations of every allocation of a population by solving
+    the demand-utilisation relationships of all of them in lock step (see
+    `solve_relationships_in_lock_step`). The utilisations are those of
+    `solve_utilisations`, which is used for any allocation that has not
+    converged, with the remaining keyword arguments (for example its
+    `root_finding_function`).
+
+    Parameters
+    ----------
+    population : np.array
+        An array of allocations, each a primary and a secondary allocation.
+    beta : np.array
+        A three dimensional array denoting which vehicles are preferred.
+    R : np.array
+        A three dimensional array denoting which primary vehicles are preferred.
+    demand_rates : np.array
+        The demand rates of given patient classes from given pickup locations.
+    service_rate_primary : np.array
+        The service rates of primary vehicles
+    service_rate_secondary : np.array
+        The service rates of primary vehicles
+    overall_utilisation_limit : float
+        A default limit for the utilisation which is used if the theoretic
+        utilisation is above 1.
+    xtol : float
+        The relative size of the step at which an allocation has converged.
+    maxiter : int
+        The maximum number of iterations.
+    minimum_utilisation : float
+        A lower bound on the utilisations so that their logarithms exist.
+    diagnostics : list
+        If a list, the diagnostics of the solves of every allocation (see
+        `get_solver_diagnostics`) are appended to it. The time of the lock
+        step solve is shared equally between its allocations.
+    **kwargs : keyword arguments
+        remaining keyword arguments that could be passed to this function from
+        the optimisation algorithm, passed on to `solve_utilisations_primary`
+        and `solve_utilisations_secondary` for the allocations that have not
+        converged.
+
+    Returns
+    -------
+    tuple
+        Returns two arrays, with a row for every allocation:
+         + the solved utilisations for primary vehicles
+         + the solved utilisations for secondary vehicles
+    """
+    allocations_primary = np.asarray(population)[:, 0].astype(float)
+    allocations_secondary = np.asarray(population)[:, 1].astype(float)
+
+    def solve(
+        vehicle_type, relationship, total_demand, allocations, service_rate, solve_one
+    ):
+        is_limited = total_demand > (
+            overall_utilisation_limit * service_rate * allocations.sum(axis=1)
+        )
+        starting_utilisations = np.clip(
+            np.divide(
+                total_demand,
+                allocations.shape[1] * service_rate * allocations,
+                out=np.full(allocations.shape, overall_utilisation_limit),
+                where=allocations != 0,
+            ),
+            minimum_utilisation,
+            overall_utilisation_limit,
+        )
+        indices = np.flatnonzero(~is_limited)
+        utilisations = np.full(allocations.shape, overall_utilisation_limit)
+        start_time = time.perf_counter()
+        with np.errstate(divide="ignore", invalid="ignore", over="ignore"):
+            (
+                utilisations[indices],
+                is_converged,
+                number_of_iterations,
+                last_residuals,
+            ) = solve_relationships_in_lock_step(
+                lambda row, u: relationship(indices[row], u),
+                starting_utilisations[indices],
+                allocations[indices],
+                xtol=xtol,
+                maxiter=maxiter,
+                minimum_utilisation=minimum_utilisation,
+            )
+        solve_time = (time.perf_counter() - start_time) / max(len(indices), 1)
+        utilisations[indices] = np.where(
+            allocations[indices] == 0, 0, utilisations[indices]
+        )
+        solve_diagnostics = [
+            get_solver_diagnostics(vehicle_type, 0.0)
+            for _ in np.flatnonzero(is_limited)
+        ]
+        for row, index in enumerate(indices):
+            if is_converged[row]:
+                infodict = {
+                    "nit": int(number_of_iterations[row]),
+                    "nfev": int(number_of_iterations[row]),
+                    "fvec": last_residuals[row],
+                }
+                solve_diagnostics.append(
+                    get_solver_diagnostics(vehicle_type, solve_time, infodict)
+                )
+                continue
+            fallback_diagnostics = []
+            utilisations[index] = solve_one(index, fallback_diagnostics)
+            fallback_diagnostics[0]["iterations"] = number_of_iterations[row]
+            fallback_diagnostics[0]["residual_evaluations"] += number_of_iterations[row]
+            fallback_diagnostics[0]["fallback"] = True
+            fallback_diagnostics[0]["time"] += solve_time
+            solve_diagnostics += fallback_diagnostics
+        if diagnostics is not None:
+            diagnostics.extend(solve_diagnostics)
+        return utilisations
+
+    utilisations_primary = solve(
+        "primary",
+        lambda index, u: relaxation.get_primary_relationship(
+            u, allocations_primary[index], beta, demand_rates, service_rate_primary
+        ),
+        demand_rates.sum(),
+        allocations_primary,
+        service_rate_primary,
+        lambda index, fallback_diagnostics: solve_utilisations_primary(
+            allocation_primary=allocations_primary[index],
+            beta=beta,
+            demand_rates=demand_rates,
+            service_rate_primary=service_rate_primary,
+            overall_utilisation_limit=overall_utilisation_limit,
+            diagnostics=fallback_diagnostics,
+            **kwargs,
+        ),
+    )
+    utilisations_secondary = solve(
+        "secondary",
+        lambda index, u: relaxation.get_secondary_relationship(
+            u,
+            allocations_secondary[index],
+            np.maximum(utilisations_primary[index], minimum_utilisation),
+            allocations_primary[index],
+            beta,
+            R,
+            demand_rates,
+            service_rate_secondary,
+        ),
+        demand_rates[:-1].sum(),
+        allocations_secondary,
+        service_rate_secondary,
+        lambda index, fallback_diagnostics: solve_utilisations_secondary(
+            allocation_secondary=allocations_secondary[index],
+            allocation_primary=allocations_primary[index],
+            utilisations_primary=utilisations_primary[index],
+            beta=beta,
+            R=R,
+            demand_rates=demand_rates,
+            service_rate_secondary=service_rate_secondary,
+            overall_utilisation_limit=overall_utilisation_limit,
+            diagnostics=fallback_diagnostics,
+            **kwargs,
+        ),
+    )
+    return utilisations_primary, utilisations_secondary
+
+
+def solve_relationship(relationship, starting_utilisations, full_output=False):
+    """
+    Finds the root of a demand-utilisation relationship using its analytic
+    Jacobian. The residual and the Jacobian are computed together, so each
+    evaluation is reused for both.
+
+    Parameters
+    ----------
+    relationship : callable
+        Maps utilisations to the residual of the relationship and its Jacobian
+        with respect to the utilisations.
+    starting_utilisations : np.array
+        The starting utilisations.
+    full_output : bool
+        Whether to also return the information of `scipy.optimize.fsolve`.
+
+    Returns
+    -------
+    np.array
+        The utilisations solving the relationship, followed by the infodict,
+        flag and message of `scipy.optimize.fsolve` if `full_output`.
+    """
+    last_evaluation = {}
+
+    def evaluate(utilisations):
+        key = utilisations.tobytes()
+        if key not in last_evaluation:
+            last_evaluation.clear()
+            last_evaluation[key] = relationship(utilisations)
+        return last_evaluation[key]
+
+    return scipy.optimize.fsolve(
+        lambda u: evaluate(u)[0],
+        starting_utilisations,
+        fprime=lambda u: evaluate(u)[1],
+        full_output=full_output,
+    )
+
+
+def solve_utilisations_scenarios(
+    allocation_primary,
+    allocation_secondary,
+    beta,
+    R,
+    demand_rates,
+    service_rate_primary,
+    service_rate_secondary,
+    overall_utilisation_limit=0.99,
+    diagnostics=None,
+    **kwargs
+):
+    """
+    Finds the utilisations for a number of demand scenarios, for example the
+    hours of the day. The demand-utilisation relationships are solved using
+    their analytic Jacobians, only for the stations with vehicles (the
+    utilisation of an empty station does not affect the other stations), and
+    each scenario starts from the solution of the previous one.
+
+    Parameters
+    ----------
+    allocation_primary : np.array
+        The number of primary vehicles at every station
+    allocation_secondary : np.array
+        The number of secondary vehicles at every station
+    beta : np.array
+        A three dimensional array denoting which vehicles are preferred, or a
+        four dimensional array with one for each scenario.
+    R : np.array
+        A three dimensional array denoting which primary vehicles are
+        preferred, or a four dimensional array with one for each scenario.
+    demand_rates : np.array
+        A three dimensional array: the demand rates of given patient classes
+        from given pickup locations for each scenario.
+    service_rate_primary : np.array
+        The service rates of primary vehicles
+    service_rate_secondary : np.array
+        The service rates of primary vehicles
+    overall_utilisation_limit : float
+        A default limit for the utilisation which is used if the theoretic
+        utilisation is above 1.
+    diagnostics : list
+        If a list, the diagnostics of the solve of every scenario (see
+        `get_solver_diagnostics`) are appended to it.
+    **kwargs : keyword arguments
+        remaining keyword arguments that could be passed to this function from
+        the optimisation algorithm
+
+    Returns
+    -------
+    tuple
+        Returns two arrays with a row per scenario:
+         + the solved utilisations for primary vehicles
+         + the solved utilisations for secondary vehicles
+    """
+
+    def solve(vehicle_type, get_relationship, total_demands, allocation, service_rate):
+        utilisations = np.zeros((len(total_demands), len(allocation)))
+        has_vehicles = allocation != 0
+        previous_solution = None
+        for scenario, total_demand in enumerate(total_demands):
+            start_time = time.perf_counter()
+            with np.errstate(divide="ignore"):
+                is_saturated = (
+                    total_demand / (service_rate * sum(allocation))
+                    > overall_utilisation_limit
+                )
+            if is_saturated:
+                utilisations[scenario] = overall_utilisation_limit
+                if diagnostics is not None:
+                    diagnostics.append(
+                        get_solver_diagnostics(
+                            vehicle_type, time.perf_counter() - start_time
+                        )
+                    )
+                continue
+
+            def relationship(u):
+                full_utilisations = np.ones(len(allocation))
+                full_utilisations[has_vehicles] = u
+                residual, jacobian = get_relationship(full_utilisations, scenario)[:2]
+                return (
+                    residual[has_vehicles],
+                    jacobian[np.ix_(has_vehicles, has_vehicles)],
+                )
+
+            if previous_solution is None:
+                previous_solution = total_demand / (
+                    len(allocation) * allocation[has_vehicles] * service_rate
+                )
+            with np.errstate(divide="ignore", invalid="ignore", over="ignore"):
+                previous_solution, infodict, ier, _ = solve_relationship(
+                    relationship, previous_solution, full_output=True
+                )
+            if diagnostics is not None:
+                diagnostics.append(
+                    get_solver_diagnostics(
+                        vehicle_type, time.perf_counter() - start_time, infodict, ier
+                    )
+                )
+            utilisations[scenario, has_vehicles] = previous_solution
+        return utilisations
+
+    primary_utilisations = solve(
+        "primary",
+        lambda u, scenario: relaxation.get_primary_relationship(
+            u,
+            allocation_primary,
+            objective.get_scenario_parameter(beta, scenario, 3),
+            demand_rates[scenario],
+            service_rate_primary,
+        ),
+        demand_rates.sum(axis=(1, 2)),
+        allocation_primary,
+        service_rate_primary,
+    )
+    secondary_utilisations = solve(
+        "secondary",
+        lambda u, scenario: relaxation.get_secondary_relationship(
+            u,
+            allocation_secondary,
+            np.where(allocation_primary != 0, primary_utilisations[scenario], 1),
+            allocation_primary,
+            objective.get_scenario_parameter(beta, scenario, 3),
+            objective.get_scenario_parameter(R, scenario, 3),
+            demand_rates[scenario],
+            service_rate_secondary,
+        ),
+        demand_rates[:, :-1].sum(axis=(1, 2)),
+        allocation_secondary,
+        service_rate_secondary,
     )
     return primary_utilisations, secondary_utilisations